@@ -0,0 +1,79 @@
+import json
+import os
+import resource
+import sys
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def prepare_environment(**overrides: str) -> None:
+    """Configure the service for an offline run before any service module is imported"""
+    # ChatOpenAI refuses to start without a key; the fake backend never sends it anywhere
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    # Keep the knowledge base in memory so runs never touch a real index
+    os.environ["RAG_INDEX_DIR"] = ""
+    os.environ.update(overrides)
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max in milliseconds"""
+    if not latencies:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def rss_mb() -> float:
+    """Current resident set size, falling back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS and kilobytes elsewhere
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str]) -> None:
+    widths = {column: max(len(column), *(len(str(row.get(column, ""))) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str(row.get(column, "")).ljust(widths[column]) for column in columns))
+
+
+def check_regressions(
+    results: Dict[str, Dict[str, Any]],
+    baseline_path: str,
+    tolerance: float,
+    lower_is_better: List[str],
+    higher_is_better: List[str],
+) -> List[str]:
+    """Compare results with a saved run and describe every metric outside the tolerance"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in lower_is_better:
+            previous = baseline[name].get(metric)
+            if previous and result[metric] > previous * (1 + tolerance):
+                failures.append(f"{name}: {metric} {result[metric]} > baseline {previous}")
+        for metric in higher_is_better:
+            previous = baseline[name].get(metric)
+            if previous and result[metric] < previous * (1 - tolerance):
+                failures.append(f"{name}: {metric} {result[metric]} < baseline {previous}")
+    return failures
+
+
+def write_results(path: str, config: Dict[str, Any], results: Dict[str, Dict[str, Any]]) -> None:
+    with open(path, "w") as f:
+        json.dump({"config": config, "results": results}, f, indent=2)
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import openai
+from langchain.schema import AIMessage
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+WORDS = (
+    "boost your leads with targeted ads that convert scroll stopping creative clear offer "
+    "shop now limited time save today discover learn more sign up free trial results fast "
+    "audience budget growth brand trusted local customers love easy simple proven"
+).split()
+
+
+@dataclass
+class FakeLLMConfig:
+    """Timing and failure profile of the fake upstream model.
+
+    A call waits `latency` seconds before the first token, then streams
+    `completion_tokens` tokens at `tokens_per_sec`. `error_rate` of calls
+    fail with a rate-limit error (Retry-After: 0) before any token is sent.
+    """
+
+    latency: float = 0.05
+    tokens_per_sec: float = 200.0
+    completion_tokens: int = 60
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+class FakeLLMBackend:
+    """Shared state of all fake models: config, deterministic randomness and counters"""
+
+    def __init__(self, config: FakeLLMConfig):
+        self.config = config
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._attempts: Dict[str, int] = {}
+
+    def _rng(self, messages: List) -> random.Random:
+        # Seed on the prompt and how often it has been sent, so a run does not depend on scheduling order
+        digest = hashlib.sha1(json.dumps([(m.type, m.content) for m in messages]).encode("utf-8")).hexdigest()
+        attempt = self._attempts.get(digest, 0)
+        self._attempts[digest] = attempt + 1
+        return random.Random(f"{self.config.seed}:{digest}:{attempt}")
+
+    def begin(self, messages: List) -> random.Random:
+        self.calls += 1
+        rng = self._rng(messages)
+        self.prompt_tokens += sum(len(str(m.content).split()) for m in messages)
+        if rng.random() < self.config.error_rate:
+            self.errors += 1
+            request = httpx.Request("POST", "http://fake-llm/v1/chat/completions")
+            response = httpx.Response(429, request=request, headers={"retry-after": "0"})
+            raise openai.RateLimitError("Fake rate limit", response=response, body=None)
+        return rng
+
+    def content(self, messages: List, rng: random.Random, json_mode: bool) -> List[str]:
+        """Completion tokens shaped like what the calling service parses"""
+        prompt = "\n".join(str(m.content) for m in messages)
+        if json_mode and '"headline"' in prompt:
+            text = json.dumps(self._variant(rng))
+        elif "JSON format" in prompt:
+            suggestions = self._suggestions(rng)
+            text = json.dumps({"suggestions": suggestions} if json_mode else suggestions)
+        elif json_mode:
+            text = json.dumps({"content": self._sentence(rng, self.config.completion_tokens), "suggestions": self._lines(rng, 3)})
+        else:
+            words = [rng.choice(WORDS) for _ in range(self.config.completion_tokens)]
+            # Line breaks every few words so list-style parsers find several items
+            text = "\n".join(" ".join(words[i:i + 8]) for i in range(0, len(words), 8))
+        # Whitespace-delimited pieces approximate tokens
+        tokens = text.replace("\n", " \n").split(" ")
+        self.completion_tokens += len(tokens)
+        return [token if i == 0 else " " + token for i, token in enumerate(tokens)]
+
+    def _sentence(self, rng: random.Random, length: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(length))
+
+    def _lines(self, rng: random.Random, count: int) -> List[str]:
+        return [self._sentence(rng, 6) for _ in range(count)]
+
+    def _variant(self, rng: random.Random) -> Dict[str, str]:
+        return {
+            "headline": self._sentence(rng, rng.randint(3, 9)).capitalize(),
+            "primary_text": ". ".join(self._sentence(rng, rng.randint(5, 12)).capitalize() for _ in range(2)) + ".",
+            "description": self._sentence(rng, 6).capitalize(),
+            "cta": rng.choice(["Shop Now", "Learn More", "Sign Up", "Go"]),
+        }
+
+    def _suggestions(self, rng: random.Random) -> List[Dict[str, Any]]:
+        return [
+            {
+                "type": rng.choice(["BUDGET_OPTIMIZATION", "AUDIENCE_TARGETING", "CREATIVE_IMPROVEMENT"]),
+                "title": self._sentence(rng, 4),
+                "description": self._sentence(rng, 20),
+                "action": {"action_type": "review", "reasoning": self._sentence(rng, 8)},
+                "priority": rng.choice(["HIGH", "MEDIUM", "LOW"]),
+                "expected_impact": rng.randint(5, 40),
+            }
+            for _ in range(3)
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class FakeChatOpenAI:
+    """Offline stand-in for `ChatOpenAI` with the `ainvoke`/`agenerate`/`astream` subset the services use"""
+
+    def __init__(self, model_name: str, temperature: float, backend: FakeLLMBackend):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.backend = backend
+
+    async def ainvoke(self, messages: List, config: Optional[Dict[str, Any]] = None, **kwargs) -> AIMessage:
+        backend = self.backend
+        await asyncio.sleep(backend.config.latency)
+        rng = backend.begin(messages)
+        tokens = backend.content(messages, rng, json_mode="response_format" in kwargs)
+        await asyncio.sleep(len(tokens) / backend.config.tokens_per_sec)
+        message = AIMessage(content="".join(tokens))
+
+        # Report usage the way ChatOpenAI does so token metrics are exercised
+        result = LLMResult(
+            generations=[[ChatGeneration(message=message)]],
+            llm_output={
+                "model_name": self.model_name,
+                "token_usage": {
+                    "prompt_tokens": sum(len(str(m.content).split()) for m in messages),
+                    "completion_tokens": len(tokens),
+                },
+            },
+        )
+        for handler in (config or {}).get("callbacks", []):
+            await handler.on_llm_end(result)
+        return message
+
+    async def agenerate(self, batches: List[List], callbacks: Optional[List] = None, n: int = 1, **kwargs) -> LLMResult:
+        backend = self.backend
+        await asyncio.sleep(backend.config.latency)
+        generations, prompt_tokens, completion_tokens = [], 0, 0
+        for messages in batches:
+            rng = backend.begin(messages)
+            samples = [backend.content(messages, rng, json_mode="response_format" in kwargs) for _ in range(n)]
+            generations.append([ChatGeneration(message=AIMessage(content="".join(tokens))) for tokens in samples])
+            prompt_tokens += sum(len(str(m.content).split()) for m in messages)
+            completion_tokens += sum(len(tokens) for tokens in samples)
+        # The choices of one request are generated in parallel upstream
+        await asyncio.sleep(completion_tokens / max(1, n) / backend.config.tokens_per_sec)
+
+        result = LLMResult(
+            generations=generations,
+            llm_output={
+                "model_name": self.model_name,
+                "token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+            },
+        )
+        for handler in callbacks or []:
+            await handler.on_llm_end(result)
+        return result
+
+    async def astream(self, messages: List, **kwargs) -> AsyncIterator[AIMessageChunk]:
+        backend = self.backend
+        await asyncio.sleep(backend.config.latency)
+        rng = backend.begin(messages)
+        delay = 1 / backend.config.tokens_per_sec
+        for token in backend.content(messages, rng, json_mode="response_format" in kwargs):
+            await asyncio.sleep(delay)
+            yield AIMessageChunk(content=token)
+
+
+def install_fake_llm(provider, config: FakeLLMConfig) -> FakeLLMBackend:
+    """Swap every chat model of `provider`, current and future, for a fake one.
+
+    The provider's concurrency slots, retries and metrics stay in place, so
+    only the upstream network call is simulated.
+    """
+    backend = FakeLLMBackend(config)
+
+    def patch(managed):
+        if not isinstance(managed.llm, FakeChatOpenAI):
+            managed.llm = FakeChatOpenAI(managed.llm.model_name, managed.llm.temperature, backend)
+        return managed
+
+    for managed in provider._models.values():
+        patch(managed)
+
+    chat_model = provider.chat_model
+    provider.chat_model = lambda *args, **kwargs: patch(chat_model(*args, **kwargs))
+    return backend
@@ -0,0 +1,248 @@
+"""Load-test the AI service endpoints against a fake LLM backend.
+
+Usage (from ai-service/):
+    python -m benchmarks.load
+    python -m benchmarks.load --endpoints chat,suggest --requests 500 --concurrency 64
+    python -m benchmarks.load --latency 0.3 --tokens-per-sec 60 --error-rate 0.05 --max-failures 5
+    python -m benchmarks.load --output baseline.json
+    python -m benchmarks.load --baseline baseline.json --tolerance 0.25
+
+The app is driven in-process through httpx's ASGI transport on a single
+event loop, and every upstream call goes to a deterministic fake model, so
+runs need no network or API key. For each endpoint it reports throughput,
+p50/p95/p99 latency, non-2xx responses, fallback responses (upstream
+failures the services turned into 200s, from ai_fallbacks_total), upstream
+calls and memory. The run exits non-zero when an endpoint has more than
+--max-failures errors plus fallbacks, and with --baseline also when latency
+or throughput regress beyond --tolerance.
+"""
+import argparse
+import asyncio
+import importlib
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx
+
+from benchmarks.common import (
+    check_regressions,
+    latency_summary,
+    prepare_environment,
+    print_table,
+    rss_mb,
+    write_results,
+)
+from benchmarks.fake_llm import FakeLLMConfig, install_fake_llm
+
+TOPICS = ["running shoes", "dental clinic", "yoga studio", "coffee roastery", "SaaS CRM", "bike repair", "bakery", "law firm"]
+QUESTIONS = [
+    "How do I lower my CPL on lead ads?",
+    "What is a good CTR for Facebook ads?",
+    "How should I structure campaigns by objective?",
+    "When should I use lookalike audiences?",
+    "How much budget should go to creative testing?",
+    "Which metrics should I track daily?",
+]
+
+
+def generate_payload(i: int, rng: random.Random) -> Dict[str, Any]:
+    topic = rng.choice(TOPICS)
+    return {
+        "prompt": f"Write a Facebook ad for a {topic} spring promotion #{i}",
+        "context": {"audience": rng.choice(["students", "parents", "professionals"]), "tone": rng.choice(["playful", "bold"])},
+    }
+
+
+def variants_payload(i: int, rng: random.Random) -> Dict[str, Any]:
+    return dict(generate_payload(i, rng), n=8, top_k=3)
+
+
+def chat_payload(i: int, rng: random.Random) -> Dict[str, Any]:
+    turns = rng.randint(1, 4)
+    messages = []
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Question {turn} about my {rng.choice(TOPICS)} campaign #{i}"})
+        messages.append({"role": "assistant", "content": "Happy to help. " + " ".join(rng.choice(TOPICS) for _ in range(12))})
+    messages.append({"role": "user", "content": f"What should I change first? #{i}"})
+    return {"messages": messages}
+
+
+def suggest_payload(i: int, rng: random.Random) -> Dict[str, Any]:
+    impressions = rng.randint(200, 200000)
+    clicks = int(impressions * rng.uniform(0.002, 0.03))
+    leads = int(clicks * rng.uniform(0, 0.1))
+    spend = round(rng.uniform(20, 3000), 2)
+    return {
+        "campaign": {"name": f"Campaign {i}", "objective": "LEADS", "budget": rng.choice([50, 100, 250]), "budgetType": "DAILY", "status": "ACTIVE"},
+        "performance": {
+            "reach": int(impressions * 0.7),
+            "impressions": impressions,
+            "clicks": clicks,
+            "leads": leads,
+            "spend": spend,
+            "cpm": round(spend / impressions * 1000, 2),
+            "cpc": round(spend / clicks, 2) if clicks else 0,
+            "cpl": round(spend / leads, 2) if leads else 0,
+        },
+    }
+
+
+def rag_payload(i: int, rng: random.Random) -> Dict[str, Any]:
+    return {"question": f"{rng.choice(QUESTIONS)} (#{i})"}
+
+
+# name -> (path, payload factory)
+ENDPOINTS: Dict[str, Tuple[str, Callable[[int, random.Random], Dict[str, Any]]]] = {
+    "generate": ("/generate", generate_payload),
+    "generate_stream": ("/generate/stream", generate_payload),
+    "generate_variants": ("/generate/variants", variants_payload),
+    "chat": ("/chat", chat_payload),
+    "chat_stream": ("/chat/stream", chat_payload),
+    "suggest": ("/suggest", suggest_payload),
+    "rag": ("/rag/query", rag_payload),
+}
+DEFAULT_ENDPOINTS = "generate,chat,suggest,rag"
+
+
+def fallback_count() -> float:
+    """Total of ai_fallbacks_total across call sites.
+
+    The services answer upstream failures with 200 fallback bodies, so
+    HTTP status alone does not reveal a degraded run.
+    """
+    from services.metrics import FALLBACKS
+
+    return sum(sample.value for metric in FALLBACKS.collect() for sample in metric.samples if sample.name.endswith("_total"))
+
+
+async def run_endpoint(client: httpx.AsyncClient, name: str, args, backend) -> Dict[str, Any]:
+    path, factory = ENDPOINTS[name]
+    rng = random.Random(f"{args.seed}:{name}")
+    distinct = args.distinct or args.requests
+    payloads = [factory(i % distinct, rng) for i in range(args.requests)]
+
+    for payload in payloads[:args.warmup]:
+        await client.post(path, json=payload)
+
+    latencies: List[float] = []
+    failures = 0
+    queue = iter(payloads)
+
+    async def worker():
+        nonlocal failures
+        for payload in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=payload)
+                if response.status_code >= 400:
+                    failures += 1
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    calls_before = backend.calls
+    fallbacks_before = fallback_count()
+    rss_before = rss_mb()
+    if args.tracemalloc:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    peak_heap = None
+    if args.tracemalloc:
+        peak_heap = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        tracemalloc.stop()
+
+    return {
+        "requests": len(payloads),
+        "failures": failures,
+        "fallbacks": int(fallback_count() - fallbacks_before),
+        "throughput_rps": round(len(payloads) / elapsed, 2),
+        **latency_summary(latencies),
+        "llm_calls": backend.calls - calls_before,
+        "rss_mb": round(rss_mb(), 1),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+        "peak_heap_mb": peak_heap,
+    }
+
+
+async def run(args) -> Dict[str, Dict[str, Any]]:
+    main = importlib.import_module("main")
+    from services.llm_provider import get_llm_provider
+
+    backend = install_fake_llm(
+        get_llm_provider(),
+        FakeLLMConfig(
+            latency=args.latency,
+            tokens_per_sec=args.tokens_per_sec,
+            completion_tokens=args.completion_tokens,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        ),
+    )
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for name in args.endpoints:
+            results[name] = await run_endpoint(client, name, args, backend)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the AI service against a fake LLM backend")
+    parser.add_argument("--endpoints", default=DEFAULT_ENDPOINTS, help=f"Comma-separated subset of: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per endpoint")
+    parser.add_argument("--distinct", type=int, default=0, help="Distinct payloads per endpoint (0 = all distinct)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake time to first token in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream calls failing with 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache enabled")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report peak Python heap (slows the run)")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Fail when results regress against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--max-failures", type=int, default=0, help="Allowed HTTP errors plus fallback responses per endpoint")
+    args = parser.parse_args(argv)
+
+    args.endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in args.endpoints if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+
+    prepare_environment(
+        CACHE_ENABLED="true" if args.cache else "false",
+        LLM_RETRY_BASE_DELAY="0",
+    )
+    results = asyncio.run(run(args))
+
+    print_table(
+        [{"endpoint": name, **result} for name, result in results.items()],
+        ["endpoint", "requests", "failures", "fallbacks", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "llm_calls", "rss_mb", "rss_delta_mb", "peak_heap_mb"],
+    )
+
+    if args.output:
+        write_results(args.output, {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}, results)
+
+    failures = [
+        f"{name}: {result['failures']} failed and {result['fallbacks']} fallback responses"
+        for name, result in results.items()
+        if result["failures"] + result["fallbacks"] > args.max_failures
+    ]
+    if args.baseline:
+        failures += check_regressions(results, args.baseline, args.tolerance, ["p95_ms", "p99_ms"], ["throughput_rps"])
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
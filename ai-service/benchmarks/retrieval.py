@@ -0,0 +1,137 @@
+"""Microbenchmark RAG retrieval as the knowledge base grows.
+
+Usage (from ai-service/):
+    python -m benchmarks.retrieval
+    python -m benchmarks.retrieval --sizes 1000,10000,50000 --queries 500
+    python -m benchmarks.retrieval --persistent
+    python -m benchmarks.retrieval --output retrieval.json --baseline baseline.json
+
+A synthetic corpus is ingested in steps up to each size, then
+`RAGService._find_relevant_documents` is timed over a fixed query set.
+Reports ingestion rate, query latency percentiles, queries/sec and memory
+per corpus size. --persistent benchmarks the mmap-backed on-disk index in
+a temporary directory instead of the in-memory one.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import (
+    check_regressions,
+    latency_summary,
+    prepare_environment,
+    print_table,
+    rss_mb,
+    write_results,
+)
+
+VOCABULARY = (
+    "facebook instagram ads audience lookalike retargeting budget bid cpl cpm cpc ctr roas conversion "
+    "lead landing page creative video carousel headline copy cta offer discount campaign ad set pixel "
+    "attribution funnel awareness consideration scaling testing variant frequency reach impressions "
+    "spend pacing seasonality mobile placement story reel feed segment interest behavior demographic"
+).split()
+QUERIES = [
+    "How do I lower CPL for lead ads?",
+    "best lookalike audience size for scaling",
+    "what CTR is good for carousel creative",
+    "retargeting frequency cap recommendations",
+    "ROAS drop after budget increase",
+    "headline length for mobile feed placement",
+    "when to stop a losing ad variant",
+    "pixel attribution window for conversion campaigns",
+]
+
+
+def synthetic_documents(start: int, count: int, seed: int) -> List[Dict[str, str]]:
+    rng = random.Random(f"{seed}:{start}")
+    return [
+        {
+            "id": f"bench-{i}",
+            "content": ". ".join(" ".join(rng.choices(VOCABULARY, k=12)) for _ in range(4)) + ".",
+            "source": f"Synthetic Guide {i % 50}",
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def build_service(index_dir: str):
+    prepare_environment(RAG_INDEX_DIR=index_dir)
+    from services.rag_service import RAGService
+
+    return RAGService()
+
+
+def run(args, index_dir: str = "") -> Dict[str, Dict[str, Any]]:
+    service = build_service(index_dir)
+    queries = [QUERIES[i % len(QUERIES)] + ("" if i < len(QUERIES) else f" {i}") for i in range(args.queries)]
+
+    results = {}
+    ingested = 0
+    for size in args.sizes:
+        documents = synthetic_documents(ingested, size - ingested, args.seed)
+        start = time.perf_counter()
+        service.add_documents(documents)
+        ingest_seconds = time.perf_counter() - start
+        ingested = size
+
+        for query in queries[:10]:
+            service._find_relevant_documents(query)
+
+        latencies = []
+        start = time.perf_counter()
+        for query in queries:
+            query_start = time.perf_counter()
+            service._find_relevant_documents(query)
+            latencies.append(time.perf_counter() - query_start)
+        elapsed = time.perf_counter() - start
+
+        results[str(size)] = {
+            "chunks": len(service.index),
+            "ingest_docs_per_sec": round(len(documents) / ingest_seconds, 1) if documents else None,
+            "queries_per_sec": round(len(queries) / elapsed, 1),
+            **latency_summary(latencies),
+            "rss_mb": round(rss_mb(), 1),
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmark RAG retrieval by corpus size")
+    parser.add_argument("--sizes", default="1000,5000,20000", help="Comma-separated corpus sizes in documents")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per corpus size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--persistent", action="store_true", help="Use the on-disk mmap index")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Fail when results regress against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args(argv)
+    args.sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    if args.persistent:
+        with tempfile.TemporaryDirectory() as index_dir:
+            results = run(args, index_dir)
+    else:
+        results = run(args)
+
+    print_table(
+        [{"documents": size, **result} for size, result in results.items()],
+        ["documents", "chunks", "ingest_docs_per_sec", "queries_per_sec", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rss_mb"],
+    )
+
+    if args.output:
+        write_results(args.output, {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}, results)
+
+    if args.baseline:
+        failures = check_regressions(results, args.baseline, args.tolerance, ["p95_ms", "p99_ms"], ["queries_per_sec"])
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Manage the on-disk RAG knowledge-base index.
+
+Usage:
+    python ingest.py add docs/*.md --source "Playbook"
+    python ingest.py add snippets.jsonl
+    python ingest.py seed
+    python ingest.py delete <doc_id> [<doc_id> ...]
+    python ingest.py compact
+    python ingest.py stats
+
+Plain text and markdown files are ingested as one document each, keyed by
+file path. JSONL files hold one {"id", "content", "source"} object per line.
+A new index starts with the built-in marketing best practices; `seed`
+ingests them again, e.g. after they were deleted.
+"""
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from services.embeddings import get_embedding_backend
+from services.ingestion import IngestionPipeline, prepare_documents
+from services.knowledge_base import DEFAULT_DOCUMENTS
+from services.vector_store import PersistentVectorIndex
+
+
+def load_documents(paths, source=None):
+    documents = []
+    for path in paths:
+        if path.endswith(".jsonl"):
+            with open(path) as f:
+                documents.extend(json.loads(line) for line in f if line.strip())
+        else:
+            with open(path) as f:
+                documents.append({
+                    "id": os.path.abspath(path),
+                    "content": f.read(),
+                    "source": source or os.path.basename(path),
+                })
+    return documents
+
+
+def main(argv=None):
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Manage the RAG knowledge-base index")
+    parser.add_argument("--index-dir", default=os.getenv("RAG_INDEX_DIR"), help="Index directory (defaults to RAG_INDEX_DIR)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="Ingest or replace documents")
+    add_parser.add_argument("paths", nargs="+")
+    add_parser.add_argument("--source", help="Source label for text files")
+    add_parser.add_argument("--max-words", type=int, default=120)
+    add_parser.add_argument("--overlap", type=int, default=20)
+
+    subparsers.add_parser("seed", help="Ingest the built-in marketing best practices")
+
+    delete_parser = subparsers.add_parser("delete", help="Delete documents by id")
+    delete_parser.add_argument("doc_ids", nargs="+")
+
+    subparsers.add_parser("compact", help="Rewrite the index without deleted chunks")
+    subparsers.add_parser("stats", help="Show index statistics")
+
+    args = parser.parse_args(argv)
+    if not args.index_dir:
+        parser.error("--index-dir or RAG_INDEX_DIR is required")
+
+    embedder = get_embedding_backend()
+    index = PersistentVectorIndex(
+        args.index_dir, embedder.dimension, seed=lambda: prepare_documents(embedder, DEFAULT_DOCUMENTS)[1:]
+    )
+
+    if args.command == "add":
+        pipeline = IngestionPipeline(embedder, index, max_words=args.max_words, overlap=args.overlap)
+        result = pipeline.ingest(load_documents(args.paths, args.source))
+        print(f"Ingested {len(result['doc_ids'])} documents as {result['chunks']} chunks")
+    elif args.command == "seed":
+        result = IngestionPipeline(embedder, index).ingest(DEFAULT_DOCUMENTS)
+        print(f"Seeded {len(result['doc_ids'])} documents as {result['chunks']} chunks")
+    elif args.command == "delete":
+        print(f"Deleted {IngestionPipeline(embedder, index).delete(args.doc_ids)} chunks")
+    elif args.command == "compact":
+        print(f"Compacted index to {IngestionPipeline(embedder, index).compact()} chunks")
+    elif args.command == "stats":
+        print(json.dumps({"chunks": len(index), "rows": len(index.documents), "dimension": index.dimension}))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,25 @@
-from fastapi import FastAPI, HTTPException
+import time
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError, field_validator
 from typing import List, Optional, Dict, Any
 import os
+import json
+from contextlib import nullcontext
 from dotenv import load_dotenv
 
+from services.admission import AdmissionMiddleware, create_limiter
 from services.ai_service import AIService
+from services.analytics import validate_history
 from services.rag_service import RAGService
 from services.optimization_service import OptimizationService
+from services.cache import get_response_cache
+from services.jobs import JobQueueFull, get_job_queue
+from services.llm_provider import get_llm_provider
+from services.metrics import REQUEST_LATENCY, render_metrics
+from services.model_router import get_model_router
+from services.prompts import get_prompt_registry
 
 load_dotenv()
 
@@ -17,7 +29,36 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS middleware
+# Admission control for LLM-backed routes: path -> (priority, share of the adaptive limit).
+# Lower priority numbers are admitted first, so interactive chat wins over batch analysis.
+ADMISSION_ROUTES = {
+    "/chat": (0, 1.0),
+    "/chat/stream": (0, 1.0),
+    "/generate": (1, 0.75),
+    "/generate/stream": (1, 0.75),
+    "/generate/variants": (1, 0.75),
+    "/rag/query": (1, 0.75),
+    "/suggest": (2, 0.5),
+    "/suggest/batch": (3, 0.25),
+}
+# A batch request holds no slot itself; each LLM analysis in it takes one (see admission_slot)
+PER_ANALYSIS_ROUTES = {"/suggest/batch"}
+admission_limiter = create_limiter()
+if admission_limiter is not None:
+    app.add_middleware(
+        AdmissionMiddleware,
+        limiter=admission_limiter,
+        routes={path: policy for path, policy in ADMISSION_ROUTES.items() if path not in PER_ANALYSIS_ROUTES},
+    )
+
+
+def admission_slot(route: str, patient: bool = False):
+    """Hold an admission slot of `route` for work outside the middleware: batch analyses and jobs"""
+    if admission_limiter is None:
+        return nullcontext()
+    return admission_limiter.slot(route, *ADMISSION_ROUTES[route], patient=patient)
+
+# CORS middleware (added after admission control so its 503 responses carry CORS headers)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://localhost:3001"],
@@ -31,25 +72,81 @@ ai_service = AIService()
 rag_service = RAGService()
 optimization_service = OptimizationService()
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Record request latency per route template, e.g. /rag/documents/{doc_id}"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUEST_LATENCY.labels(request.method, path, str(status)).observe(time.perf_counter() - start)
+
+@app.on_event("shutdown")
+async def close_llm_provider():
+    await get_job_queue().stop()
+    await get_llm_provider().aclose()
+
 # Pydantic models
 class GenerateRequest(BaseModel):
     prompt: str
     context: Optional[Dict[str, Any]] = None
 
-class SuggestRequest(BaseModel):
+class GenerateVariantsRequest(BaseModel):
+    prompt: str
+    context: Optional[Dict[str, Any]] = None
+    # Variants sampled in one upstream call, and how many distinct ones to return
+    n: int = Field(default=8, ge=1, le=20)
+    top_k: int = Field(default=3, ge=1, le=20)
+
+class CampaignHistoryModel(BaseModel):
     campaign: Dict[str, Any]
-    performance: Dict[str, Any]
+    performance: Dict[str, Any] = {}
+    # Daily series in columnar form, e.g. {"date": [...], "spend": [...], "leads": [...]}
+    history: Optional[Dict[str, List[Any]]] = None
+
+    @field_validator("history")
+    @classmethod
+    def check_history(cls, history: Optional[Dict[str, List[Any]]]) -> Optional[Dict[str, List[Any]]]:
+        return validate_history(history) if history is not None else None
+
+class SuggestRequest(CampaignHistoryModel):
+    pass
+
+class SuggestBatchItem(CampaignHistoryModel):
+    id: Optional[str] = None
+
+class SuggestBatchRequest(BaseModel):
+    items: List[SuggestBatchItem]
+    concurrency: Optional[int] = Field(default=None, ge=1, le=64)
 
 class RAGQueryRequest(BaseModel):
     question: str
 
 class ChatRequest(BaseModel):
     messages: List[Dict[str, str]]
+    # Keys the rolling summary of older turns; derived from the opening message when omitted
+    conversation_id: Optional[str] = None
+
+class RAGDocument(BaseModel):
+    content: str
+    source: str = "Unknown"
+    id: Optional[str] = None
+
+class RAGIngestRequest(BaseModel):
+    documents: List[RAGDocument]
 
 class GenerateResponse(BaseModel):
     content: str
     suggestions: List[str]
 
+class GenerateVariantsResponse(BaseModel):
+    variants: List[Dict[str, Any]]
+
 class SuggestResponse(BaseModel):
     suggestions: List[Dict[str, Any]]
 
@@ -61,6 +158,51 @@ class ChatResponse(BaseModel):
     response: str
     suggestions: List[str]
 
+class RAGIngestResponse(BaseModel):
+    doc_ids: List[str]
+    chunks: int
+
+class RAGDeleteResponse(BaseModel):
+    deleted: int
+
+class JobRequest(BaseModel):
+    type: str
+    payload: Dict[str, Any]
+    # Lower runs first; defaults to the job type's priority
+    priority: Optional[int] = Field(default=None, ge=0, le=9)
+    callback_url: Optional[str] = Field(default=None, pattern=r"^https?://")
+
+class JobResponse(BaseModel):
+    id: str
+    type: str
+    status: str
+    priority: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+def sse_response(events) -> StreamingResponse:
+    """Encode (event, data) pairs from a service stream as server-sent events"""
+    
+    async def encode():
+        async for event, data in events:
+            if event == "token":
+                payload = {"content": data}
+            elif event == "suggestions":
+                payload = {"suggestions": data}
+            else:
+                payload = {"detail": data}
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    
+    return StreamingResponse(
+        encode(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/")
 async def root():
     return {"message": "Promoly AI Service is running"}
@@ -69,6 +211,38 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "ai"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Current concurrency limit, queue depth and per-route latency averages"""
+    return admission_limiter.stats() if admission_limiter is not None else {"enabled": False}
+
+@app.get("/router/stats")
+async def router_stats():
+    """Model tier per task with call counts, escalations, latency and estimated cost"""
+    return get_model_router().stats()
+
+@app.get("/prompts")
+async def prompt_stats():
+    """Active prompt template versions with their static and average rendered token counts"""
+    return get_prompt_registry().stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the shared LLM response cache"""
+    return get_response_cache().stats()
+
+@app.delete("/cache")
+async def clear_cache():
+    """Drop all cached LLM responses"""
+    await get_response_cache().clear()
+    return {"status": "cleared"}
+
 @app.post("/generate", response_model=GenerateResponse)
 async def generate_ad_copy(request: GenerateRequest):
     """Generate ad copy and creative ideas"""
@@ -78,15 +252,54 @@ async def generate_ad_copy(request: GenerateRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate/variants", response_model=GenerateVariantsResponse)
+async def generate_ad_variants(request: GenerateVariantsRequest):
+    """Generate several ad copy variants, deduplicated and ranked for A/B testing"""
+    try:
+        variants = await ai_service.generate_variants(request.prompt, request.context, request.n, request.top_k)
+        return GenerateVariantsResponse(variants=variants)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/generate/stream")
+async def stream_ad_copy(request: GenerateRequest):
+    """Stream generated ad copy as server-sent events, with suggestions as the trailing event"""
+    return sse_response(ai_service.stream_ad_copy(request.prompt, request.context))
+
 @app.post("/suggest", response_model=SuggestResponse)
 async def get_optimization_suggestions(request: SuggestRequest):
     """Get AI-powered optimization suggestions based on campaign performance"""
     try:
-        suggestions = await optimization_service.get_suggestions(request.campaign, request.performance)
+        suggestions = await optimization_service.get_suggestions(request.campaign, request.performance, request.history)
         return SuggestResponse(suggestions=suggestions)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def suggest_batch_lines(request: SuggestBatchRequest, patient: bool):
+    """Per-item result lines of a suggestion batch, in completion order"""
+    pairs = [(item.campaign, item.performance) for item in request.items]
+    histories = [item.history for item in request.items]
+    batch = optimization_service.get_suggestions_batch(
+        pairs, request.concurrency, histories, admit=lambda: admission_slot("/suggest/batch", patient=patient)
+    )
+    async for index, suggestions, error in batch:
+        line = {"index": index, "id": request.items[index].id}
+        if error is None:
+            line["suggestions"] = suggestions
+        else:
+            line["error"] = error
+        yield line
+
+@app.post("/suggest/batch")
+async def get_optimization_suggestions_batch(request: SuggestBatchRequest):
+    """Optimization suggestions for many campaigns, streamed back as NDJSON in completion order"""
+    
+    async def results():
+        async for line in suggest_batch_lines(request, patient=False):
+            yield json.dumps(line) + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @app.post("/rag/query", response_model=RAGResponse)
 async def query_knowledge_base(request: RAGQueryRequest):
     """Query the RAG knowledge base for marketing best practices"""
@@ -96,15 +309,124 @@ async def query_knowledge_base(request: RAGQueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/rag/documents", response_model=RAGIngestResponse)
+def ingest_documents(request: RAGIngestRequest):
+    """Add or replace documents in the RAG knowledge base"""
+    try:
+        result = rag_service.add_documents([doc.model_dump() for doc in request.documents])
+        return RAGIngestResponse(**result)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/rag/documents/{doc_id}", response_model=RAGDeleteResponse)
+def delete_document(doc_id: str):
+    """Remove a document from the RAG knowledge base"""
+    deleted = rag_service.delete_documents([doc_id])
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return RAGDeleteResponse(deleted=deleted)
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_completion(request: ChatRequest):
     """Chat completion for conversational onboarding and support"""
     try:
-        response, suggestions = await ai_service.chat_completion(request.messages)
+        response, suggestions = await ai_service.chat_completion(request.messages, request.conversation_id)
         return ChatResponse(response=response, suggestions=suggestions)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def stream_chat(request: ChatRequest):
+    """Stream the chat response as server-sent events, with suggestions as the trailing event"""
+    return sse_response(ai_service.stream_chat(request.messages, request.conversation_id))
+
+async def run_generate_job(request: GenerateRequest) -> Dict[str, Any]:
+    content, suggestions = await ai_service.generate_ad_copy(request.prompt, request.context)
+    return GenerateResponse(content=content, suggestions=suggestions).model_dump()
+
+async def run_generate_variants_job(request: GenerateVariantsRequest) -> Dict[str, Any]:
+    variants = await ai_service.generate_variants(request.prompt, request.context, request.n, request.top_k)
+    return GenerateVariantsResponse(variants=variants).model_dump()
+
+async def run_suggest_job(request: SuggestRequest) -> Dict[str, Any]:
+    suggestions = await optimization_service.get_suggestions(request.campaign, request.performance, request.history)
+    return SuggestResponse(suggestions=suggestions).model_dump()
+
+async def run_suggest_batch_job(request: SuggestBatchRequest) -> Dict[str, Any]:
+    results: List[Optional[Dict[str, Any]]] = [None] * len(request.items)
+    async for line in suggest_batch_lines(request, patient=True):
+        results[line["index"]] = line
+    return {"results": results}
+
+async def run_rag_query_job(request: RAGQueryRequest) -> Dict[str, Any]:
+    answer, sources = await rag_service.query(request.question)
+    return RAGResponse(answer=answer, sources=sources).model_dump()
+
+async def run_chat_job(request: ChatRequest) -> Dict[str, Any]:
+    response, suggestions = await ai_service.chat_completion(request.messages, request.conversation_id)
+    return ChatResponse(response=response, suggestions=suggestions).model_dump()
+
+def admitted_job(handler, route: str):
+    """Run a job handler in an admission slot of the route doing the same work"""
+    async def run(request):
+        async with admission_slot(route, patient=True):
+            return await handler(request)
+    return run
+
+# job type -> (request model, handler, default priority)
+JOB_TYPES = {
+    "chat": (ChatRequest, admitted_job(run_chat_job, "/chat"), 1),
+    "generate": (GenerateRequest, admitted_job(run_generate_job, "/generate"), 3),
+    "generate_variants": (GenerateVariantsRequest, admitted_job(run_generate_variants_job, "/generate/variants"), 3),
+    "rag_query": (RAGQueryRequest, admitted_job(run_rag_query_job, "/rag/query"), 3),
+    "suggest": (SuggestRequest, admitted_job(run_suggest_job, "/suggest"), 5),
+    # Admitted per analysis, like the /suggest/batch route
+    "suggest_batch": (SuggestBatchRequest, run_suggest_batch_job, 7),
+}
+for job_type, (_, handler, priority) in JOB_TYPES.items():
+    get_job_queue().register(job_type, handler, priority)
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(request: JobRequest):
+    """Queue AI work and return immediately; poll GET /jobs/{id} or pass a callback_url"""
+    if request.type not in JOB_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown job type, expected one of: {', '.join(JOB_TYPES)}")
+    try:
+        payload = JOB_TYPES[request.type][0].model_validate(request.payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    try:
+        job = get_job_queue().submit(request.type, payload, request.priority, request.callback_url)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return JobResponse(**job.to_dict())
+
+@app.get("/jobs/stats")
+async def job_stats():
+    """Queue depth and job counts by status"""
+    return get_job_queue().stats()
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Status of a job, with its result once it has finished"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job.to_dict())
+
+@app.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    """Cancel a job that has not started yet"""
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is already {job.status}")
+    return JobResponse(**job.to_dict())
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
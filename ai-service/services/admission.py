@@ -0,0 +1,251 @@
+import asyncio
+import bisect
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from services.metrics import ADMISSION_LIMIT, SHED_REQUESTS, STAGE_LATENCY
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Service is at capacity ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """Concurrency limit shared by all LLM-backed routes, adapted with AIMD.
+
+    Each route keeps a long and a short moving average of its latency. When
+    the short average climbs past `tolerance` times the long one, or a
+    request fails, the limit is cut multiplicatively (at most once per
+    `limit` completions); otherwise every completion raises it by 1/limit,
+    i.e. about one slot per round of requests.
+
+    A route may only use `share` of the limit. Requests beyond it wait in
+    priority order (lower first) for at most `queue_timeout` seconds; when
+    the deadline passes, or the queue is full of requests of equal or
+    higher priority, the request is shed.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 32,
+        min_limit: int = 4,
+        max_limit: int = 256,
+        max_queue: int = 100,
+        queue_timeout: float = 5.0,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tolerance = tolerance
+        self.backoff = backoff
+
+        self.in_flight = 0
+        self._route_in_flight: Dict[str, int] = {}
+        self._latency: Dict[str, List[float]] = {}
+        self._waiters: List[Tuple[int, int, asyncio.Future, str, float]] = []
+        self._sequence = itertools.count()
+        self._since_decrease = 0
+        ADMISSION_LIMIT.set(self.limit)
+
+    def _has_capacity(self, route: str, share: float) -> bool:
+        limit = int(self.limit)
+        return self.in_flight < limit and self._route_in_flight.get(route, 0) < max(1, int(limit * share))
+
+    def _admit(self, route: str) -> None:
+        self.in_flight += 1
+        self._route_in_flight[route] = self._route_in_flight.get(route, 0) + 1
+
+    async def acquire(self, route: str, priority: int = 0, share: float = 1.0) -> None:
+        """Wait for a slot, raising Overloaded if none frees up in time"""
+        if not self._waiters and self._has_capacity(route, share):
+            self._admit(route)
+            return
+        if len(self._waiters) >= self.max_queue:
+            lowest = self._waiters[-1]
+            if priority >= lowest[0]:
+                raise Overloaded("queue_full", self.retry_after(route))
+            # Make room by shedding the newest request of the lowest priority instead
+            self._waiters.pop()
+            # Its wait may already have ended (timed out or cancelled) without it leaving the queue yet
+            if not lowest[2].done():
+                lowest[2].set_exception(Overloaded("displaced", self.retry_after(lowest[3])))
+
+        future = asyncio.get_running_loop().create_future()
+        bisect.insort(self._waiters, (priority, next(self._sequence), future, route, share), key=lambda entry: entry[:2])
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded("queue_timeout", self.retry_after(route))
+        except asyncio.CancelledError:
+            # The slot may have been granted just before the caller went away
+            if future.done() and not future.cancelled():
+                self.release(route, None, failed=False)
+            raise
+        finally:
+            self._waiters = [entry for entry in self._waiters if entry[2] is not future]
+
+    @asynccontextmanager
+    async def slot(self, route: str, priority: int = 0, share: float = 1.0, patient: bool = False):
+        """Hold a slot around work that is not a whole request, e.g. one analysis of a batch.
+
+        Patient callers (background jobs) keep retrying after being shed
+        instead of raising Overloaded; their own timeout bounds the wait.
+        """
+        while True:
+            try:
+                await self.acquire(route, priority, share)
+                break
+            except Overloaded as e:
+                SHED_REQUESTS.labels(route, e.reason).inc()
+                if not patient:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(route, time.perf_counter() - started, failed)
+
+    def release(self, route: str, latency: Optional[float], failed: bool) -> None:
+        self.in_flight -= 1
+        self._route_in_flight[route] -= 1
+        if latency is not None:
+            self._observe(route, latency, failed)
+        self._dispatch()
+
+    def _observe(self, route: str, latency: float, failed: bool) -> None:
+        averages = self._latency.setdefault(route, [latency, latency])
+        averages[0] += 0.02 * (latency - averages[0])
+        averages[1] += 0.3 * (latency - averages[1])
+        congested = failed or averages[1] > self.tolerance * averages[0]
+
+        self._since_decrease += 1
+        if congested:
+            if self._since_decrease >= self.limit:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._since_decrease = 0
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        ADMISSION_LIMIT.set(self.limit)
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters in priority order"""
+        for entry in list(self._waiters):
+            if self.in_flight >= int(self.limit):
+                break
+            _, _, future, route, share = entry
+            if future.done():
+                continue
+            if self._has_capacity(route, share):
+                self._admit(route)
+                future.set_result(None)
+                self._waiters.remove(entry)
+
+    def retry_after(self, route: str) -> int:
+        """Seconds a shed client should wait: about one typical request of that route"""
+        averages = self._latency.get(route)
+        return min(30, max(1, math.ceil(averages[0]))) if averages else 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "routes": {
+                route: {
+                    "in_flight": self._route_in_flight.get(route, 0),
+                    "latency_long_ms": round(averages[0] * 1000, 1),
+                    "latency_short_ms": round(averages[1] * 1000, 1),
+                }
+                for route, averages in self._latency.items()
+            },
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits requests to limited routes through the limiter.
+
+    `routes` maps a path to its (priority, share). The slot is held until
+    the response, including streamed bodies, has been sent.
+    """
+
+    def __init__(self, app, limiter: AdaptiveLimiter, routes: Dict[str, Tuple[int, float]]):
+        self.app = app
+        self.limiter = limiter
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        policy = self.routes.get(scope["path"]) if scope["type"] == "http" else None
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        route = scope["path"]
+        start = time.perf_counter()
+        try:
+            await self.limiter.acquire(route, *policy)
+        except Overloaded as e:
+            SHED_REQUESTS.labels(route, e.reason).inc()
+            response = JSONResponse(
+                {"detail": "Service is at capacity, please retry later"},
+                status_code=503,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        STAGE_LATENCY.labels("admission_wait", route).observe(time.perf_counter() - start)
+
+        status = None
+        failed = False
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # A client disconnecting (cancellation) says nothing about upstream health
+            failed = failed or (status is not None and status >= 500)
+            self.limiter.release(route, time.perf_counter() - started, failed)
+
+
+def create_limiter() -> Optional[AdaptiveLimiter]:
+    """Build the limiter from the environment, or None when admission control is off"""
+    if os.getenv("ADMISSION_ENABLED", "true").lower() != "true":
+        return None
+    return AdaptiveLimiter(
+        initial_limit=int(os.getenv("ADMISSION_INITIAL_LIMIT", "32")),
+        min_limit=int(os.getenv("ADMISSION_MIN_LIMIT", "4")),
+        max_limit=int(os.getenv("ADMISSION_MAX_LIMIT", "256")),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "100")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5")),
+        tolerance=float(os.getenv("ADMISSION_LATENCY_TOLERANCE", "2.0")),
+    )
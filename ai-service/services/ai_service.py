@@ -1,127 +1,313 @@
+import asyncio
+import json
 import os
-import openai
-from typing import List, Dict, Any, Tuple
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from services.cache import MemoryCacheBackend, RedisCacheBackend, get_response_cache
+from services.chat_history import ChatHistoryManager
+from services.llm_provider import get_llm_provider
+from services.metrics import FALLBACKS, timed
+from services.model_router import get_model_router
+from services.prompts import get_prompt_registry
+from services.tokens import get_token_counter
+from services.variants import VariantRanker, parse_variant
 
 class AIService:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.model = os.getenv("MODEL_NAME", "gpt-4o-mini")
-        self.llm = ChatOpenAI(
-            model=self.model,
-            temperature=0.7,
-            openai_api_key=os.getenv("OPENAI_API_KEY")
+        self.llm = get_llm_provider().chat_model(temperature=0.7, model=self.model)
+        self.cache = get_response_cache()
+        self.prompts = get_prompt_registry()
+        self.llm_timeout = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+        self.suggestion_timeout = float(os.getenv("SUGGESTION_TIMEOUT_SECONDS", "10"))
+        # Ask for content and suggestions in one structured completion instead of two calls
+        self.combined_output = os.getenv("AI_COMBINED_OUTPUT", "false").lower() == "true"
+        
+        # Suggestion lists and chat summaries go to the light model tier
+        self.router = get_model_router()
+        
+        # Variants are sampled hotter than single completions so they differ in angle, not just wording
+        self.variant_llm = get_llm_provider().chat_model(
+            temperature=float(os.getenv("VARIANT_TEMPERATURE", "1.0")),
+            model=self.model
+        )
+        self.variant_ranker = VariantRanker(
+            similarity_threshold=float(os.getenv("VARIANT_SIMILARITY_THRESHOLD", "0.8"))
         )
+        
+        # Long chats send a rolling summary plus the latest turns instead of the full history
+        redis_url = os.getenv("CACHE_REDIS_URL")
+        self.history = ChatHistoryManager(
+            router=self.router,
+            prompts=self.prompts,
+            store=RedisCacheBackend(redis_url, prefix="promoly:chat-summary:") if redis_url else MemoryCacheBackend(int(os.getenv("HISTORY_MAX_CONVERSATIONS", "10000"))),
+            counter=get_token_counter(self.model),
+            max_tokens=int(os.getenv("HISTORY_MAX_TOKENS", "3000")),
+            window_tokens=int(os.getenv("HISTORY_WINDOW_TOKENS", "1500")),
+            ttl=float(os.getenv("HISTORY_SUMMARY_TTL_SECONDS", "86400")),
+        )
+
+    def _ad_copy_messages(self, prompt: str, context: Dict[str, Any] = None) -> List:
+        """Build the message list for ad copy generation"""
+        
+        with timed("prompt_build", "generate"):
+            return [
+                SystemMessage(content=self.prompts.render("ad_copy_system")),
+                HumanMessage(content=self.prompts.render(
+                    "ad_copy_request",
+                    context=f"Context: {context}\n\n" if context else "",
+                    prompt=prompt
+                ))
+            ]
 
     async def generate_ad_copy(self, prompt: str, context: Dict[str, Any] = None) -> Tuple[str, List[str]]:
         """Generate ad copy and creative ideas"""
         
-        system_prompt = """You are an expert digital marketing copywriter specializing in Facebook and Instagram ads. 
-        Create compelling, conversion-focused ad copy that drives action.
-        
-        Guidelines:
-        - Keep headlines under 40 characters for optimal display
-        - Use emotional triggers and benefit-focused language
-        - Include clear call-to-actions
-        - Test different angles and approaches
-        - Consider the target audience and platform
-        """
-        
-        if context:
-            context_str = f"\nContext: {context}"
-        else:
-            context_str = ""
-        
-        full_prompt = f"{system_prompt}{context_str}\n\nUser request: {prompt}"
+        messages = self._ad_copy_messages(prompt, context)
         
         try:
-            response = await self.llm.ainvoke([
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=f"{context_str}\n\nUser request: {prompt}")
-            ])
+            if self.combined_output:
+                return await self._combined_completion(messages, "generate", max_suggestions=5)
             
-            content = response.content
-            
-            # Generate additional suggestions
-            suggestions = await self._generate_suggestions(prompt, context)
-            
-            return content, suggestions
+            # The suggestion prompt only depends on the user input, so run it alongside the main call
+            return await self._with_suggestions(
+                self.cache.ainvoke(self.llm, messages, namespace="generate", semantic_text=prompt),
+                self._generate_suggestions(prompt, context)
+            )
             
         except Exception as e:
             print(f"Error generating ad copy: {e}")
+            FALLBACKS.labels("generate").inc()
             return "Unable to generate ad copy at this time.", []
 
-    async def chat_completion(self, messages: List[Dict[str, str]]) -> Tuple[str, List[str]]:
-        """Handle conversational chat for onboarding and support"""
+    async def generate_variants(
+        self,
+        prompt: str,
+        context: Dict[str, Any] = None,
+        n: int = 8,
+        top_k: int = 3
+    ) -> List[Dict[str, Any]]:
+        """Sample n ad copy variants in one call and return the top_k distinct ones by local score"""
         
-        system_prompt = """You are Promoly, an AI assistant for digital advertising. You help users:
-        1. Set up and optimize their ad campaigns
-        2. Understand their campaign performance
-        3. Make data-driven decisions
-        4. Learn best practices in digital marketing
+        messages = self._ad_copy_messages(prompt, context)
+        instructions = self.prompts.render("ad_variants_format")
+        messages = [SystemMessage(content=f"{messages[0].content}\n\n{instructions}")] + messages[1:]
         
-        Be helpful, friendly, and provide actionable advice. When appropriate, suggest next steps or ask clarifying questions."""
+        try:
+            samples = await asyncio.wait_for(
+                self.cache.asample(
+                    self.variant_llm,
+                    messages,
+                    namespace="generate_variants",
+                    n=n,
+                    validate=lambda samples: any(parse_variant(sample) for sample in samples),
+                    response_format={"type": "json_object"}
+                ),
+                timeout=self.llm_timeout
+            )
+        except Exception as e:
+            print(f"Error generating ad variants: {e}")
+            FALLBACKS.labels("generate_variants").inc()
+            return []
+        
+        with timed("variant_rank", "generate_variants"):
+            variants = [variant for variant in map(parse_variant, samples) if variant is not None]
+            return self.variant_ranker.rank(variants, top_k)
+
+    async def stream_ad_copy(self, prompt: str, context: Dict[str, Any] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream ad copy tokens, followed by the creative suggestions"""
+        
+        async for event in self._stream_with_suggestions(
+            self._ad_copy_messages(prompt, context),
+            "generate",
+            self._generate_suggestions(prompt, context),
+            "Unable to generate ad copy at this time.",
+            semantic_text=prompt
+        ):
+            yield event
+
+    async def _chat_messages(self, messages: List[Dict[str, str]], conversation_id: Optional[str] = None) -> List:
+        """Convert chat history to LangChain messages behind the assistant system prompt.
+
+        Older turns beyond the token budget are replaced by their summary.
+        """
+        
+        with timed("history", "chat"):
+            summary, recent = await self.history.prepare(messages, conversation_id)
+        
+        langchain_messages = [SystemMessage(content=self.prompts.render("chat_system"))]
+        if summary:
+            langchain_messages.append(SystemMessage(content=self.prompts.render("chat_summary_context", summary=summary)))
+        for msg in recent:
+            if msg["role"] == "user":
+                langchain_messages.append(HumanMessage(content=msg["content"]))
+            elif msg["role"] == "assistant":
+                langchain_messages.append(AIMessage(content=msg["content"]))
+        return langchain_messages
+
+    async def chat_completion(self, messages: List[Dict[str, str]], conversation_id: Optional[str] = None) -> Tuple[str, List[str]]:
+        """Handle conversational chat for onboarding and support"""
         
         try:
-            # Convert messages to LangChain format
-            langchain_messages = [SystemMessage(content=system_prompt)]
-            for msg in messages:
-                if msg["role"] == "user":
-                    langchain_messages.append(HumanMessage(content=msg["content"]))
-                elif msg["role"] == "assistant":
-                    langchain_messages.append(SystemMessage(content=msg["content"]))
-            
-            response = await self.llm.ainvoke(langchain_messages)
+            langchain_messages = await self._chat_messages(messages, conversation_id)
             
-            # Generate follow-up suggestions
-            suggestions = await self._generate_chat_suggestions(messages[-1]["content"] if messages else "")
+            if self.combined_output:
+                return await self._combined_completion(langchain_messages, "chat", max_suggestions=3)
             
-            return response.content, suggestions
+            return await self._with_suggestions(
+                self.cache.ainvoke(
+                    self.llm, langchain_messages, namespace="chat", semantic_text=messages[-1]["content"] if messages else None
+                ),
+                self._generate_chat_suggestions(messages[-1]["content"] if messages else "")
+            )
             
         except Exception as e:
             print(f"Error in chat completion: {e}")
+            FALLBACKS.labels("chat").inc()
             return "I'm having trouble processing your request right now. Please try again.", []
 
-    async def _generate_suggestions(self, prompt: str, context: Dict[str, Any] = None) -> List[str]:
-        """Generate additional creative suggestions"""
+    async def stream_chat(self, messages: List[Dict[str, str]], conversation_id: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream the chat response tokens, followed by follow-up suggestions"""
+        
+        async for event in self._stream_with_suggestions(
+            await self._chat_messages(messages, conversation_id),
+            "chat",
+            self._generate_chat_suggestions(messages[-1]["content"] if messages else ""),
+            "I'm having trouble processing your request right now. Please try again.",
+            semantic_text=messages[-1]["content"] if messages else None
+        ):
+            yield event
+
+    async def _stream_with_suggestions(
+        self, messages: List, namespace: str, suggestions, fallback: str, semantic_text: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield ("token", text) events as the completion streams, then ("suggestions", list).
+
+        Suggestions are generated concurrently with the stream and arrive as
+        the trailing event. If the stream fails, an ("error", message) event
+        replaces the remaining tokens and no suggestions are sent.
+        LLM_TIMEOUT_SECONDS bounds the time to the first token and every gap
+        between tokens, so long answers and slow readers are not cut off.
+        """
+        suggestions_task = asyncio.create_task(
+            asyncio.wait_for(suggestions, timeout=self.suggestion_timeout)
+        )
+        stream = self.cache.astream(
+            self.llm, messages, namespace=namespace, validate=lambda content: bool(content.strip()), semantic_text=semantic_text
+        )
+        try:
+            while True:
+                # The yield stays outside the timeout so it never fires while the caller is sending
+                async with asyncio.timeout(self.llm_timeout):
+                    token = await anext(stream, None)
+                if token is None:
+                    break
+                yield "token", token
+        except Exception as e:
+            suggestions_task.cancel()
+            print(f"Error streaming {namespace} completion: {e}")
+            FALLBACKS.labels(f"{namespace}_stream").inc()
+            yield "error", fallback
+            return
+        except BaseException:
+            suggestions_task.cancel()
+            raise
+        finally:
+            await stream.aclose()
+        
+        try:
+            yield "suggestions", await suggestions_task
+        except asyncio.TimeoutError:
+            print("Suggestion generation timed out")
+            yield "suggestions", []
+
+    async def _with_suggestions(self, completion, suggestions) -> Tuple[str, List[str]]:
+        """Run the main completion and the suggestion call concurrently.
+
+        The main completion is bounded by LLM_TIMEOUT_SECONDS and its errors
+        propagate. Suggestions are best-effort: a failure or timeout yields an
+        empty list, and they are cancelled if the main completion fails.
+        """
+        suggestions_task = asyncio.create_task(
+            asyncio.wait_for(suggestions, timeout=self.suggestion_timeout)
+        )
+        try:
+            response = await asyncio.wait_for(completion, timeout=self.llm_timeout)
+        except BaseException:
+            suggestions_task.cancel()
+            raise
         
-        suggestion_prompt = f"""Based on the request: "{prompt}"
+        try:
+            return response.content, await suggestions_task
+        except asyncio.TimeoutError:
+            print("Suggestion generation timed out")
+            return response.content, []
+
+    async def _combined_completion(self, messages: List, namespace: str, max_suggestions: int) -> Tuple[str, List[str]]:
+        """Produce the main response and follow-up suggestions in a single JSON-mode call"""
+        
+        instructions = self.prompts.render("combined_output_instructions", max_suggestions=max_suggestions)
         
-        Generate 3-5 additional creative angles or approaches for this ad campaign.
-        Each suggestion should be a brief, actionable idea.
+        combined_messages = [SystemMessage(content=f"{messages[0].content}\n\n{instructions}")] + messages[1:]
+        response = await asyncio.wait_for(
+            self.cache.ainvoke(
+                self.llm,
+                combined_messages,
+                namespace=f"{namespace}_combined",
+                response_format={"type": "json_object"}
+            ),
+            timeout=self.llm_timeout
+        )
         
-        Format as a simple list."""
+        try:
+            with timed("json_parse", f"{namespace}_combined"):
+                parsed = json.loads(response.content)
+                suggestions = [str(item).strip() for item in parsed.get("suggestions", []) if str(item).strip()]
+            return str(parsed.get("content", "")), suggestions[:max_suggestions]
+        except (ValueError, AttributeError) as e:
+            # Keep the completion even if the structure is off
+            print(f"Error parsing combined completion: {e}")
+            return response.content, []
+
+    @staticmethod
+    def _suggestion_lines(content: str) -> List[str]:
+        """Non-empty lines of a suggestion list completion, skipping markdown headings"""
+        return [line.strip() for line in content.split('\n') if line.strip() and not line.startswith('#')]
+
+    async def _generate_suggestions(self, prompt: str, context: Dict[str, Any] = None) -> List[str]:
+        """Generate additional creative suggestions"""
         
         try:
-            response = await self.llm.ainvoke([
-                HumanMessage(content=suggestion_prompt)
-            ])
+            response = await self.router.ainvoke("generate_suggestions", [
+                SystemMessage(content=self.prompts.render("ad_suggestions_system")),
+                HumanMessage(content=self.prompts.render("ad_suggestions_request", prompt=prompt))
+            ], temperature=0.7, validate=lambda content: bool(self._suggestion_lines(content)))
             
             # Parse suggestions from response
-            suggestions = [line.strip() for line in response.content.split('\n') if line.strip() and not line.startswith('#')]
+            with timed("suggestion_parse", "generate_suggestions"):
+                suggestions = self._suggestion_lines(response.content)
             return suggestions[:5]  # Limit to 5 suggestions
             
         except Exception as e:
             print(f"Error generating suggestions: {e}")
+            FALLBACKS.labels("generate_suggestions").inc()
             return []
 
     async def _generate_chat_suggestions(self, last_message: str) -> List[str]:
         """Generate follow-up suggestions for chat"""
         
-        suggestion_prompt = f"""Based on the user's message: "{last_message}"
-        
-        Suggest 2-3 helpful follow-up questions or actions the user might want to take.
-        Keep suggestions short and actionable."""
-        
         try:
-            response = await self.llm.ainvoke([
-                HumanMessage(content=suggestion_prompt)
-            ])
+            response = await self.router.ainvoke("chat_suggestions", [
+                SystemMessage(content=self.prompts.render("chat_suggestions_system")),
+                HumanMessage(content=self.prompts.render("chat_suggestions_request", message=last_message))
+            ], temperature=0.7, validate=lambda content: bool(self._suggestion_lines(content)))
             
-            suggestions = [line.strip() for line in response.content.split('\n') if line.strip() and not line.startswith('#')]
+            with timed("suggestion_parse", "chat_suggestions"):
+                suggestions = self._suggestion_lines(response.content)
             return suggestions[:3]
             
         except Exception as e:
             print(f"Error generating chat suggestions: {e}")
+            FALLBACKS.labels("chat_suggestions").inc()
             return []
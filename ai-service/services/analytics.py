@@ -0,0 +1,180 @@
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = ["reach", "impressions", "clicks", "leads", "spend"]
+
+
+def validate_history(history: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+    """Check that a columnar history can be analyzed, raising ValueError otherwise.
+
+    Request models call this so malformed client input is rejected with a
+    422 instead of failing mid-analysis.
+    """
+    dates = history.get("date") or []
+    for column in METRIC_COLUMNS:
+        values = history.get(column)
+        if values is not None and len(values) != len(dates):
+            raise ValueError(f"History column '{column}' has {len(values)} values for {len(dates)} dates")
+    try:
+        pd.to_datetime(pd.Series(dates, dtype=object), utc=True)
+    except (ValueError, TypeError, OverflowError) as e:
+        raise ValueError(f"History dates could not be parsed: {e}")
+    return history
+
+
+class PerformanceAnalytics:
+    """Condense a campaign's daily performance series into a short summary.
+
+    History is accepted in columnar form, e.g.
+    {"date": [...], "impressions": [...], "clicks": [...], "spend": [...]},
+    matching the daily CampaignPerformance rows stored by the backend.
+    All statistics are computed in vectorized passes over the columns.
+    """
+
+    def __init__(self, window: int = 7, anomaly_z: float = 2.5):
+        self.window = window
+        self.anomaly_z = anomaly_z
+
+    def to_frame(self, history: Dict[str, List[Any]]) -> pd.DataFrame:
+        """Build a date-indexed daily frame with derived ratio metrics"""
+        dates = history.get("date") or []
+        columns = {"date": dates}
+        for column in METRIC_COLUMNS:
+            values = history.get(column)
+            if values is None:
+                values = [0] * len(dates)
+            if len(values) != len(dates):
+                raise ValueError(f"History column '{column}' has {len(values)} values for {len(dates)} dates")
+            columns[column] = values
+
+        frame = pd.DataFrame(columns)
+        if frame.empty:
+            return frame
+
+        frame["date"] = pd.to_datetime(frame["date"], utc=True)
+        frame = frame.sort_values("date").drop_duplicates("date", keep="last").set_index("date")
+        frame[METRIC_COLUMNS] = frame[METRIC_COLUMNS].apply(pd.to_numeric, errors="coerce").fillna(0).astype(float)
+
+        impressions = frame["impressions"].to_numpy()
+        clicks = frame["clicks"].to_numpy()
+        leads = frame["leads"].to_numpy()
+        spend = frame["spend"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frame["ctr"] = np.where(impressions > 0, clicks / impressions, np.nan)
+            frame["cpc"] = np.where(clicks > 0, spend / clicks, np.nan)
+            frame["cpl"] = np.where(leads > 0, spend / leads, np.nan)
+            frame["cpm"] = np.where(impressions > 0, spend / impressions * 1000, np.nan)
+        return frame
+
+    def aggregate(self, history: Dict[str, List[Any]]) -> Dict[str, Any]:
+        """Total the series into the snapshot shape used by /suggest"""
+        frame = self.to_frame(history)
+        if frame.empty:
+            return {}
+
+        totals: Dict[str, Any] = {column: int(frame[column].sum()) for column in ["reach", "impressions", "clicks", "leads"]}
+        totals["spend"] = float(frame["spend"].sum())
+        totals["days"] = len(frame)
+        totals["cpm"] = totals["spend"] / totals["impressions"] * 1000 if totals["impressions"] else 0.0
+        totals["cpc"] = totals["spend"] / totals["clicks"] if totals["clicks"] else 0.0
+        totals["cpl"] = totals["spend"] / totals["leads"] if totals["leads"] else 0.0
+        return totals
+
+    def summarize(self, history: Dict[str, List[Any]], campaign: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Rolling averages, trends, anomalies and budget pacing for a daily series"""
+        frame = self.to_frame(history)
+        if frame.empty:
+            return {}
+
+        tracked = ["spend", "leads", "ctr", "cpl", "cpm"]
+        rolling = frame[tracked].rolling(self.window, min_periods=1)
+        rolling_mean = rolling.mean()
+        # Baseline statistics exclude the current day so a spike cannot mask itself
+        baseline_mean = rolling_mean.shift(1)
+        baseline_std = frame[tracked].rolling(self.window, min_periods=3).std().shift(1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z_scores = (frame[tracked] - baseline_mean) / baseline_std.replace(0, np.nan)
+
+        summary: Dict[str, Any] = {
+            "days": len(frame),
+            "start": frame.index[0].date().isoformat(),
+            "end": frame.index[-1].date().isoformat(),
+            "rolling": {metric: _round(rolling_mean[metric].iloc[-1]) for metric in tracked},
+            "trend": self._trends(frame[tracked]),
+            "anomalies": [],
+        }
+
+        anomalous = z_scores.abs() > self.anomaly_z
+        recent = anomalous.iloc[-self.window:]
+        for day, metric in zip(*np.nonzero(recent.to_numpy())):
+            summary["anomalies"].append({
+                "date": recent.index[day].date().isoformat(),
+                "metric": tracked[metric],
+                "value": _round(frame[tracked[metric]].iloc[len(frame) - len(recent) + day]),
+                "z": _round(z_scores[tracked[metric]].iloc[len(frame) - len(recent) + day], 1),
+            })
+
+        campaign = campaign or {}
+        budget = float(campaign.get("budget") or 0)
+        if budget > 0:
+            if campaign.get("budgetType", "DAILY") == "LIFETIME":
+                summary["pacing"] = _round(frame["spend"].sum() / budget)
+            else:
+                summary["pacing"] = _round(rolling_mean["spend"].iloc[-1] / budget)
+        return summary
+
+    def _trends(self, frame: pd.DataFrame) -> Dict[str, Optional[float]]:
+        """Least-squares slope over the last window, as relative change per day"""
+        recent = frame.iloc[-self.window:]
+        if len(recent) < 3:
+            return {metric: None for metric in frame.columns}
+
+        x = np.arange(len(recent), dtype=float)
+        values = recent.to_numpy(dtype=float)
+        mask = ~np.isnan(values)
+        counts = mask.sum(axis=0)
+        filled = np.where(mask, values, 0.0)
+
+        # Vectorized per-column regression that ignores missing days
+        x_mean = (x[:, None] * mask).sum(axis=0) / np.maximum(counts, 1)
+        y_mean = filled.sum(axis=0) / np.maximum(counts, 1)
+        dx = np.where(mask, x[:, None] - x_mean, 0.0)
+        dy = np.where(mask, values - y_mean, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slopes = (dx * dy).sum(axis=0) / (dx ** 2).sum(axis=0)
+            relative = slopes / np.abs(y_mean)
+
+        return {
+            metric: (_round(value) if counts[i] >= 3 and np.isfinite(value) else None)
+            for i, (metric, value) in enumerate(zip(frame.columns, relative))
+        }
+
+    def format_summary(self, summary: Dict[str, Any]) -> str:
+        """Render a summary as a few compact prompt lines"""
+        if not summary:
+            return "No daily history available"
+
+        lines = [f"- Period: {summary['start']} to {summary['end']} ({summary['days']} days)"]
+        rolling = summary["rolling"]
+        lines.append(
+            f"- {self.window}-day avg: spend {_fmt(rolling['spend'], '.2f', '$')}/day, leads {_fmt(rolling['leads'], '.1f')}/day, "
+            f"CTR {_fmt(rolling['ctr'], '.2%')}, CPL {_fmt(rolling['cpl'], '.2f', '$')}, CPM {_fmt(rolling['cpm'], '.2f', '$')}"
+        )
+        trends = [f"{metric} {value:+.1%}/day" for metric, value in summary["trend"].items() if value is not None]
+        if trends:
+            lines.append(f"- Trend: {', '.join(trends)}")
+        if summary.get("pacing") is not None:
+            lines.append(f"- Budget pacing: {summary['pacing']:.0%}")
+        for anomaly in summary["anomalies"][:3]:
+            lines.append(f"- Anomaly: {anomaly['metric']} on {anomaly['date']} (z={anomaly['z']})")
+        return "\n".join(lines)
+
+
+def _round(value, digits: int = 4) -> Optional[float]:
+    return None if value is None or pd.isna(value) else round(float(value), digits)
+
+
+def _fmt(value: Optional[float], spec: str, prefix: str = "") -> str:
+    return "n/a" if value is None else prefix + format(value, spec)
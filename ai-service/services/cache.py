@@ -0,0 +1,376 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import AIMessage, BaseMessage
+
+from services.embeddings import EmbeddingBackend, get_embedding_backend
+from services.metrics import CACHE_EVENTS, STAGE_LATENCY, timed
+from services.single_flight import SingleFlight, normalize_prompt
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+
+class RedisCacheBackend:
+    """Shared cache tier backed by Redis, so all workers and replicas reuse completions"""
+
+    def __init__(self, url: str, prefix: str = "promoly:llm:"):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match=self.prefix + "*"):
+            await self.client.delete(key)
+
+
+class SemanticIndex:
+    """Fixed-size ring buffer of prompt embeddings for near-duplicate lookups.
+
+    Each entry also records a context digest covering everything in the
+    request except the embedded text (model, sampling settings, system
+    prompt and earlier turns). Only entries with the same context can match.
+    """
+
+    def __init__(self, dimension: int, capacity: int):
+        self.embeddings = np.zeros((capacity, dimension), dtype=np.float32)
+        self.contexts = np.zeros(capacity, dtype=np.uint64)
+        self.keys: List[Optional[str]] = [None] * capacity
+        self.cursor = 0
+
+    def add(self, key: str, context: int, embedding: np.ndarray) -> None:
+        slot = self.cursor % len(self.keys)
+        self.embeddings[slot] = embedding
+        self.contexts[slot] = context
+        self.keys[slot] = key
+        self.cursor += 1
+
+    def nearest(self, context: int, embedding: np.ndarray, threshold: float) -> Optional[str]:
+        filled = min(self.cursor, len(self.keys))
+        if filled == 0:
+            return None
+        scores = np.where(self.contexts[:filled] == np.uint64(context), self.embeddings[:filled] @ embedding, -np.inf)
+        best = int(np.argmax(scores))
+        return self.keys[best] if scores[best] >= threshold else None
+
+
+class ResponseCache:
+    """Cache for LLM completions shared by all services.
+
+    Lookups go through the in-process tier, then the optional shared tier,
+    then (for namespaces that opt in) an embedding-similarity match against
+    recently cached prompts. Namespaces correspond to the call sites, e.g.
+    "generate" or "rag", and can be disabled individually.
+    """
+
+    def __init__(
+        self,
+        local: MemoryCacheBackend,
+        shared=None,
+        ttl: float = 3600,
+        disabled_namespaces: Optional[List[str]] = None,
+        semantic_namespaces: Optional[List[str]] = None,
+        semantic_threshold: float = 0.95,
+        embedder: Optional[EmbeddingBackend] = None,
+        enabled: bool = True,
+        single_flight: Optional[SingleFlight] = None,
+    ):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.enabled = enabled
+        self.disabled_namespaces = set(disabled_namespaces or [])
+        self.semantic_namespaces = set(semantic_namespaces or [])
+        self.semantic_threshold = semantic_threshold
+        self.embedder = embedder
+        self._semantic: Dict[str, SemanticIndex] = {}
+        self.single_flight = single_flight
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def is_enabled(self, namespace: str) -> bool:
+        return self.enabled and namespace not in self.disabled_namespaces
+
+    @staticmethod
+    def make_key(namespace: str, payload: Any) -> str:
+        serialized = json.dumps(payload, sort_keys=True, default=str)
+        return f"{namespace}:{hashlib.sha256(serialized.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def _semantic_context(namespace: str, payload: Any, semantic_text: str) -> int:
+        """Digest of the payload with the semantic text cut out of the last message.
+
+        The text is matched by embedding instead; everything rendered around
+        it, such as retrieved context, must still match exactly.
+        """
+        if isinstance(payload, dict) and payload.get("messages"):
+            role, content = payload["messages"][-1]
+            content = content.replace(semantic_text, "\0") if isinstance(content, str) else content
+            payload = dict(payload, messages=payload["messages"][:-1] + [(role, content)])
+        serialized = json.dumps([namespace, payload], sort_keys=True, default=str)
+        return int.from_bytes(hashlib.sha256(serialized.encode("utf-8")).digest()[:8], "little")
+
+    async def get(self, namespace: str, payload: Any, semantic_text: Optional[str] = None) -> Optional[Any]:
+        if not self.is_enabled(namespace):
+            return None
+
+        key = self.make_key(namespace, payload)
+        value = await self._lookup(key)
+        if value is not None:
+            self.counters[namespace]["hits"] += 1
+            CACHE_EVENTS.labels(namespace, "hit").inc()
+            return value
+
+        if semantic_text and namespace in self.semantic_namespaces and namespace in self._semantic:
+            similar_key = self._semantic[namespace].nearest(
+                self._semantic_context(namespace, payload, semantic_text),
+                await self.embedder.aembed_query(semantic_text),
+                self.semantic_threshold
+            )
+            if similar_key:
+                value = await self._lookup(similar_key)
+                if value is not None:
+                    self.counters[namespace]["semantic_hits"] += 1
+                    CACHE_EVENTS.labels(namespace, "semantic_hit").inc()
+                    return value
+
+        self.counters[namespace]["misses"] += 1
+        CACHE_EVENTS.labels(namespace, "miss").inc()
+        return None
+
+    async def set(self, namespace: str, payload: Any, value: Any, semantic_text: Optional[str] = None) -> None:
+        if not self.is_enabled(namespace):
+            return
+
+        key = self.make_key(namespace, payload)
+        await self.local.set(key, value, self.ttl)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, value, self.ttl)
+            except Exception as e:
+                print(f"Error writing to shared cache: {e}")
+
+        if semantic_text and namespace in self.semantic_namespaces:
+            if namespace not in self._semantic:
+                self._semantic[namespace] = SemanticIndex(self.embedder.dimension, self.local.max_entries)
+            embedding = await self.embedder.aembed_query(semantic_text)
+            self._semantic[namespace].add(key, self._semantic_context(namespace, payload, semantic_text), embedding)
+
+    async def _lookup(self, key: str) -> Optional[Any]:
+        value = await self.local.get(key)
+        if value is not None or self.shared is None:
+            return value
+
+        try:
+            value = await self.shared.get(key)
+        except Exception as e:
+            print(f"Error reading from shared cache: {e}")
+            return None
+        if value is not None:
+            await self.local.set(key, value, self.ttl)
+        return value
+
+    @staticmethod
+    def _payload(llm, messages: List[BaseMessage], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "model": getattr(llm, "model_name", None),
+            "temperature": getattr(llm, "temperature", None),
+            "messages": [(message.type, message.content) for message in messages],
+            "kwargs": kwargs,
+        }
+
+    async def ainvoke(
+        self,
+        llm,
+        messages: List[BaseMessage],
+        namespace: str,
+        validate: Optional[Callable[[str], bool]] = None,
+        semantic_text: Optional[str] = None,
+        **kwargs
+    ) -> AIMessage:
+        """Cached drop-in for `llm.ainvoke(messages)`.
+
+        The key covers the model, its sampling temperature and every message.
+        Errors are never cached, so callers keep their existing fallbacks;
+        neither are completions rejected by `validate`.
+        On a miss, concurrent calls with the same whitespace-normalized
+        prompt share one upstream call. `semantic_text` is the raw user input
+        inside the last message; only calls that pass it can get semantic hits.
+        """
+        payload = self._payload(llm, messages, kwargs)
+
+        cached = await self.get(namespace, payload, semantic_text)
+        if cached is not None:
+            return AIMessage(content=cached)
+
+        async def complete() -> AIMessage:
+            with timed("llm_call", namespace):
+                response = await llm.ainvoke(messages, **kwargs)
+            if validate is None or validate(response.content):
+                await self.set(namespace, payload, response.content, semantic_text)
+            return response
+
+        if self.single_flight is None:
+            return await complete()
+
+        flight_payload = dict(payload, messages=[(role, normalize_prompt(content)) for role, content in payload["messages"]])
+        return await self.single_flight.do(self.make_key(namespace, flight_payload), complete)
+
+    async def asample(
+        self,
+        llm,
+        messages: List[BaseMessage],
+        namespace: str,
+        n: int,
+        validate: Optional[Callable[[List[str]], bool]] = None,
+        **kwargs
+    ) -> List[str]:
+        """Cached drop-in for `llm.asample(messages, n)`, returning the n completions.
+
+        The samples of one request are cached together under a key that
+        includes `n`, with the same validation and single-flight behavior
+        as `ainvoke`.
+        """
+        payload = self._payload(llm, messages, dict(kwargs, n=n))
+
+        cached = await self.get(namespace, payload)
+        if cached is not None:
+            return cached
+
+        async def complete() -> List[str]:
+            with timed("llm_call", namespace):
+                samples = await llm.asample(messages, n, **kwargs)
+            if validate is None or validate(samples):
+                await self.set(namespace, payload, samples)
+            return samples
+
+        if self.single_flight is None:
+            return await complete()
+
+        flight_payload = dict(payload, messages=[(role, normalize_prompt(content)) for role, content in payload["messages"]])
+        return await self.single_flight.do(self.make_key(namespace, flight_payload), complete)
+
+    async def astream(
+        self,
+        llm,
+        messages: List[BaseMessage],
+        namespace: str,
+        validate: Optional[Callable[[str], bool]] = None,
+        semantic_text: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Cached drop-in for `llm.astream(messages)` yielding text chunks.
+
+        A cache hit is replayed as a single chunk. The full text is only
+        cached once the stream completes, and not when it is empty or
+        rejected by `validate`. `semantic_text` works as in `ainvoke`.
+        """
+        payload = self._payload(llm, messages, kwargs)
+
+        cached = await self.get(namespace, payload, semantic_text)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        start = time.perf_counter()
+        async for chunk in llm.astream(messages, **kwargs):
+            if chunk.content:
+                if not parts:
+                    STAGE_LATENCY.labels("llm_first_token", namespace).observe(time.perf_counter() - start)
+                parts.append(chunk.content)
+                yield chunk.content
+        STAGE_LATENCY.labels("llm_stream", namespace).observe(time.perf_counter() - start)
+        text = "".join(parts)
+        if text.strip() and (validate is None or validate(text)):
+            await self.set(namespace, payload, text, semantic_text)
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace, counters in self.counters.items():
+            hits = counters["hits"] + counters["semantic_hits"]
+            total = hits + counters["misses"]
+            namespaces[namespace] = {
+                **counters,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+            }
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.local),
+            "shared_tier": type(self.shared).__name__ if self.shared is not None else None,
+            "namespaces": namespaces,
+            "single_flight": self.single_flight.stats() if self.single_flight is not None else None,
+        }
+
+    async def clear(self) -> None:
+        await self.local.clear()
+        self._semantic.clear()
+        if self.shared is not None:
+            await self.shared.clear()
+
+
+def _env_list(name: str) -> List[str]:
+    return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache configured from the environment"""
+    global _response_cache
+    if _response_cache is None:
+        redis_url = os.getenv("CACHE_REDIS_URL")
+        semantic_namespaces = _env_list("CACHE_SEMANTIC_NAMESPACES")
+        _response_cache = ResponseCache(
+            local=MemoryCacheBackend(int(os.getenv("CACHE_MAX_ENTRIES", "1000"))),
+            shared=RedisCacheBackend(redis_url) if redis_url else None,
+            ttl=float(os.getenv("CACHE_TTL_SECONDS", "3600")),
+            disabled_namespaces=_env_list("CACHE_DISABLED_NAMESPACES"),
+            semantic_namespaces=semantic_namespaces,
+            semantic_threshold=float(os.getenv("CACHE_SEMANTIC_THRESHOLD", "0.95")),
+            embedder=get_embedding_backend() if semantic_namespaces else None,
+            enabled=os.getenv("CACHE_ENABLED", "true").lower() == "true",
+            single_flight=SingleFlight() if os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true" else None,
+        )
+    return _response_cache
@@ -0,0 +1,132 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.schema import HumanMessage, SystemMessage
+
+from services.metrics import FALLBACKS
+from services.model_router import ModelRouter
+from services.prompts import PromptRegistry
+from services.tokens import TokenCounter
+
+
+
+class ChatHistoryManager:
+    """Keep chat prompts within a token budget.
+
+    The newest messages are sent verbatim. Once they exceed `max_tokens`,
+    the window slides forward until they fit in `window_tokens`, and the
+    messages that fell out are folded into a rolling summary. The headroom
+    between the two budgets means the summary is only extended every few
+    turns. Summaries are stored per conversation together with a digest of
+    the messages they cover, so an edited history starts over.
+    """
+
+    def __init__(
+        self,
+        router: ModelRouter,
+        prompts: PromptRegistry,
+        store,
+        counter: TokenCounter,
+        max_tokens: int = 3000,
+        window_tokens: int = 1500,
+        ttl: float = 86400,
+    ):
+        self.router = router
+        self.prompts = prompts
+        self.store = store
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.window_tokens = min(window_tokens, max_tokens)
+        self.ttl = ttl
+
+    async def prepare(
+        self,
+        messages: List[Dict[str, str]],
+        conversation_id: Optional[str] = None
+    ) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """Return the summary of older turns (if any) and the messages to send verbatim"""
+        if not messages:
+            return None, []
+
+        key = conversation_id or self.conversation_key(messages)
+        summary, covered, owned = await self._load(key, messages)
+
+        recent = messages[covered:]
+        counts = [self.counter.count_message(message.get("content")) for message in recent]
+        total = sum(counts)
+        if total <= self.max_tokens:
+            return summary, recent
+
+        # Slide the window, always keeping the latest message and starting on a user turn
+        start = 0
+        while start < len(recent) - 1 and (total > self.window_tokens or recent[start].get("role") != "user"):
+            total -= counts[start]
+            start += 1
+        if start == 0:
+            # A single oversized message; there is nothing older to fold into the summary
+            return summary, recent
+
+        try:
+            summary = await self._summarize(summary, recent[:start])
+        except Exception as e:
+            # Send the window without the dropped turns; they are summarized on the next turn
+            print(f"Error summarizing chat history: {e}")
+            FALLBACKS.labels("chat_summary").inc()
+            return summary, recent[start:]
+
+        covered += start
+        # A derived key may be shared with another conversation; never overwrite its summary
+        if owned or conversation_id:
+            await self._save(key, messages[:covered], summary)
+        return summary, messages[covered:]
+
+    @staticmethod
+    def conversation_key(messages: List[Dict[str, str]]) -> str:
+        """Key for clients that send no conversation id: the opening exchange.
+
+        The first three messages (opening question, reply, follow-up) rarely
+        repeat across conversations, unlike a greeting on its own. When they
+        do, the digest check keeps the summaries apart and the slot stays
+        with the conversation that claimed it first.
+        """
+        return "opening:" + ChatHistoryManager._digest(messages[:3])
+
+    @staticmethod
+    def _digest(messages: List[Dict[str, str]]) -> str:
+        serialized = json.dumps([(message.get("role"), message.get("content")) for message in messages])
+        return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+    async def _load(self, key: str, messages: List[Dict[str, str]]) -> Tuple[Optional[str], int, bool]:
+        """The stored summary and how many messages it covers, plus whether the slot is free or ours"""
+        try:
+            state: Optional[Dict[str, Any]] = await self.store.get(key)
+        except Exception as e:
+            print(f"Error reading chat summary: {e}")
+            return None, 0, False
+
+        if not state:
+            return None, 0, True
+        if state["covered"] >= len(messages) or state["digest"] != self._digest(messages[:state["covered"]]):
+            return None, 0, False
+        return state["summary"], state["covered"], True
+
+    async def _save(self, key: str, covered_messages: List[Dict[str, str]], summary: str) -> None:
+        state = {"covered": len(covered_messages), "digest": self._digest(covered_messages), "summary": summary}
+        try:
+            await self.store.set(key, state, self.ttl)
+        except Exception as e:
+            print(f"Error writing chat summary: {e}")
+
+    async def _summarize(self, summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+        transcript = "\n".join(f"{message.get('role', 'user')}: {message.get('content', '')}" for message in messages)
+        if summary:
+            content = self.prompts.render("chat_summary_update", summary=summary, transcript=transcript)
+        else:
+            content = self.prompts.render("chat_summary_initial", transcript=transcript)
+
+        response = await self.router.ainvoke("chat_summary", [
+            SystemMessage(content=self.prompts.render("chat_summary_system")),
+            HumanMessage(content=content)
+        ], temperature=0, validate=lambda text: bool(text.strip()), max_tokens=300)
+        return response.content.strip()
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or "
+    "should the to what when which why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokenizer shared by the local retrieval components"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class EmbeddingBackend:
+    """Base class for embedding backends.
+
+    Backends return a float32 matrix of shape (len(texts), dimension) with
+    L2-normalized rows, so cosine similarity is a plain dot product.
+    Request handlers use the async variants, which by default run `embed`
+    in a worker thread so a blocking backend never stalls the event loop.
+    """
+
+    dimension: int
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed, texts)
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        return (await self.aembed([text]))[0]
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32, copy=False)
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """Deterministic local embeddings using signed feature hashing.
+
+    Unigrams and bigrams are hashed into a fixed number of buckets with
+    sublinear term-frequency weighting. Needs no network access or model
+    download, which makes it suitable for tests and offline development.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        bigrams = [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+        return tokens + bigrams
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                cols.append(digest % self.dimension)
+                signs.append(1.0 if (digest >> 31) & 1 else -1.0)
+
+        if rows:
+            np.add.at(matrix, (np.array(rows), np.array(cols)), np.array(signs, dtype=np.float32))
+            matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+
+        return self._normalize(matrix)
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        # Pure local arithmetic, cheaper than a thread hop
+        return self.embed(texts)
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Embeddings from the OpenAI embeddings API.
+
+    Given a provider, async calls go through its shared connection pool,
+    concurrency slots and retries. The sync `embed` keeps its own client and
+    is meant for ingestion, which runs outside the event loop.
+    """
+
+    def __init__(self, model: str = "text-embedding-3-small", dimension: int = 1536, provider=None):
+        from langchain_openai import OpenAIEmbeddings
+
+        self.model = model
+        self.dimension = dimension
+        self.provider = provider
+        options = {}
+        if provider is not None:
+            options = {"async_client": provider.async_client.embeddings, "openai_api_base": provider.base_url}
+        self.client = OpenAIEmbeddings(
+            model=model,
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            **options
+        )
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        vectors = self.client.embed_documents(texts)
+        return self._normalize(np.asarray(vectors, dtype=np.float32))
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        if self.provider is None:
+            return await super().aembed(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        vectors = await self.provider.call(self.model, lambda: self.client.aembed_documents(texts))
+        return self._normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """Build the embedding backend selected by EMBEDDING_BACKEND"""
+    backend = os.getenv("EMBEDDING_BACKEND", "hashing").lower()
+    dimension = os.getenv("EMBEDDING_DIMENSION")
+
+    if backend == "openai":
+        from services.llm_provider import get_llm_provider
+
+        return OpenAIEmbeddingBackend(
+            model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+            dimension=int(dimension or 1536),
+            provider=get_llm_provider()
+        )
+    if backend == "hashing":
+        return HashingEmbeddingBackend(dimension=int(dimension or 384))
+
+    raise ValueError(f"Unknown embedding backend: {backend}")
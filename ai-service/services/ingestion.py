@@ -0,0 +1,105 @@
+import hashlib
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from services.embeddings import EmbeddingBackend
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def chunk_text(text: str, max_words: int = 120, overlap: int = 20) -> List[str]:
+    """Split text into sentence-aligned chunks of roughly max_words words.
+
+    Consecutive chunks share up to `overlap` trailing words so that facts
+    spanning a boundary are still retrievable from either side.
+    """
+    sentences = [s.strip() for s in SENTENCE_PATTERN.split(text.strip()) if s.strip()]
+    chunks: List[str] = []
+    current: List[str] = []
+
+    for sentence in sentences:
+        words = sentence.split()
+        if current and len(current) + len(words) > max_words:
+            chunks.append(" ".join(current))
+            current = current[-overlap:] if overlap else []
+        current.extend(words)
+
+        # Hard-split sentences that are longer than a whole chunk
+        while len(current) > max_words:
+            chunks.append(" ".join(current[:max_words]))
+            current = current[max_words - overlap:] if overlap else current[max_words:]
+
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def document_id(content: str, source: str) -> str:
+    """Stable id for documents ingested without an explicit id"""
+    return hashlib.sha1(f"{source}\n{content}".encode("utf-8")).hexdigest()[:16]
+
+
+def prepare_documents(
+    embedder: EmbeddingBackend, documents: List[Dict[str, Any]], max_words: int = 120, overlap: int = 20
+) -> Tuple[List[str], List[Dict[str, Any]], np.ndarray]:
+    """Chunk and embed documents of the form {"content", "source", optional "id"}.
+
+    Returns the document ids, the chunk rows and their embeddings.
+    """
+    chunks: List[Dict[str, Any]] = []
+    doc_ids: List[str] = []
+
+    for doc in documents:
+        doc_id = doc.get("id") or document_id(doc["content"], doc.get("source", ""))
+        doc_ids.append(doc_id)
+        for position, chunk in enumerate(chunk_text(doc["content"], max_words, overlap)):
+            chunks.append({
+                "doc_id": doc_id,
+                "chunk": position,
+                "content": chunk,
+                "source": doc.get("source", "Unknown"),
+            })
+
+    embeddings = embedder.embed([chunk["content"] for chunk in chunks])
+    return doc_ids, chunks, embeddings
+
+
+class IngestionPipeline:
+    """Chunk, embed and index documents.
+
+    Works with both the in-memory and the persistent vector index.
+    Re-ingesting a document id replaces its previous chunks.
+    """
+
+    def __init__(self, embedder: EmbeddingBackend, index, max_words: int = 120, overlap: int = 20):
+        self.embedder = embedder
+        self.index = index
+        self.max_words = max_words
+        self.overlap = overlap
+
+    def ingest(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Ingest documents of the form {"content", "source", optional "id"}.
+
+        Everything is embedded before the old versions are deleted, so a
+        failed embedding call leaves the index unchanged.
+        """
+        doc_ids, chunks, embeddings = prepare_documents(self.embedder, documents, self.max_words, self.overlap)
+
+        self.index.delete(doc_ids)
+        if chunks:
+            self.index.add(chunks, embeddings)
+
+        return {"doc_ids": doc_ids, "chunks": len(chunks)}
+
+    def delete(self, doc_ids: List[str]) -> int:
+        """Remove documents from the index, returning the number of chunks removed"""
+        return self.index.delete(doc_ids)
+
+    def compact(self) -> Optional[int]:
+        """Reclaim space held by deleted chunks, if the index supports it"""
+        if hasattr(self.index, "compact"):
+            self.index.compact()
+            return len(self.index)
+        return None
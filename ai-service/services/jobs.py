@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+
+from services.metrics import JOB_EVENTS, STAGE_LATENCY
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class Job:
+    def __init__(self, job_type: str, payload: Any, priority: int, callback_url: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.payload = payload
+        self.priority = priority
+        self.callback_url = callback_url
+        self.status = QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED, CANCELLED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """Bounded in-process priority queue served by a fixed pool of workers.
+
+    Submitting returns immediately; lower priority numbers run first and
+    jobs of equal priority run in submission order. Results are kept for
+    `result_ttl` seconds after a job finishes for polling, and are POSTed to
+    the job's callback URL when one is given (signed with HMAC-SHA256 when a
+    webhook secret is configured). Callback URLs must point at one of
+    `callback_hosts`; with none configured callbacks are refused, so the
+    service cannot be made to POST to arbitrary internal hosts. Jobs live
+    in memory only, so they do not survive a restart and are not shared
+    between uvicorn workers.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queued: int = 1000,
+        result_ttl: float = 3600,
+        job_timeout: float = 120,
+        webhook_retries: int = 3,
+        webhook_secret: Optional[str] = None,
+        callback_hosts: Optional[List[str]] = None,
+    ):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.job_timeout = job_timeout
+        self.webhook_retries = webhook_retries
+        self.webhook_secret = webhook_secret
+        self.callback_hosts = {host.lower() for host in callback_hosts or []}
+
+        self._handlers: Dict[str, Callable[[Any], Awaitable[Any]]] = {}
+        self._default_priorities: Dict[str, int] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._queued = 0
+        self._workers: Set[asyncio.Task] = set()
+        self._webhooks: Set[asyncio.Task] = set()
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+    def register(self, job_type: str, handler: Callable[[Any], Awaitable[Any]], priority: int = 5) -> None:
+        """Add a job type; `handler(payload)` returns a JSON-serializable result"""
+        self._handlers[job_type] = handler
+        self._default_priorities[job_type] = priority
+
+    @property
+    def job_types(self):
+        return sorted(self._handlers)
+
+    def submit(self, job_type: str, payload: Any, priority: Optional[int] = None, callback_url: Optional[str] = None) -> Job:
+        """Enqueue a job and return it without waiting. Must be called from the event loop."""
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type '{job_type}'")
+        if callback_url and not self.allows_callback(callback_url):
+            raise ValueError("callback_url host is not in JOB_CALLBACK_HOSTS")
+        if self._queued >= self.max_queued:
+            JOB_EVENTS.labels(job_type, "rejected").inc()
+            raise JobQueueFull(f"{self._queued} jobs already queued")
+
+        self._ensure_workers()
+        self._evict_expired()
+
+        job = Job(job_type, payload, self._default_priorities[job_type] if priority is None else priority, callback_url)
+        self._jobs[job.id] = job
+        self._queued += 1
+        self._queue.put_nowait((job.priority, next(self._sequence), job.id))
+        JOB_EVENTS.labels(job_type, QUEUED).inc()
+        return job
+
+    def allows_callback(self, url: str) -> bool:
+        parts = urlsplit(url)
+        return parts.scheme in ("http", "https") and (parts.hostname or "").lower() in self.callback_hosts
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._evict_expired()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet"""
+        job = self._jobs.get(job_id)
+        if job is None or job.status != QUEUED:
+            return False
+        self._finish(job, CANCELLED)
+        self._queued -= 1
+        return True
+
+    def _ensure_workers(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._http_client = httpx.AsyncClient(timeout=httpx.Timeout(10.0))
+        while len(self._workers) < self.workers:
+            task = asyncio.create_task(self._worker())
+            self._workers.add(task)
+            task.add_done_callback(self._workers.discard)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                continue
+            self._queued -= 1
+            await self._run(job)
+
+    async def _run(self, job: Job) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        STAGE_LATENCY.labels("job_queue_wait", job.type).observe(job.started_at - job.created_at)
+        try:
+            result = await asyncio.wait_for(self._handlers[job.type](job.payload), timeout=self.job_timeout)
+        except asyncio.TimeoutError:
+            self._finish(job, FAILED, error=f"Job timed out after {self.job_timeout:.0f}s")
+        except Exception as e:
+            print(f"Error running {job.type} job {job.id}: {e}")
+            self._finish(job, FAILED, error=str(e))
+        else:
+            self._finish(job, SUCCEEDED, result=result)
+        STAGE_LATENCY.labels("job_run", job.type).observe(job.finished_at - job.started_at)
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        JOB_EVENTS.labels(job.type, status).inc()
+        if job.callback_url:
+            task = asyncio.create_task(self._notify(job))
+            self._webhooks.add(task)
+            task.add_done_callback(self._webhooks.discard)
+
+    async def _notify(self, job: Job) -> None:
+        """POST the finished job to its callback URL, retrying with backoff"""
+        body = json.dumps(job.to_dict()).encode("utf-8")
+        headers = {"Content-Type": "application/json", "X-Promoly-Job-Id": job.id}
+        if self.webhook_secret:
+            signature = hmac.new(self.webhook_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+            headers["X-Promoly-Signature"] = f"sha256={signature}"
+
+        for attempt in range(self.webhook_retries + 1):
+            try:
+                response = await self._http_client.post(job.callback_url, content=body, headers=headers)
+                if response.status_code < 500:
+                    if response.status_code >= 400:
+                        print(f"Webhook for job {job.id} rejected with {response.status_code}")
+                    return
+            except httpx.HTTPError as e:
+                print(f"Error delivering webhook for job {job.id}: {e}")
+            if attempt < self.webhook_retries:
+                await asyncio.sleep(2 ** attempt)
+        JOB_EVENTS.labels(job.type, "webhook_failed").inc()
+
+    def _evict_expired(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "queued": self._queued,
+            "jobs": counts,
+        }
+
+    async def stop(self) -> None:
+        """Stop the workers and give pending webhooks a chance to finish"""
+        for task in list(self._workers):
+            task.cancel()
+        if self._webhooks:
+            await asyncio.wait(list(self._webhooks), timeout=5)
+        if self._http_client is not None:
+            await self._http_client.aclose()
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue configured from the environment"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            workers=int(os.getenv("JOB_WORKERS", "4")),
+            max_queued=int(os.getenv("JOB_MAX_QUEUED", "1000")),
+            result_ttl=float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600")),
+            job_timeout=float(os.getenv("JOB_TIMEOUT_SECONDS", "120")),
+            webhook_retries=int(os.getenv("JOB_WEBHOOK_RETRIES", "3")),
+            webhook_secret=os.getenv("JOB_WEBHOOK_SECRET") or None,
+            callback_hosts=[host.strip() for host in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if host.strip()],
+        )
+    return _job_queue
@@ -0,0 +1,39 @@
+from typing import Dict, List
+
+# Marketing best practices the service ships with. The in-memory index is
+# seeded with these on startup and an on-disk index when it is created, so
+# deleting them from an on-disk index through the API sticks.
+DEFAULT_DOCUMENTS: List[Dict[str, str]] = [
+    {
+        "content": "Facebook Ad Best Practices: Use high-quality images, keep text minimal, include clear CTAs, test multiple ad formats, and target specific audiences based on interests and behaviors.",
+        "source": "Facebook Marketing Best Practices Guide"
+    },
+    {
+        "content": "Ad Copy Optimization: Write compelling headlines under 40 characters, use emotional triggers, focus on benefits over features, include urgency or scarcity, and test different angles.",
+        "source": "Digital Marketing Copywriting Guide"
+    },
+    {
+        "content": "Audience Targeting: Start with broad audiences and narrow down based on performance, use lookalike audiences for scaling, exclude existing customers, and test different age ranges and interests.",
+        "source": "Audience Targeting Strategies"
+    },
+    {
+        "content": "Budget Optimization: Start with small budgets to test, increase budget for well-performing ads, use automatic bidding initially, and monitor cost per result metrics.",
+        "source": "Budget Management Guide"
+    },
+    {
+        "content": "Campaign Structure: Organize campaigns by objective, use ad sets for different audiences, create multiple ad variations, and maintain consistent naming conventions.",
+        "source": "Campaign Organization Best Practices"
+    },
+    {
+        "content": "Performance Metrics: Focus on cost per lead (CPL), click-through rate (CTR), conversion rate, and return on ad spend (ROAS). Track these metrics daily and optimize accordingly.",
+        "source": "Performance Tracking Guide"
+    },
+    {
+        "content": "Creative Testing: Test different images, videos, headlines, and ad copy. Use A/B testing with 20% budget allocation to test variations and scale winners.",
+        "source": "Creative Testing Strategies"
+    },
+    {
+        "content": "Lead Generation: Use lead ads for better conversion rates, optimize landing pages for mobile, offer valuable content, and follow up quickly with leads.",
+        "source": "Lead Generation Best Practices"
+    }
+]
@@ -0,0 +1,115 @@
+import math
+from array import array
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.embeddings import tokenize
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring over the rows of a vector index.
+
+    Row numbers match the vector index, so both retrievers describe the same
+    chunks. `sync` indexes only rows appended since the last call and starts
+    over when the row list is replaced (e.g. after compaction). A query only
+    touches the postings of its own terms, so its cost grows with how common
+    those terms are rather than with the corpus size. Like the vector
+    indexes, deleted rows are filtered at query time through an alive mask;
+    they still count towards document frequencies until compaction.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._reset(None)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reset(self, documents: Optional[List[Dict[str, Any]]]) -> None:
+        self._documents = documents
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._lengths = np.zeros(64, dtype=np.float32)
+        self._size = 0
+        self._total_length = 0.0
+
+    def sync(self, documents: List[Dict[str, Any]], size: Optional[int] = None) -> None:
+        """Index the first `size` rows of `documents` (all by default) not indexed yet"""
+        size = len(documents) if size is None else size
+        if documents is not self._documents or size < self._size:
+            self._reset(documents)
+
+        for row in range(self._size, size):
+            self._add(row, documents[row].get("content", ""))
+
+    def _add(self, row: int, text: str) -> None:
+        counts = Counter(tokenize(text))
+        for term, frequency in counts.items():
+            rows, frequencies = self._postings.setdefault(term, (array("l"), array("f")))
+            rows.append(row)
+            frequencies.append(frequency)
+
+        if row >= len(self._lengths):
+            self._lengths = np.concatenate([self._lengths, np.zeros(len(self._lengths), dtype=np.float32)])
+        length = sum(counts.values())
+        self._lengths[row] = length
+        self._total_length += length
+        self._size = row + 1
+
+    def search(self, query: str, k: int = 3, alive: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Return up to k (row, score) pairs with a positive BM25 score"""
+        if self._size == 0:
+            return []
+
+        average_length = self._total_length / self._size or 1.0
+        row_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            rows = np.array(posting[0], dtype=np.int64)
+            frequencies = np.array(posting[1], dtype=np.float32)
+            idf = math.log(1 + (self._size - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[rows] / average_length)
+            row_parts.append(rows)
+            score_parts.append(idf * frequencies * (self.k1 + 1) / (frequencies + norm))
+
+        if not row_parts:
+            return []
+
+        rows = np.concatenate(row_parts)
+        scores = np.concatenate(score_parts)
+        if len(row_parts) > 1:
+            if len(rows) * 8 > self._size:
+                # Common terms: accumulating into a dense score vector beats sorting the postings
+                scores = np.bincount(rows, weights=scores, minlength=self._size)
+                rows = np.flatnonzero(scores)
+                scores = scores[rows]
+            else:
+                rows, inverse = np.unique(rows, return_inverse=True)
+                scores = np.bincount(inverse, weights=scores)
+        if alive is not None:
+            keep = alive[rows]
+            rows, scores = rows[keep], scores[keep]
+
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores)
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[Hashable, Any]]], k: int = 60) -> List[Tuple[Any, float]]:
+    """Fuse ranked lists of (key, item) pairs by summing 1 / (k + rank).
+
+    Items are identified by key across lists and returned once, best first.
+    """
+    scores: Dict[Hashable, float] = {}
+    items: Dict[Hashable, Any] = {}
+    for ranking in rankings:
+        for rank, (key, item) in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            items.setdefault(key, item)
+    return [(items[key], score) for key, score in sorted(scores.items(), key=lambda entry: -entry[1])]
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import random
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import openai
+from langchain_openai import ChatOpenAI
+
+from services.metrics import LLM_ERRORS, LLM_RETRIES, LLM_TOKENS, token_usage_handler
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class ManagedChatModel:
+    """ChatOpenAI wrapper that routes calls through the shared provider.
+
+    Exposes the `ainvoke`/`astream` subset of the LangChain interface the
+    services use, `asample` for drawing several completions in one request,
+    plus `model_name` and `temperature` for cache keys.
+    """
+
+    def __init__(self, llm: ChatOpenAI, provider: "LLMProvider"):
+        self.llm = llm
+        self.provider = provider
+
+    @property
+    def model_name(self) -> str:
+        return self.llm.model_name
+
+    @property
+    def temperature(self) -> float:
+        return self.llm.temperature
+
+    async def ainvoke(self, messages: List, **kwargs):
+        config = {"callbacks": [token_usage_handler]}
+        return await self.provider.call(self.model_name, lambda: self.llm.ainvoke(messages, config=config, **kwargs))
+
+    async def asample(self, messages: List, n: int, **kwargs) -> List[str]:
+        """Draw `n` completions of the same prompt in a single request"""
+        result = await self.provider.call(
+            self.model_name,
+            lambda: self.llm.agenerate([messages], callbacks=[token_usage_handler], n=n, **kwargs)
+        )
+        return [generation.text for generation in result.generations[0]]
+
+    async def astream(self, messages: List, **kwargs) -> AsyncIterator[Any]:
+        # Retrying is only safe until the first chunk has been handed to the caller
+        attempt = 0
+        while True:
+            chunks = 0
+            try:
+                async with self.provider.slot(self.model_name):
+                    async for chunk in self.llm.astream(messages, **kwargs):
+                        chunks += 1
+                        yield chunk
+                # Usage is not reported for streams; each chunk is roughly one token
+                LLM_TOKENS.labels(self.model_name, "completion").inc(chunks)
+                return
+            except RETRYABLE_ERRORS as e:
+                if chunks or attempt >= self.provider.max_retries:
+                    LLM_ERRORS.labels(self.model_name, type(e).__name__).inc()
+                    raise
+                LLM_RETRIES.labels(self.model_name, type(e).__name__).inc()
+                await asyncio.sleep(self.provider.retry_delay(e, attempt))
+                attempt += 1
+            except Exception as e:
+                LLM_ERRORS.labels(self.model_name, type(e).__name__).inc()
+                raise
+
+
+class LLMProvider:
+    """Single owner of the OpenAI HTTP connection pool.
+
+    All chat models share one keep-alive httpx pool, a concurrency
+    semaphore per model, and retry with exponential backoff on rate limits,
+    connection errors and 5xx responses (honoring Retry-After). Setting
+    OPENAI_BASE_URL points every model at a local stub server.
+    """
+
+    def __init__(self):
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        self.base_url = os.getenv("OPENAI_BASE_URL") or None
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+        self.retry_max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+        self.request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+                keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+            ),
+            timeout=httpx.Timeout(self.request_timeout, connect=10.0),
+        )
+        # Retries are handled here so that backoff happens outside the concurrency slot
+        self.async_client = openai.AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+        # LangChain insists on a sync client as well; it is never used on request paths
+        self.sync_client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._models: Dict[tuple, ManagedChatModel] = {}
+
+    def chat_model(self, temperature: float, model: Optional[str] = None, **kwargs) -> ManagedChatModel:
+        """Return a (cached) chat model that uses the shared pool"""
+        model = model or os.getenv("MODEL_NAME", "gpt-4o-mini")
+        key = (model, temperature, tuple(sorted(kwargs.items())))
+        if key not in self._models:
+            llm = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                openai_api_key=self.api_key,
+                client=self.sync_client.chat.completions,
+                async_client=self.async_client.chat.completions,
+                max_retries=0,
+                **kwargs
+            )
+            self._models[key] = ManagedChatModel(llm, self)
+        return self._models[key]
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        """Hold one of the model's concurrency slots"""
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphores[model]:
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+            try:
+                yield
+            finally:
+                self._in_flight[model] -= 1
+
+    async def call(self, model: str, factory):
+        """Run `factory()` in a concurrency slot, retrying transient upstream errors"""
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(model):
+                    return await factory()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    LLM_ERRORS.labels(model, type(e).__name__).inc()
+                    raise
+                delay = self.retry_delay(e, attempt)
+                print(f"Retrying {model} call in {delay:.2f}s after {type(e).__name__}")
+                LLM_RETRIES.labels(model, type(e).__name__).inc()
+                await asyncio.sleep(delay)
+                attempt += 1
+            except Exception as e:
+                LLM_ERRORS.labels(model, type(e).__name__).inc()
+                raise
+
+    def retry_delay(self, error: Exception, attempt: int) -> float:
+        """Exponential backoff with full jitter, or the server's Retry-After when given"""
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            try:
+                if retry_after is not None:
+                    return min(float(retry_after), self.retry_max_delay)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "models": sorted({key[0] for key in self._models}),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": dict(self._in_flight),
+        }
+
+    async def aclose(self) -> None:
+        await self.http_client.aclose()
+
+
+_llm_provider: Optional[LLMProvider] = None
+
+
+def get_llm_provider() -> LLMProvider:
+    """Return the process-wide LLM provider configured from the environment"""
+    global _llm_provider
+    if _llm_provider is None:
+        _llm_provider = LLMProvider()
+    return _llm_provider
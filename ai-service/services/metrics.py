@@ -0,0 +1,156 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+REQUEST_LATENCY = Histogram(
+    "ai_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "ai_stage_duration_seconds",
+    "Latency of internal pipeline stages",
+    ["stage", "namespace"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "ai_llm_tokens_total",
+    "Tokens sent to and received from the LLM",
+    ["model", "kind"],
+)
+LLM_ERRORS = Counter(
+    "ai_llm_errors_total",
+    "Failed LLM calls by error type",
+    ["model", "error"],
+)
+LLM_RETRIES = Counter(
+    "ai_llm_retries_total",
+    "LLM calls retried after a transient upstream error",
+    ["model", "error"],
+)
+CACHE_EVENTS = Counter(
+    "ai_cache_events_total",
+    "Response cache lookups by result",
+    ["namespace", "result"],
+)
+COALESCED_CALLS = Counter(
+    "ai_coalesced_calls_total",
+    "LLM calls served by an identical in-flight call",
+)
+FALLBACKS = Counter(
+    "ai_fallbacks_total",
+    "Responses served from a fallback path instead of the LLM",
+    ["namespace"],
+)
+STRUCTURED_REASKS = Counter(
+    "ai_structured_reasks_total",
+    "LLM calls repeated because the structured output could not be parsed",
+    ["namespace"],
+)
+JOB_EVENTS = Counter(
+    "ai_jobs_total",
+    "Async job lifecycle events by job type",
+    ["type", "event"],
+)
+ADMISSION_LIMIT = Gauge(
+    "ai_admission_limit",
+    "Current adaptive concurrency limit for LLM-backed routes",
+    multiprocess_mode="livesum",
+)
+SHED_REQUESTS = Counter(
+    "ai_shed_requests_total",
+    "Requests rejected with 503 by admission control",
+    ["route", "reason"],
+)
+PROMPT_TOKENS = Counter(
+    "ai_prompt_tokens_total",
+    "Tokens in rendered prompt templates",
+    ["template", "version"],
+)
+ROUTE_LATENCY = Histogram(
+    "ai_route_duration_seconds",
+    "Upstream latency of routed LLM calls by task and model tier",
+    ["task", "tier"],
+    buckets=LATENCY_BUCKETS,
+)
+ROUTE_COST = Counter(
+    "ai_route_cost_usd_total",
+    "Estimated spend of routed LLM calls in USD",
+    ["task", "tier"],
+)
+ROUTE_EVENTS = Counter(
+    "ai_route_events_total",
+    "Model routing decisions: selected, oversize (sent to the standard tier) and escalated",
+    ["task", "tier", "event"],
+)
+
+_tracer = None
+if os.getenv("TRACING_ENABLED", "false").lower() == "true":
+    try:
+        from opentelemetry import trace
+
+        _tracer = trace.get_tracer("promoly.ai-service")
+    except ImportError:
+        print("TRACING_ENABLED is set but opentelemetry is not installed; tracing disabled")
+
+
+@contextmanager
+def timed(stage: str, namespace: str = ""):
+    """Record the duration of a pipeline stage, and a tracing span when enabled"""
+    start = time.perf_counter()
+    if _tracer is None:
+        try:
+            yield
+        finally:
+            STAGE_LATENCY.labels(stage, namespace).observe(time.perf_counter() - start)
+        return
+
+    with _tracer.start_as_current_span(stage, attributes={"namespace": namespace}):
+        try:
+            yield
+        finally:
+            STAGE_LATENCY.labels(stage, namespace).observe(time.perf_counter() - start)
+
+
+class TokenUsageHandler(AsyncCallbackHandler):
+    """LangChain callback that records token usage reported by the provider"""
+
+    async def on_llm_end(self, response, **kwargs: Any) -> None:
+        llm_output: Optional[Dict[str, Any]] = response.llm_output or {}
+        usage = llm_output.get("token_usage") or {}
+        model = llm_output.get("model_name", "unknown")
+        if usage.get("prompt_tokens"):
+            LLM_TOKENS.labels(model, "prompt").inc(usage["prompt_tokens"])
+        if usage.get("completion_tokens"):
+            LLM_TOKENS.labels(model, "completion").inc(usage["completion_tokens"])
+
+
+token_usage_handler = TokenUsageHandler()
+
+
+def render_metrics():
+    """Serialize all metrics in the Prometheus text format.
+
+    With PROMETHEUS_MULTIPROC_DIR set, metrics from every uvicorn worker
+    are aggregated.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
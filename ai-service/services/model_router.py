@@ -0,0 +1,217 @@
+import os
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain.schema import AIMessage, BaseMessage
+
+from services.cache import ResponseCache, get_response_cache
+from services.llm_provider import LLMProvider, ManagedChatModel, get_llm_provider
+from services.metrics import ROUTE_COST, ROUTE_EVENTS, ROUTE_LATENCY
+from services.tokens import get_token_counter
+
+LIGHT = "light"
+STANDARD = "standard"
+
+# USD per million (prompt, completion) tokens; override or extend with MODEL_PRICES
+DEFAULT_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+
+class MeteredModel:
+    """Chat model bound to one task and tier that records latency and estimated cost per upstream call.
+
+    Only calls that reach the provider are metered; cache hits never get
+    here. Token counts are estimated locally from the messages and the
+    completion, so the cost is an estimate as well.
+    """
+
+    def __init__(self, llm: ManagedChatModel, router: "ModelRouter", task: str, tier: str):
+        self.llm = llm
+        self.router = router
+        self.task = task
+        self.tier = tier
+
+    @property
+    def model_name(self) -> str:
+        return self.llm.model_name
+
+    @property
+    def temperature(self) -> float:
+        return self.llm.temperature
+
+    async def ainvoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
+        start = time.perf_counter()
+        try:
+            response = await self.llm.ainvoke(messages, **kwargs)
+        finally:
+            latency = time.perf_counter() - start
+            ROUTE_LATENCY.labels(self.task, self.tier).observe(latency)
+
+        counter = get_token_counter(self.model_name)
+        prompt_tokens = sum(counter.count_message(message.content) for message in messages)
+        completion_tokens = counter.count(response.content)
+        self.router.record(self.task, self.tier, self.model_name, latency, prompt_tokens, completion_tokens)
+        return response
+
+
+class ModelRouter:
+    """Send each task to the cheapest model tier that can handle it.
+
+    `tiers` maps a tier name to a model and `routes` maps a task (the cache
+    namespace of a call site, e.g. "chat_suggestions") to a tier; unlisted
+    tasks use the standard tier. A light-tier task whose prompt exceeds
+    `light_max_input_tokens` goes to the standard tier instead, and with
+    `escalate` a light-tier completion that fails the caller's validation
+    is retried once on the standard tier. A tier configured with the same
+    model as the standard tier is treated as standard, so nothing is
+    escalated to the model that just produced the output.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        cache: ResponseCache,
+        tiers: Dict[str, str],
+        routes: Optional[Dict[str, str]] = None,
+        light_max_input_tokens: int = 2000,
+        escalate: bool = True,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+    ):
+        self.provider = provider
+        self.cache = cache
+        self.tiers = tiers
+        self.routes = routes or {}
+        self.light_max_input_tokens = light_max_input_tokens
+        self.escalate = escalate
+        self.prices = prices or {}
+        self._models: Dict[tuple, MeteredModel] = {}
+        self.counters: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def select(self, task: str, messages: List[BaseMessage]) -> str:
+        """The tier a task's messages should go to"""
+        tier = self.routes.get(task, STANDARD)
+        if tier == STANDARD or tier not in self.tiers or self.tiers[tier] == self.tiers[STANDARD]:
+            return STANDARD
+
+        counter = get_token_counter(self.tiers[tier])
+        if sum(counter.count_message(message.content) for message in messages) > self.light_max_input_tokens:
+            ROUTE_EVENTS.labels(task, tier, "oversize").inc()
+            self.counters[task]["oversize"] += 1
+            return STANDARD
+        return tier
+
+    def chat_model(self, task: str, tier: str, temperature: float) -> MeteredModel:
+        key = (task, tier, temperature)
+        if key not in self._models:
+            llm = self.provider.chat_model(temperature=temperature, model=self.tiers[tier])
+            self._models[key] = MeteredModel(llm, self, task, tier)
+        return self._models[key]
+
+    async def ainvoke(
+        self,
+        task: str,
+        messages: List[BaseMessage],
+        temperature: float,
+        validate: Optional[Callable[[str], bool]] = None,
+        **kwargs
+    ) -> AIMessage:
+        """Cached completion for `task` on its routed tier, escalating invalid light-tier output"""
+        tier = self.select(task, messages)
+        ROUTE_EVENTS.labels(task, tier, "selected").inc()
+        response = await self.cache.ainvoke(
+            self.chat_model(task, tier, temperature), messages, namespace=task, validate=validate, **kwargs
+        )
+        if tier == STANDARD or not self.escalate or validate is None or validate(response.content):
+            return response
+
+        ROUTE_EVENTS.labels(task, tier, "escalated").inc()
+        self.counters[task]["escalations"] += 1
+        return await self.cache.ainvoke(
+            self.chat_model(task, STANDARD, temperature), messages, namespace=task, validate=validate, **kwargs
+        )
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def record(self, task: str, tier: str, model: str, latency: float, prompt_tokens: int, completion_tokens: int) -> None:
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        ROUTE_COST.labels(task, tier).inc(cost)
+        counters = self.counters[task]
+        counters[f"{tier}_calls"] += 1
+        counters[f"{tier}_latency"] += latency
+        counters["cost_usd"] += cost
+
+    def stats(self) -> Dict[str, Any]:
+        routes = {}
+        for task, counters in self.counters.items():
+            route = {
+                "tier": self.routes.get(task, STANDARD),
+                "oversize": int(counters["oversize"]),
+                "escalations": int(counters["escalations"]),
+                "cost_usd": round(counters["cost_usd"], 6),
+            }
+            for tier in self.tiers:
+                calls = int(counters[f"{tier}_calls"])
+                route[f"{tier}_calls"] = calls
+                route[f"{tier}_latency_ms"] = round(counters[f"{tier}_latency"] / calls * 1000, 1) if calls else None
+            routes[task] = route
+        return {
+            "tiers": dict(self.tiers),
+            "light_max_input_tokens": self.light_max_input_tokens,
+            "escalate": self.escalate,
+            "routes": routes,
+        }
+
+
+def _env_pairs(name: str) -> Dict[str, str]:
+    pairs = {}
+    for item in os.getenv(name, "").split(","):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            pairs[key.strip()] = value.strip()
+    return pairs
+
+
+def _prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES)
+    for model, value in _env_pairs("MODEL_PRICES").items():
+        prompt_price, completion_price = value.split(":")
+        prices[model] = (float(prompt_price), float(completion_price))
+    return prices
+
+
+_model_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide model router configured from the environment"""
+    global _model_router
+    if _model_router is None:
+        routes = {
+            "generate_suggestions": LIGHT,
+            "chat_suggestions": LIGHT,
+            "chat_summary": LIGHT,
+            "rag_general": LIGHT,
+        }
+        routes.update(_env_pairs("ROUTER_ROUTES"))
+        _model_router = ModelRouter(
+            provider=get_llm_provider(),
+            cache=get_response_cache(),
+            tiers={
+                LIGHT: os.getenv("ROUTER_LIGHT_MODEL", "gpt-4.1-nano"),
+                STANDARD: os.getenv("MODEL_NAME", "gpt-4o-mini"),
+            },
+            routes=routes,
+            light_max_input_tokens=int(os.getenv("ROUTER_LIGHT_MAX_INPUT_TOKENS", "2000")),
+            escalate=os.getenv("ROUTER_ESCALATE", "true").lower() == "true",
+            prices=_prices(),
+        )
+    return _model_router
@@ -1,146 +1,243 @@
+import asyncio
+import json
 import os
-from typing import List, Dict, Any
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
+from contextlib import nullcontext
+from typing import List, Dict, Any, AsyncContextManager, AsyncIterator, Callable, Optional, Tuple, Union
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from pydantic import BaseModel, Field, field_validator
+
+from services.analytics import PerformanceAnalytics
+from services.cache import get_response_cache
+from services.llm_provider import get_llm_provider
+from services.metrics import FALLBACKS, STRUCTURED_REASKS, timed
+from services.prompts import get_prompt_registry
+from services.rules_engine import Priority, RulesEngine, SuggestionType
+from services.structured_output import parse_items
+
+
+class OptimizationSuggestion(BaseModel):
+    """Schema of one LLM suggestion, matching what the rules engine produces"""
+    type: SuggestionType
+    title: str = Field(min_length=1)
+    description: str = Field(min_length=1)
+    action: Dict[str, Any]
+    priority: Priority
+    expected_impact: Union[int, float] = Field(ge=0)
+
+    @field_validator("type", "priority", mode="before")
+    @classmethod
+    def normalize_enum(cls, value: Any) -> Any:
+        return value.strip().upper().replace(" ", "_") if isinstance(value, str) else value
+
+    @field_validator("expected_impact", mode="before")
+    @classmethod
+    def strip_percent(cls, value: Any) -> Any:
+        return value.strip().rstrip("%") if isinstance(value, str) else value
+
 
 class OptimizationService:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model=os.getenv("MODEL_NAME", "gpt-4o-mini"),
-            temperature=0.3,
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
+        self.llm = get_llm_provider().chat_model(temperature=0.3)
+        self.cache = get_response_cache()
+        self.prompts = get_prompt_registry()
+        self.batch_concurrency = int(os.getenv("SUGGEST_BATCH_CONCURRENCY", "8"))
+        self.rules = RulesEngine()
+        self.analytics = PerformanceAnalytics()
+        # Only send campaigns the rules cannot decide on to the LLM
+        self.prescreen = os.getenv("RULES_PRESCREEN", "true").lower() == "true"
+        # Provider JSON mode; disable for OpenAI-compatible servers without response_format support
+        self.json_mode = os.getenv("SUGGEST_JSON_MODE", "true").lower() == "true"
+        self.max_reasks = int(os.getenv("SUGGEST_MAX_REASKS", "1"))
 
-    async def get_suggestions(self, campaign: Dict[str, Any], performance: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Generate optimization suggestions based on campaign performance"""
-        
-        system_prompt = """You are an expert digital marketing analyst specializing in Facebook and Instagram ad optimization.
-        
-        Analyze campaign performance data and provide actionable optimization suggestions.
-        
-        For each suggestion, provide:
-        - type: BUDGET_OPTIMIZATION, AUDIENCE_TARGETING, CREATIVE_IMPROVEMENT, BID_ADJUSTMENT, or CAMPAIGN_STRUCTURE
-        - title: A clear, concise title
-        - description: Detailed explanation with reasoning
-        - action: JSON object with specific actions to take
-        - priority: HIGH, MEDIUM, or LOW
-        - expected_impact: Estimated improvement percentage
+    async def get_suggestions(
+        self,
+        campaign: Dict[str, Any],
+        performance: Dict[str, Any],
+        history: Optional[Dict[str, List[Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Generate optimization suggestions based on campaign performance.
+
+        `history` is an optional columnar daily series; when no snapshot is
+        given, the snapshot is aggregated from it.
         """
         
-        # Format performance data for analysis
-        performance_summary = self._format_performance_data(performance)
-        campaign_summary = self._format_campaign_data(campaign)
+        if history and not performance:
+            performance = self.analytics.aggregate(history)
         
-        analysis_prompt = f"""
-        Campaign Information:
-        {campaign_summary}
+        if self.prescreen:
+            with timed("rules_screen", "suggest"):
+                screen = self.rules.screen([(campaign, performance)])[0]
+            if not screen["ambiguous"]:
+                return screen["suggestions"][:5]
         
-        Performance Data:
-        {performance_summary}
+        return await self._analyze(campaign, performance, history)
+
+    async def _analyze(
+        self,
+        campaign: Dict[str, Any],
+        performance: Dict[str, Any],
+        history: Optional[Dict[str, List[Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Ask the LLM for optimization suggestions"""
         
-        Based on this data, provide 3-5 specific optimization suggestions.
-        Focus on actionable insights that can improve performance.
+        # A condensed trend summary instead of the raw daily rows keeps the prompt short
+        trend_section = ""
+        if history:
+            with timed("analytics", "suggest"):
+                trend_summary = self.analytics.format_summary(self.analytics.summarize(history, campaign))
+            trend_section = self.prompts.render("suggest_trends", summary=trend_summary)
         
-        Return suggestions in JSON format:
-        [
-            {{
-                "type": "BUDGET_OPTIMIZATION",
-                "title": "Increase Daily Budget",
-                "description": "Your campaign is performing well with a low CPL. Consider increasing the daily budget by $20 to scale successful performance.",
-                "action": {{
-                    "action_type": "increase_budget",
-                    "amount": 20,
-                    "reasoning": "Low CPL indicates efficient spending"
-                }},
-                "priority": "HIGH",
-                "expected_impact": 25
-            }}
-        ]
-        """
+        # Instructions and the example stay in the system message so every campaign shares that prefix
+        with timed("prompt_build", "suggest"):
+            performance_summary = self._format_performance_data(performance)
+            campaign_summary = self._format_campaign_data(campaign)
+            messages = [
+                SystemMessage(content=self.prompts.render("suggest_system")),
+                HumanMessage(content=self.prompts.render(
+                    "suggest_request",
+                    campaign=campaign_summary,
+                    performance=performance_summary,
+                    trends=trend_section
+                ))
+            ]
         
         try:
-            response = await self.llm.ainvoke([
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=analysis_prompt)
-            ])
-            
-            # Parse JSON response
-            import json
-            suggestions = json.loads(response.content)
-            
-            # Validate and clean suggestions
-            validated_suggestions = []
-            for suggestion in suggestions:
-                if self._validate_suggestion(suggestion):
-                    validated_suggestions.append(suggestion)
-            
-            return validated_suggestions[:5]  # Limit to 5 suggestions
+            suggestions = await self._request_suggestions(messages)
+            return suggestions[:5]  # Limit to 5 suggestions
             
         except Exception as e:
             print(f"Error generating optimization suggestions: {e}")
-            return self._get_fallback_suggestions(performance)
+            FALLBACKS.labels("suggest").inc()
+            return self._get_fallback_suggestions(campaign, performance)
+
+    async def get_suggestions_batch(
+        self,
+        items: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+        concurrency: Optional[int] = None,
+        histories: Optional[List[Optional[Dict[str, List[Any]]]]] = None,
+        admit: Optional[Callable[[], AsyncContextManager]] = None
+    ) -> AsyncIterator[Tuple[int, Optional[List[Dict[str, Any]]], Optional[str]]]:
+        """Generate suggestions for many (campaign, performance) pairs.
+
+        All pairs are pre-screened by the rules engine in one vectorized pass
+        and decided campaigns are yielded immediately. Identical ambiguous
+        pairs are analyzed once, at most `concurrency` analyses run at a time,
+        and (index, suggestions, error) tuples are yielded in completion order
+        so callers can stream results as they are ready. `admit()`, when
+        given, is entered around each analysis, e.g. to take an admission slot.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.batch_concurrency)
+        histories = histories or [None] * len(items)
+        items = [
+            (campaign, self.analytics.aggregate(history) if history and not performance else performance)
+            for (campaign, performance), history in zip(items, histories)
+        ]
+        
+        pending = list(range(len(items)))
+        if self.prescreen:
+            pending = []
+            with timed("rules_screen", "suggest_batch"):
+                screens = self.rules.screen(items)
+            for index, screen in enumerate(screens):
+                if screen["ambiguous"]:
+                    pending.append(index)
+                else:
+                    yield index, screen["suggestions"][:5], None
+        
+        # Group duplicate inputs so each distinct pair costs one LLM call
+        groups: Dict[str, List[int]] = {}
+        for index in pending:
+            campaign, performance = items[index]
+            key = json.dumps([campaign, performance, histories[index]], sort_keys=True, default=str)
+            groups.setdefault(key, []).append(index)
+        
+        async def run(indices: List[int]):
+            campaign, performance = items[indices[0]]
+            async with semaphore:
+                try:
+                    async with admit() if admit else nullcontext():
+                        return indices, await self._analyze(campaign, performance, histories[indices[0]]), None
+                except Exception as e:
+                    return indices, None, str(e)
+        
+        tasks = [asyncio.create_task(run(indices)) for indices in groups.values()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indices, suggestions, error = await next_done
+                for index in indices:
+                    yield index, suggestions, error
+        finally:
+            for task in tasks:
+                task.cancel()
 
     def _format_performance_data(self, performance: Dict[str, Any]) -> str:
         """Format performance data for analysis"""
         if not performance:
             return "No performance data available"
         
-        return f"""
-        - Reach: {performance.get('reach', 0):,}
-        - Impressions: {performance.get('impressions', 0):,}
-        - Clicks: {performance.get('clicks', 0):,}
-        - Leads: {performance.get('leads', 0):,}
-        - Spend: ${performance.get('spend', 0):.2f}
-        - CPM: ${performance.get('cpm', 0):.2f}
-        - CPC: ${performance.get('cpc', 0):.2f}
-        - CPL: ${performance.get('cpl', 0):.2f}
-        """
+        return self.prompts.render(
+            "suggest_performance",
+            reach=performance.get('reach', 0),
+            impressions=performance.get('impressions', 0),
+            clicks=performance.get('clicks', 0),
+            leads=performance.get('leads', 0),
+            spend=performance.get('spend', 0),
+            cpm=performance.get('cpm', 0),
+            cpc=performance.get('cpc', 0),
+            cpl=performance.get('cpl', 0)
+        )
 
     def _format_campaign_data(self, campaign: Dict[str, Any]) -> str:
         """Format campaign data for analysis"""
         if not campaign:
             return "No campaign data available"
         
-        return f"""
-        - Name: {campaign.get('name', 'Unknown')}
-        - Objective: {campaign.get('objective', 'Unknown')}
-        - Budget: ${campaign.get('budget', 0):.2f} ({campaign.get('budgetType', 'DAILY')})
-        - Status: {campaign.get('status', 'Unknown')}
-        """
-
-    def _validate_suggestion(self, suggestion: Dict[str, Any]) -> bool:
-        """Validate suggestion structure"""
-        required_fields = ['type', 'title', 'description', 'action', 'priority', 'expected_impact']
-        return all(field in suggestion for field in required_fields)
+        return self.prompts.render(
+            "suggest_campaign",
+            name=campaign.get('name', 'Unknown'),
+            objective=campaign.get('objective', 'Unknown'),
+            budget=campaign.get('budget', 0),
+            budget_type=campaign.get('budgetType', 'DAILY'),
+            status=campaign.get('status', 'Unknown')
+        )
 
-    def _get_fallback_suggestions(self, performance: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Provide fallback suggestions when AI analysis fails"""
-        suggestions = []
+    async def _request_suggestions(self, messages: List) -> List[Dict[str, Any]]:
+        """Call the LLM and validate its suggestions, re-asking only when nothing usable came back"""
+        kwargs = {"response_format": {"type": "json_object"}} if self.json_mode else {}
         
-        if performance.get('cpl', 0) > 50:
-            suggestions.append({
-                "type": "BUDGET_OPTIMIZATION",
-                "title": "Optimize for Lower Cost Per Lead",
-                "description": "Your cost per lead is high. Consider adjusting targeting or creative to improve efficiency.",
-                "action": {
-                    "action_type": "optimize_targeting",
-                    "reasoning": "High CPL indicates inefficient targeting"
-                },
-                "priority": "HIGH",
-                "expected_impact": 20
-            })
-        
-        if performance.get('clicks', 0) < 100:
-            suggestions.append({
-                "type": "CREATIVE_IMPROVEMENT",
-                "title": "Improve Ad Creative",
-                "description": "Low click-through rate suggests creative improvements are needed.",
-                "action": {
-                    "action_type": "test_creative",
-                    "reasoning": "Low CTR indicates poor creative performance"
-                },
-                "priority": "MEDIUM",
-                "expected_impact": 15
-            })
+        for attempt in range(self.max_reasks + 1):
+            response = await self.cache.ainvoke(
+                self.llm,
+                messages,
+                namespace="suggest",
+                validate=lambda content: bool(self._parse_suggestions(content)[0]),
+                **kwargs
+            )
+            
+            with timed("json_parse", "suggest"):
+                suggestions, error = self._parse_suggestions(response.content)
+            if suggestions:
+                return suggestions
+            
+            if attempt < self.max_reasks:
+                STRUCTURED_REASKS.labels("suggest").inc()
+                messages = messages + [
+                    AIMessage(content=response.content),
+                    HumanMessage(content=self.prompts.render("suggest_reask", error=error))
+                ]
         
-        return suggestions
+        raise ValueError(f"No valid suggestions after {self.max_reasks + 1} attempts: {error}")
+
+    def _parse_suggestions(self, content: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Valid suggestions from a completion, plus a description of what was wrong if there are none"""
+        try:
+            items, errors = parse_items(content, OptimizationSuggestion, key="suggestions")
+        except ValueError as e:
+            return [], str(e)
+        if not items:
+            return [], "; ".join(errors[:3]) or "the suggestion list was empty"
+        return [item.model_dump(mode="json") for item in items], None
+
+    def _get_fallback_suggestions(self, campaign: Dict[str, Any], performance: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Provide rule-based suggestions when AI analysis fails"""
+        return self.rules.screen([(campaign, performance)])[0]["suggestions"][:5]
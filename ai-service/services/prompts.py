@@ -0,0 +1,245 @@
+import inspect
+import os
+import re
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.metrics import PROMPT_TOKENS
+from services.tokens import TokenCounter, get_token_counter
+
+BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+
+
+def clean_prompt(text: str) -> str:
+    """Remove indentation, trailing spaces and repeated blank lines, which cost tokens but carry nothing"""
+    lines = [line.rstrip() for line in inspect.cleandoc(text).splitlines()]
+    return BLANK_LINES_PATTERN.sub("\n\n", "\n".join(lines)).strip()
+
+
+class PromptTemplate:
+    """A cleaned prompt split once into literal text and placeholders.
+
+    Rendering joins the precomputed parts instead of re-parsing a format
+    string, and the static token count is known up front.
+    """
+
+    def __init__(self, name: str, version: str, text: str):
+        self.name = name
+        self.version = version
+        self.text = clean_prompt(text)
+        self._parts: List[Tuple[str, Optional[str], str]] = [
+            (literal, field, spec or "")
+            for literal, field, spec, _ in Formatter().parse(self.text)
+        ]
+        self.fields = sorted({field for _, field, _ in self._parts if field})
+        self.static_text = "".join(literal for literal, _, _ in self._parts)
+
+    def render(self, **values: Any) -> str:
+        missing = [field for field in self.fields if field not in values]
+        if missing:
+            raise KeyError(f"Prompt {self.name} is missing values for: {', '.join(missing)}")
+
+        pieces = []
+        for literal, field, spec in self._parts:
+            pieces.append(literal)
+            if field:
+                pieces.append(format(values[field], spec))
+        return "".join(pieces).strip()
+
+
+class PromptRegistry:
+    """Versioned prompt templates shared by all services.
+
+    Every template may have several versions; the latest registered one is
+    used unless PROMPT_VERSIONS pins another (e.g. "suggest_system=1").
+    Rendered token counts are tracked per template so prompt changes show
+    up in /prompts and the ai_prompt_tokens_total metric.
+    """
+
+    def __init__(self, counter: TokenCounter, pinned: Optional[Dict[str, str]] = None):
+        self.counter = counter
+        self.pinned = pinned or {}
+        self._versions: Dict[str, Dict[str, PromptTemplate]] = {}
+        self._active: Dict[str, PromptTemplate] = {}
+        self._usage: Dict[str, List[int]] = {}
+
+    def register(self, name: str, version: str, text: str) -> PromptTemplate:
+        template = PromptTemplate(name, version, text)
+        self._versions.setdefault(name, {})[version] = template
+        if self.pinned.get(name, version) == version:
+            self._active[name] = template
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        return self._active[name]
+
+    def render(self, name: str, /, **values: Any) -> str:
+        template = self._active[name]
+        text = template.render(**values)
+
+        tokens = self.counter.count(text)
+        usage = self._usage.setdefault(name, [0, 0])
+        usage[0] += 1
+        usage[1] += tokens
+        PROMPT_TOKENS.labels(name, template.version).inc(tokens)
+        return text
+
+    def stats(self) -> List[Dict[str, Any]]:
+        stats = []
+        for name, template in sorted(self._active.items()):
+            renders, tokens = self._usage.get(name, (0, 0))
+            stats.append({
+                "name": name,
+                "version": template.version,
+                "versions": sorted(self._versions[name]),
+                "fields": template.fields,
+                "static_tokens": self.counter.count(template.static_text),
+                "renders": renders,
+                "average_tokens": round(tokens / renders, 1) if renders else None,
+            })
+        return stats
+
+
+def _pinned_versions() -> Dict[str, str]:
+    pinned = {}
+    for item in os.getenv("PROMPT_VERSIONS", "").split(","):
+        if "=" in item:
+            name, version = item.split("=", 1)
+            pinned[name.strip()] = version.strip()
+    return pinned
+
+
+_registry: Optional[PromptRegistry] = None
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """Return the process-wide prompt registry with every service prompt registered"""
+    global _registry
+    if _registry is None:
+        _registry = PromptRegistry(get_token_counter(os.getenv("MODEL_NAME", "gpt-4o-mini")), _pinned_versions())
+        _register_prompts(_registry)
+    return _registry
+
+
+def _register_prompts(registry: PromptRegistry) -> None:
+    # Static instructions go in the system message and variable data last, so
+    # consecutive calls share the longest possible prefix for provider-side caching.
+
+    registry.register("ad_copy_system", "1", """
+        You are an expert digital marketing copywriter specializing in Facebook and Instagram ads.
+        Create compelling, conversion-focused ad copy that drives action.
+
+        Guidelines:
+        - Keep headlines under 40 characters for optimal display
+        - Use emotional triggers and benefit-focused language
+        - Include clear call-to-actions
+        - Test different angles and approaches
+        - Consider the target audience and platform
+    """)
+    registry.register("ad_copy_request", "1", "{context}User request: {prompt}")
+
+    registry.register("ad_variants_format", "1", """
+        Write one complete ad variant with its own creative angle. Respond with a JSON object with these keys:
+        - "headline": at most 40 characters
+        - "primary_text": the main ad text in one to three short, plain sentences
+        - "description": a short supporting line
+        - "cta": the call-to-action button text, e.g. "Shop Now", "Learn More" or "Sign Up"
+    """)
+
+    registry.register("ad_suggestions_system", "1", """
+        Generate 3-5 additional creative angles or approaches for the ad campaign request you are given.
+        Each suggestion should be a brief, actionable idea.
+        Format as a simple list, one idea per line.
+    """)
+    registry.register("ad_suggestions_request", "1", 'Request: "{prompt}"')
+
+    registry.register("chat_system", "1", """
+        You are Promoly, an AI assistant for digital advertising. You help users:
+        1. Set up and optimize their ad campaigns
+        2. Understand their campaign performance
+        3. Make data-driven decisions
+        4. Learn best practices in digital marketing
+
+        Be helpful, friendly, and provide actionable advice. When appropriate, suggest next steps or ask clarifying questions.
+    """)
+    registry.register("chat_summary_context", "1", "Summary of the earlier conversation:\n{summary}")
+
+    registry.register("chat_suggestions_system", "1", """
+        Suggest 2-3 helpful follow-up questions or actions the user might want to take after the message you are given.
+        Keep suggestions short and actionable, one per line.
+    """)
+    registry.register("chat_suggestions_request", "1", 'User message: "{message}"')
+
+    registry.register("chat_summary_system", "1", """
+        You maintain a running summary of a conversation between a user and Promoly, an AI assistant for digital advertising.
+        Merge the new messages into the current summary. Keep facts the user shared (business, goals, budget, audience, campaign details), advice already given, decisions made and open questions.
+        Write at most 150 words in plain prose.
+    """)
+    registry.register("chat_summary_initial", "1", "Messages:\n{transcript}")
+    registry.register("chat_summary_update", "1", "Current summary:\n{summary}\n\nNew messages:\n{transcript}")
+
+    registry.register("combined_output_instructions", "1", """
+        Respond with a JSON object with two keys:
+        - "content": your full response
+        - "suggestions": a list of up to {max_suggestions} short, actionable follow-up ideas
+    """)
+
+    registry.register("suggest_system", "1", """
+        You are an expert digital marketing analyst specializing in Facebook and Instagram ad optimization.
+        Analyze campaign performance data and provide 3-5 specific, actionable optimization suggestions that can improve performance.
+
+        For each suggestion, provide:
+        - type: BUDGET_OPTIMIZATION, AUDIENCE_TARGETING, CREATIVE_IMPROVEMENT, BID_ADJUSTMENT, or CAMPAIGN_STRUCTURE
+        - title: A clear, concise title
+        - description: Detailed explanation with reasoning
+        - action: JSON object with specific actions to take
+        - priority: HIGH, MEDIUM, or LOW
+        - expected_impact: Estimated improvement percentage
+
+        Return suggestions in JSON format:
+        {{"suggestions": [{{"type": "BUDGET_OPTIMIZATION", "title": "Increase Daily Budget", "description": "Your campaign is performing well with a low CPL. Consider increasing the daily budget by $20 to scale successful performance.", "action": {{"action_type": "increase_budget", "amount": 20, "reasoning": "Low CPL indicates efficient spending"}}, "priority": "HIGH", "expected_impact": 25}}]}}
+    """)
+    registry.register("suggest_request", "1", """
+        Campaign Information:
+        {campaign}
+
+        Performance Data:
+        {performance}
+        {trends}
+    """)
+    registry.register("suggest_trends", "1", "\nDaily Trends:\n{summary}")
+    registry.register("suggest_campaign", "1", """
+        - Name: {name}
+        - Objective: {objective}
+        - Budget: ${budget:.2f} ({budget_type})
+        - Status: {status}
+    """)
+    registry.register("suggest_performance", "1", """
+        - Reach: {reach:,}
+        - Impressions: {impressions:,}
+        - Clicks: {clicks:,}
+        - Leads: {leads:,}
+        - Spend: ${spend:.2f}
+        - CPM: ${cpm:.2f}
+        - CPC: ${cpc:.2f}
+        - CPL: ${cpl:.2f}
+    """)
+    registry.register("suggest_reask", "1", "That reply could not be used ({error}). Respond again with only the JSON object in the format described above.")
+
+    registry.register("rag_system", "1", """
+        You are a digital marketing expert assistant. Use the provided knowledge base to answer questions about Facebook advertising, ad optimization, and marketing best practices.
+
+        Provide clear, actionable advice based on the knowledge base. If the knowledge base doesn't contain relevant information, provide general best practices based on your expertise.
+
+        Always cite sources when possible. Be specific and actionable.
+    """)
+    registry.register("rag_request", "1", """
+        Knowledge Base Context:
+        {context}
+
+        User Question: {question}
+    """)
+    registry.register("rag_general_system", "1", """
+        You are a digital marketing expert. Answer the user's question about Facebook advertising or digital marketing.
+        Provide helpful, actionable advice based on general best practices.
+    """)
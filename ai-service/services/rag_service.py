@@ -1,141 +1,147 @@
 import os
-from typing import List, Tuple, Dict
-from langchain_openai import ChatOpenAI
+import threading
+from typing import List, Optional, Tuple, Dict, Any
+
+import numpy as np
 from langchain.schema import HumanMessage, SystemMessage
 
+from services.cache import get_response_cache
+from services.embeddings import get_embedding_backend
+from services.ingestion import IngestionPipeline, prepare_documents
+from services.knowledge_base import DEFAULT_DOCUMENTS
+from services.lexical_index import BM25Index, reciprocal_rank_fusion
+from services.llm_provider import get_llm_provider
+from services.metrics import FALLBACKS, timed
+from services.model_router import get_model_router
+from services.prompts import get_prompt_registry
+from services.vector_store import VectorIndex, PersistentVectorIndex
+
 class RAGService:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model=os.getenv("MODEL_NAME", "gpt-4o-mini"),
-            temperature=0.3,
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
-        
-        # Initialize knowledge base (in a real implementation, this would load from vector database)
-        self.knowledge_base = self._initialize_knowledge_base()
+        self.llm = get_llm_provider().chat_model(temperature=0.3)
+        self.cache = get_response_cache()
+        self.prompts = get_prompt_registry()
+        self.router = get_model_router()
+        
+        self.top_k = int(os.getenv("RAG_TOP_K", "3"))
+        self.min_score = float(os.getenv("RAG_MIN_SCORE", "0.05"))
+        # Fuse BM25 with the dense ranking so exact terms like "CPL" or "ROAS" are not missed
+        self.hybrid = os.getenv("RAG_HYBRID", "true").lower() == "true"
+        self.candidates = int(os.getenv("RAG_CANDIDATES", "20"))
+        self.rrf_k = int(os.getenv("RAG_RRF_K", "60"))
+        self.lexical = BM25Index()
+
+        # Embed the knowledge base once so queries only need a single embedding and a matrix product.
+        # With RAG_INDEX_DIR set the index lives on disk and is shared by all workers through mmap;
+        # it is seeded with the default documents only when it is first created.
+        self.embedder = get_embedding_backend()
+        index_dir = os.getenv("RAG_INDEX_DIR")
+        if index_dir:
+            self.index = PersistentVectorIndex(index_dir, self.embedder.dimension, seed=self._default_rows)
+        else:
+            self.index = VectorIndex(self.embedder.dimension)
+        self.ingestion = IngestionPipeline(self.embedder, self.index)
+
+        # Ingestion runs in worker threads; one writer at a time
+        self._write_lock = threading.Lock()
+        if not index_dir:
+            self.ingestion.ingest(DEFAULT_DOCUMENTS)
+
+    def _default_rows(self) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        _, chunks, embeddings = prepare_documents(self.embedder, DEFAULT_DOCUMENTS)
+        return chunks, embeddings
 
-    def _initialize_knowledge_base(self) -> List[Dict[str, str]]:
-        """Initialize the marketing knowledge base with best practices"""
-        return [
-            {
-                "content": "Facebook Ad Best Practices: Use high-quality images, keep text minimal, include clear CTAs, test multiple ad formats, and target specific audiences based on interests and behaviors.",
-                "source": "Facebook Marketing Best Practices Guide"
-            },
-            {
-                "content": "Ad Copy Optimization: Write compelling headlines under 40 characters, use emotional triggers, focus on benefits over features, include urgency or scarcity, and test different angles.",
-                "source": "Digital Marketing Copywriting Guide"
-            },
-            {
-                "content": "Audience Targeting: Start with broad audiences and narrow down based on performance, use lookalike audiences for scaling, exclude existing customers, and test different age ranges and interests.",
-                "source": "Audience Targeting Strategies"
-            },
-            {
-                "content": "Budget Optimization: Start with small budgets to test, increase budget for well-performing ads, use automatic bidding initially, and monitor cost per result metrics.",
-                "source": "Budget Management Guide"
-            },
-            {
-                "content": "Campaign Structure: Organize campaigns by objective, use ad sets for different audiences, create multiple ad variations, and maintain consistent naming conventions.",
-                "source": "Campaign Organization Best Practices"
-            },
-            {
-                "content": "Performance Metrics: Focus on cost per lead (CPL), click-through rate (CTR), conversion rate, and return on ad spend (ROAS). Track these metrics daily and optimize accordingly.",
-                "source": "Performance Tracking Guide"
-            },
-            {
-                "content": "Creative Testing: Test different images, videos, headlines, and ad copy. Use A/B testing with 20% budget allocation to test variations and scale winners.",
-                "source": "Creative Testing Strategies"
-            },
-            {
-                "content": "Lead Generation: Use lead ads for better conversion rates, optimize landing pages for mobile, offer valuable content, and follow up quickly with leads.",
-                "source": "Lead Generation Best Practices"
-            }
-        ]
+    def add_documents(self, documents: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Chunk, embed and index documents, replacing any previous versions"""
+        with self._write_lock:
+            return self.ingestion.ingest(documents)
+
+    def delete_documents(self, doc_ids: List[str]) -> int:
+        """Remove documents from the knowledge base"""
+        with self._write_lock:
+            return self.ingestion.delete(doc_ids)
 
     async def query(self, question: str) -> Tuple[str, List[str]]:
         """Query the knowledge base and return relevant answers"""
         
-        system_prompt = """You are a digital marketing expert assistant. Use the provided knowledge base to answer questions about Facebook advertising, ad optimization, and marketing best practices.
-        
-        Provide clear, actionable advice based on the knowledge base. If the knowledge base doesn't contain relevant information, provide general best practices based on your expertise.
-        
-        Always cite sources when possible."""
-        
-        # Simple keyword matching (in production, use vector similarity search)
-        relevant_docs = self._find_relevant_documents(question)
+        with timed("retrieval", "rag"):
+            query_embedding = await self.embedder.aembed_query(question)
+            relevant_docs = self._find_relevant_documents(question, query_embedding)
         
         if not relevant_docs:
             # Fallback to general knowledge
             answer = await self._get_general_answer(question)
             return answer, ["General Marketing Knowledge"]
         
-        # Create context from relevant documents
-        context = "\n\n".join([doc["content"] for doc in relevant_docs])
-        sources = [doc["source"] for doc in relevant_docs]
-        
-        query_prompt = f"""
-        Knowledge Base Context:
-        {context}
-        
-        User Question: {question}
-        
-        Provide a comprehensive answer based on the knowledge base context. Be specific and actionable.
-        """
+        with timed("prompt_build", "rag"):
+            # Create context from relevant documents
+            context = "\n\n".join([doc["content"] for doc in relevant_docs])
+            sources = list(dict.fromkeys(doc["source"] for doc in relevant_docs))
+            
+            messages = [
+                SystemMessage(content=self.prompts.render("rag_system")),
+                HumanMessage(content=self.prompts.render("rag_request", context=context, question=question))
+            ]
         
         try:
-            response = await self.llm.ainvoke([
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=query_prompt)
-            ])
+            response = await self.cache.ainvoke(self.llm, messages, namespace="rag", semantic_text=question)
             
             return response.content, sources
             
         except Exception as e:
             print(f"Error querying knowledge base: {e}")
+            FALLBACKS.labels("rag").inc()
             return "I'm unable to access the knowledge base right now. Please try again later.", []
 
-    def _find_relevant_documents(self, question: str) -> List[Dict[str, str]]:
-        """Find relevant documents using simple keyword matching"""
-        question_lower = question.lower()
-        relevant_docs = []
-        
-        keywords = {
-            "ad copy": ["copy", "headline", "text", "creative"],
-            "audience": ["targeting", "audience", "demographics", "interests"],
-            "budget": ["budget", "spend", "cost", "bidding"],
-            "performance": ["metrics", "results", "cpl", "ctr", "roas"],
-            "creative": ["image", "video", "visual", "creative"],
-            "lead": ["lead", "conversion", "generation"],
-            "campaign": ["campaign", "structure", "organization"]
-        }
-        
-        for doc in self.knowledge_base:
-            doc_lower = doc["content"].lower()
-            
-            # Check if any keywords match
-            for category, category_keywords in keywords.items():
-                if any(keyword in question_lower for keyword in category_keywords):
-                    if any(keyword in doc_lower for keyword in category_keywords):
-                        relevant_docs.append(doc)
-                        break
-        
-        return relevant_docs[:3]  # Limit to 3 most relevant documents
+    def _find_relevant_documents(self, question: str, query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Find the best chunks for a question, each with its ranking score.
+
+        Dense cosine matches and BM25 matches are fused with reciprocal rank
+        fusion; chunks with identical text are returned once. Async callers
+        pass the query embedding in so that no embedding call blocks the loop.
+        """
+        if query_embedding is None:
+            query_embedding = self.embedder.embed_query(question)
+        # Ingestion may run in another thread; both rankings read this one consistent view
+        snapshot = self.index.snapshot()
+        if not self.hybrid:
+            matches = self.index.search(query_embedding, k=self.top_k, min_score=self.min_score, snapshot=snapshot)
+            return [dict(doc, score=round(score, 4)) for doc, score in matches]
+        
+        dense = self.index.search(query_embedding, k=self.candidates, min_score=self.min_score, snapshot=snapshot)
+        documents = snapshot.documents
+        self.lexical.sync(documents, len(snapshot.alive))
+        lexical = self.lexical.search(question, k=self.candidates, alive=snapshot.alive)
+        
+        fused = reciprocal_rank_fusion([
+            [((doc.get("doc_id"), doc.get("chunk")), doc) for doc, _ in dense],
+            [((documents[row].get("doc_id"), documents[row].get("chunk")), documents[row]) for row, _ in lexical],
+        ], k=self.rrf_k)
+        
+        results = []
+        seen = set()
+        for doc, score in fused:
+            text = " ".join(doc["content"].lower().split())
+            if text in seen:
+                continue
+            seen.add(text)
+            results.append(dict(doc, score=round(score, 4)))
+            if len(results) == self.top_k:
+                break
+        return results
 
     async def _get_general_answer(self, question: str) -> str:
         """Provide general answer when knowledge base doesn't have relevant information"""
         
-        general_prompt = f"""You are a digital marketing expert. Answer this question about Facebook advertising or digital marketing:
-        
-        {question}
-        
-        Provide helpful, actionable advice based on general best practices."""
-        
         try:
-            response = await self.llm.ainvoke([
-                HumanMessage(content=general_prompt)
-            ])
+            response = await self.router.ainvoke("rag_general", [
+                SystemMessage(content=self.prompts.render("rag_general_system")),
+                HumanMessage(content=question)
+            ], temperature=0.3, validate=lambda content: bool(content.strip()), semantic_text=question)
             
             return response.content
             
         except Exception as e:
             print(f"Error getting general answer: {e}")
+            FALLBACKS.labels("rag_general").inc()
             return "I'm unable to provide a specific answer right now. Please try rephrasing your question or contact support."
@@ -0,0 +1,294 @@
+import math
+import os
+from enum import Enum
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class SuggestionType(str, Enum):
+    """Mirrors the SuggestionType enum in the backend Prisma schema"""
+    BUDGET_OPTIMIZATION = "BUDGET_OPTIMIZATION"
+    AUDIENCE_TARGETING = "AUDIENCE_TARGETING"
+    CREATIVE_IMPROVEMENT = "CREATIVE_IMPROVEMENT"
+    BID_ADJUSTMENT = "BID_ADJUSTMENT"
+    CAMPAIGN_STRUCTURE = "CAMPAIGN_STRUCTURE"
+
+
+class Priority(str, Enum):
+    HIGH = "HIGH"
+    MEDIUM = "MEDIUM"
+    LOW = "LOW"
+
+
+PERFORMANCE_COLUMNS = ["reach", "impressions", "clicks", "leads", "spend", "cpm", "cpc", "cpl"]
+METRIC_COLUMNS = ["ctr", "conversion_rate", "cpl", "cpl_delta", "pacing"]
+
+
+def _number(value: Any) -> float:
+    """Scalar equivalent of pd.to_numeric(errors="coerce").fillna(0)"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(number) else number
+
+
+def _divide(numerator: float, denominator: float) -> float:
+    """Division with numpy's results for a zero denominator"""
+    if denominator == 0:
+        return math.nan if numerator == 0 or math.isnan(numerator) else math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+
+class RulesEngine:
+    """Deterministic pre-screen that scores many campaigns in one vectorized pass.
+
+    Each campaign is classified as:
+    - decided: at least one rule fired without conflicting signals; the rule
+      suggestions are returned as-is
+    - ambiguous: no clear signal (or conflicting ones); worth an LLM analysis
+    - insufficient data: too few impressions for the rules to judge. New
+      campaigns are treated as ambiguous so they still get an LLM analysis,
+      unless RULES_SKIP_INSUFFICIENT_DATA is set, in which case they get no
+      suggestions until they reach RULES_MIN_IMPRESSIONS
+    """
+
+    def __init__(self):
+        self.target_cpl = float(os.getenv("RULES_TARGET_CPL", "50"))
+        self.min_impressions = int(os.getenv("RULES_MIN_IMPRESSIONS", "1000"))
+        self.min_clicks = int(os.getenv("RULES_MIN_CLICKS", "100"))
+        self.low_ctr = float(os.getenv("RULES_LOW_CTR", "0.008"))
+        self.low_conversion_rate = float(os.getenv("RULES_LOW_CONVERSION_RATE", "0.02"))
+        self.skip_insufficient_data = os.getenv("RULES_SKIP_INSUFFICIENT_DATA", "false").lower() == "true"
+
+    def build_frame(self, items: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> pd.DataFrame:
+        """Collect (campaign, performance) pairs into one numeric frame"""
+        rows = []
+        for campaign, performance in items:
+            campaign = campaign or {}
+            performance = performance or {}
+            row = {column: performance.get(column, 0) for column in PERFORMANCE_COLUMNS}
+            row["days"] = performance.get("days", 1)
+            row["budget"] = campaign.get("budget", 0)
+            row["lifetime_budget"] = campaign.get("budgetType", "DAILY") == "LIFETIME"
+            row["target_cpl"] = campaign.get("targetCpl") or self.target_cpl
+            rows.append(row)
+
+        frame = pd.DataFrame(rows, columns=PERFORMANCE_COLUMNS + ["days", "budget", "lifetime_budget", "target_cpl"])
+        numeric = PERFORMANCE_COLUMNS + ["days", "budget", "target_cpl"]
+        frame[numeric] = frame[numeric].apply(pd.to_numeric, errors="coerce").fillna(0).astype(float)
+        frame["lifetime_budget"] = frame["lifetime_budget"].astype(bool)
+        return frame
+
+    def derive_metrics(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Add CTR, conversion rate, CPL delta and spend pacing columns"""
+        frame = frame.copy()
+        impressions = frame["impressions"].to_numpy()
+        clicks = frame["clicks"].to_numpy()
+        leads = frame["leads"].to_numpy()
+        spend = frame["spend"].to_numpy()
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frame["ctr"] = np.where(impressions > 0, clicks / impressions, 0.0)
+            frame["conversion_rate"] = np.where(clicks > 0, leads / clicks, 0.0)
+            frame["cpl"] = np.where(leads > 0, spend / leads, frame["cpl"].to_numpy())
+            frame["cpm"] = np.where(impressions > 0, spend / impressions * 1000, frame["cpm"].to_numpy())
+            frame["cpl_delta"] = np.where(
+                leads > 0, (frame["cpl"].to_numpy() - frame["target_cpl"].to_numpy()) / frame["target_cpl"].to_numpy(), np.nan
+            )
+            # Share of the budget spent so far; daily budgets are scaled by the number of days reported
+            planned = np.where(frame["lifetime_budget"], frame["budget"], frame["budget"] * np.maximum(frame["days"], 1))
+            frame["pacing"] = np.where(planned > 0, spend / planned, np.nan)
+
+        return frame
+
+    def evaluate(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Compute one boolean column per rule"""
+        enough_data = frame["impressions"] >= self.min_impressions
+        enough_clicks = frame["clicks"] >= self.min_clicks
+        has_leads = frame["leads"] > 0
+        fleet_cpm = frame.loc[enough_data, "cpm"].median() if enough_data.any() else np.nan
+
+        rules = pd.DataFrame(index=frame.index)
+        rules["enough_data"] = enough_data
+        rules["high_cpl"] = enough_data & has_leads & (frame["cpl_delta"] > 0.5)
+        rules["no_leads"] = enough_data & ~has_leads & (frame["spend"] > frame["target_cpl"] * 2)
+        rules["low_ctr"] = enough_data & (frame["ctr"] < self.low_ctr)
+        rules["low_conversion"] = enough_clicks & (frame["conversion_rate"] < self.low_conversion_rate)
+        rules["efficient"] = enough_data & has_leads & (frame["cpl_delta"] <= -0.3) & (frame["pacing"] >= 0.9)
+        rules["underpacing"] = enough_data & ~frame["lifetime_budget"] & (frame["pacing"] < 0.5)
+        rules["overpacing"] = frame["pacing"] > 1.1
+        rules["high_cpm"] = (enough_data & (frame["cpm"] > 2 * fleet_cpm)) if not np.isnan(fleet_cpm) else False
+
+        signals = ["high_cpl", "no_leads", "low_ctr", "low_conversion", "efficient", "underpacing", "overpacing", "high_cpm"]
+        fired = rules[signals].sum(axis=1)
+        # Scaling a campaign that also shows weak funnel metrics needs judgement
+        conflicting = rules["efficient"] & (rules["low_ctr"] | rules["low_conversion"])
+        ambiguous = (fired == 0) | conflicting
+        rules["ambiguous"] = enough_data & ambiguous if self.skip_insufficient_data else ambiguous
+        return rules
+
+    def screen(self, items: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Screen campaigns, returning {"suggestions", "ambiguous", "metrics"} per item"""
+        if not items:
+            return []
+        if len(items) == 1:
+            # Every /suggest call screens one campaign; building a frame would cost more than the rules
+            return [self._screen_one(*items[0])]
+        return self._screen_frame(items)
+
+    def _screen_frame(self, items: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        frame = self.derive_metrics(self.build_frame(items))
+        rules = self.evaluate(frame)
+        results = [{"suggestions": [], "ambiguous": bool(ambiguous)} for ambiguous in rules["ambiguous"]]
+
+        metrics = frame[METRIC_COLUMNS].round(4)
+        for result, row in zip(results, metrics.astype(object).where(metrics.notna(), None).to_dict("records")):
+            result["metrics"] = row
+
+        records = frame.to_dict("records")
+        for rule, build in self._builders().items():
+            for index in np.flatnonzero(rules[rule].to_numpy()):
+                results[index]["suggestions"].append(build(records[index]))
+
+        priority_order = {Priority.HIGH.value: 0, Priority.MEDIUM.value: 1, Priority.LOW.value: 2}
+        for result in results:
+            result["suggestions"].sort(key=lambda s: priority_order[s["priority"]])
+        return results
+
+    def _screen_one(self, campaign: Dict[str, Any], performance: Dict[str, Any]) -> Dict[str, Any]:
+        """Plain-Python twin of build_frame, derive_metrics and evaluate for a single campaign"""
+        campaign = campaign or {}
+        performance = performance or {}
+        row = {column: _number(performance.get(column, 0)) for column in PERFORMANCE_COLUMNS}
+        row["days"] = _number(performance.get("days", 1))
+        row["budget"] = _number(campaign.get("budget", 0))
+        row["lifetime_budget"] = campaign.get("budgetType", "DAILY") == "LIFETIME"
+        row["target_cpl"] = _number(campaign.get("targetCpl") or self.target_cpl)
+
+        impressions, clicks, leads, spend = row["impressions"], row["clicks"], row["leads"], row["spend"]
+        row["ctr"] = clicks / impressions if impressions > 0 else 0.0
+        row["conversion_rate"] = leads / clicks if clicks > 0 else 0.0
+        if leads > 0:
+            row["cpl"] = spend / leads
+        if impressions > 0:
+            row["cpm"] = spend / impressions * 1000
+        row["cpl_delta"] = _divide(row["cpl"] - row["target_cpl"], row["target_cpl"]) if leads > 0 else math.nan
+        planned = row["budget"] if row["lifetime_budget"] else row["budget"] * max(row["days"], 1)
+        row["pacing"] = spend / planned if planned > 0 else math.nan
+
+        enough_data = impressions >= self.min_impressions
+        has_leads = leads > 0
+        # The fleet median of a single campaign is its own CPM
+        fleet_cpm = row["cpm"] if enough_data else math.nan
+        rules = {
+            "high_cpl": enough_data and has_leads and row["cpl_delta"] > 0.5,
+            "no_leads": enough_data and not has_leads and spend > row["target_cpl"] * 2,
+            "low_ctr": enough_data and row["ctr"] < self.low_ctr,
+            "low_conversion": clicks >= self.min_clicks and row["conversion_rate"] < self.low_conversion_rate,
+            "efficient": enough_data and has_leads and row["cpl_delta"] <= -0.3 and row["pacing"] >= 0.9,
+            "underpacing": enough_data and not row["lifetime_budget"] and row["pacing"] < 0.5,
+            "overpacing": row["pacing"] > 1.1,
+            "high_cpm": enough_data and row["cpm"] > 2 * fleet_cpm,
+        }
+        conflicting = rules["efficient"] and (rules["low_ctr"] or rules["low_conversion"])
+        ambiguous = not any(rules.values()) or conflicting
+
+        priority_order = {Priority.HIGH.value: 0, Priority.MEDIUM.value: 1, Priority.LOW.value: 2}
+        suggestions = [build(row) for rule, build in self._builders().items() if rules[rule]]
+        suggestions.sort(key=lambda s: priority_order[s["priority"]])
+        return {
+            "suggestions": suggestions,
+            "ambiguous": (enough_data and ambiguous) if self.skip_insufficient_data else ambiguous,
+            "metrics": {
+                column: None if math.isnan(row[column]) else float(np.round(row[column], 4))
+                for column in METRIC_COLUMNS
+            },
+        }
+
+    def _builders(self):
+        return {
+            "high_cpl": lambda row: self._suggestion(
+                SuggestionType.AUDIENCE_TARGETING, Priority.HIGH,
+                "Reduce Cost Per Lead",
+                f"Cost per lead is ${row['cpl']:.2f}, {row['cpl_delta']:.0%} above the ${row['target_cpl']:.2f} target. "
+                "Narrow targeting to the best-converting segments and exclude poor performers.",
+                {"action_type": "optimize_targeting", "reasoning": "CPL well above target"},
+                20
+            ),
+            "no_leads": lambda row: self._suggestion(
+                SuggestionType.AUDIENCE_TARGETING, Priority.HIGH,
+                "Fix Campaign With No Leads",
+                f"The campaign has spent ${row['spend']:.2f} without generating a lead. "
+                "Revisit the audience and the lead form before spending more.",
+                {"action_type": "optimize_targeting", "reasoning": "Spend without conversions"},
+                25
+            ),
+            "low_ctr": lambda row: self._suggestion(
+                SuggestionType.CREATIVE_IMPROVEMENT, Priority.MEDIUM,
+                "Improve Ad Creative",
+                f"Click-through rate is {row['ctr']:.2%}, below the {self.low_ctr:.2%} benchmark. "
+                "Test new images, headlines and hooks.",
+                {"action_type": "test_creative", "reasoning": "Low CTR indicates poor creative performance"},
+                15
+            ),
+            "low_conversion": lambda row: self._suggestion(
+                SuggestionType.CAMPAIGN_STRUCTURE, Priority.MEDIUM,
+                "Improve Conversion Rate",
+                f"Only {row['conversion_rate']:.2%} of clicks become leads. "
+                "Simplify the lead form or landing page and check message match with the ad.",
+                {"action_type": "optimize_funnel", "reasoning": "Clicks are not converting"},
+                15
+            ),
+            "efficient": lambda row: self._suggestion(
+                SuggestionType.BUDGET_OPTIMIZATION, Priority.HIGH,
+                "Increase Budget",
+                f"Cost per lead is ${row['cpl']:.2f}, well under the ${row['target_cpl']:.2f} target, and the budget is fully used. "
+                "Increase the budget by 20% to scale results.",
+                {"action_type": "increase_budget", "amount": round(row["budget"] * 0.2, 2), "reasoning": "Low CPL with budget fully spent"},
+                25
+            ),
+            "underpacing": lambda row: self._suggestion(
+                SuggestionType.BID_ADJUSTMENT, Priority.MEDIUM,
+                "Raise Bids to Spend Budget",
+                f"Only {row['pacing']:.0%} of the planned budget was spent. "
+                "Raise the bid cap or broaden the audience so delivery is not constrained.",
+                {"action_type": "increase_bid", "reasoning": "Campaign is underdelivering"},
+                10
+            ),
+            "overpacing": lambda row: self._suggestion(
+                SuggestionType.BUDGET_OPTIMIZATION, Priority.LOW,
+                "Review Budget Pacing",
+                f"Spend is at {row['pacing']:.0%} of the planned budget. Check budget caps and scheduling.",
+                {"action_type": "review_budget", "reasoning": "Spend ahead of plan"},
+                5
+            ),
+            "high_cpm": lambda row: self._suggestion(
+                SuggestionType.AUDIENCE_TARGETING, Priority.LOW,
+                "Broaden Audience to Lower CPM",
+                f"CPM is ${row['cpm']:.2f}, more than twice the account median. "
+                "A broader or lookalike audience can reduce auction pressure.",
+                {"action_type": "broaden_audience", "reasoning": "CPM far above peers"},
+                10
+            ),
+        }
+
+    @staticmethod
+    def _suggestion(
+        suggestion_type: SuggestionType,
+        priority: Priority,
+        title: str,
+        description: str,
+        action: Dict[str, Any],
+        expected_impact: int
+    ) -> Dict[str, Any]:
+        return {
+            "type": suggestion_type.value,
+            "title": title,
+            "description": description,
+            "action": action,
+            "priority": priority.value,
+            "expected_impact": expected_impact,
+        }
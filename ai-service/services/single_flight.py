@@ -0,0 +1,71 @@
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict
+
+from services.metrics import COALESCED_CALLS
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace so prompts differing only in indentation share a key"""
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one upstream call.
+
+    The first caller for a key starts the call; callers arriving while it
+    is in flight await the same result (or exception). A caller that is
+    cancelled only stops waiting; the shared call is cancelled once every
+    waiter has gone.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            COALESCED_CALLS.inc()
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Forget the flight first so a caller arriving before the task
+                # finishes cancelling starts a new call instead of joining this one
+                self._forget(key, flight)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: str, flight: "_Flight") -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if flight.task.done() and not flight.task.cancelled():
+            flight.task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
@@ -0,0 +1,66 @@
+import json
+import re
+from typing import Any, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+TRAILING_COMMA_PATTERN = re.compile(r",(\s*[}\]])")
+
+_decoder = json.JSONDecoder()
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def extract_json(text: str) -> Any:
+    """Return the first JSON object or array in a completion.
+
+    Tolerates markdown fences, prose before or after the value and trailing
+    commas. Each candidate start is decoded with `raw_decode`, which stops
+    at the end of the value instead of requiring the rest of the text to be
+    valid too. Raises ValueError when no value can be decoded.
+    """
+    candidates = [match.group(1) for match in FENCE_PATTERN.finditer(text)] + [text]
+    for candidate in candidates:
+        value = _first_value(candidate)
+        if value is None:
+            value = _first_value(TRAILING_COMMA_PATTERN.sub(r"\1", candidate))
+        if value is not None:
+            return value
+    raise ValueError("no JSON object or array found in the completion")
+
+
+def _first_value(text: str) -> Optional[Any]:
+    position = 0
+    while True:
+        starts = [index for index in (text.find("{", position), text.find("[", position)) if index != -1]
+        if not starts:
+            return None
+        start = min(starts)
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+            return value
+        except json.JSONDecodeError:
+            position = start + 1
+
+
+def parse_items(text: str, model: Type[ModelT], key: str) -> Tuple[List[ModelT], List[str]]:
+    """Validate a list of `model` items from a completion.
+
+    Accepts a bare array, an object holding the array under `key`, or a
+    single item object. Invalid items are skipped and their errors
+    returned; raises ValueError when there is no list of items at all.
+    """
+    data = extract_json(text)
+    if isinstance(data, dict):
+        data = data[key] if key in data else [data]
+    if not isinstance(data, list):
+        raise ValueError(f"expected a list of items under '{key}'")
+
+    items, errors = [], []
+    for index, item in enumerate(data):
+        try:
+            items.append(model.model_validate(item))
+        except ValidationError as e:
+            errors.append(f"item {index}: {e.errors()[0]['loc']} {e.errors()[0]['msg']}")
+    return items, errors
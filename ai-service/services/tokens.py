@@ -0,0 +1,43 @@
+from functools import lru_cache
+from typing import Optional
+
+# Fixed overhead OpenAI adds per chat message for role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """Count tokens locally with tiktoken.
+
+    Without tiktoken, or when its encoding files cannot be loaded (they are
+    downloaded on first use), falls back to estimating ~4 characters per
+    token, which is close enough for budgeting.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.encoding = None
+        try:
+            import tiktoken
+
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"Exact token counting unavailable, estimating instead: {type(e).__name__}")
+
+    def count(self, text: Optional[str]) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def count_message(self, content: Optional[str]) -> int:
+        return self.count(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(model: str) -> TokenCounter:
+    """Return the shared token counter for a model"""
+    return TokenCounter(model)
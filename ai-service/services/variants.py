@@ -0,0 +1,122 @@
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel, Field, ValidationError
+
+from services.embeddings import EmbeddingBackend, HashingEmbeddingBackend
+from services.structured_output import extract_json
+
+WORD_PATTERN = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?")
+SENTENCE_PATTERN = re.compile(r"[.!?]+")
+VOWEL_GROUP_PATTERN = re.compile(r"[aeiouy]+")
+
+CTA_PHRASES = (
+    "shop now", "buy now", "order now", "sign up", "learn more", "get started", "book now",
+    "book a", "call now", "call us", "contact us", "download", "subscribe", "join", "register",
+    "apply now", "claim", "try it", "try for free", "start your", "get yours", "get a quote",
+    "get offer", "see more", "visit", "discover",
+)
+
+
+class AdVariant(BaseModel):
+    """One generated ad copy variant"""
+    headline: str = Field(min_length=1)
+    primary_text: str = Field(min_length=1)
+    description: str = ""
+    cta: str = ""
+
+
+def parse_variant(text: str) -> Optional[AdVariant]:
+    """Validate a single variant completion, or None when it is unusable"""
+    try:
+        data = extract_json(text)
+        if isinstance(data, list):
+            data = data[0] if data else {}
+        return AdVariant.model_validate(data)
+    except (ValueError, ValidationError):
+        return None
+
+
+def count_syllables(word: str) -> int:
+    word = word.lower()
+    syllables = len(VOWEL_GROUP_PATTERN.findall(word))
+    if word.endswith("e") and not word.endswith(("le", "ee")) and syllables > 1:
+        syllables -= 1
+    return max(1, syllables)
+
+
+def reading_ease(text: str) -> float:
+    """Flesch reading ease; 60-80 is plain English, lower is harder to read"""
+    words = WORD_PATTERN.findall(text)
+    if not words:
+        return 0.0
+    sentences = max(1, len([part for part in SENTENCE_PATTERN.split(text) if part.strip()]))
+    syllables = sum(count_syllables(word) for word in words)
+    return 206.835 - 1.015 * len(words) / sentences - 84.6 * syllables / len(words)
+
+
+class VariantRanker:
+    """Score ad variants locally and keep the best distinct ones.
+
+    Each variant is scored on three checks, weighted into one score:
+    the headline fits `max_headline_chars` (the limit the copy prompt asks
+    for), the copy contains a call to action, and the body reads easily
+    (Flesch reading ease of `min_reading_ease` or more). Near duplicates
+    are dropped with one cosine similarity matrix over local hashing
+    embeddings, keeping the higher-scored variant of each pair.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[EmbeddingBackend] = None,
+        max_headline_chars: int = 40,
+        min_reading_ease: float = 60.0,
+        similarity_threshold: float = 0.8,
+        weights: Sequence[float] = (0.4, 0.3, 0.3),
+    ):
+        self.embedder = embedder or HashingEmbeddingBackend()
+        self.max_headline_chars = max_headline_chars
+        self.min_reading_ease = min_reading_ease
+        self.similarity_threshold = similarity_threshold
+        self.weights = np.array(weights, dtype=np.float32)
+
+    def checks(self, variant: AdVariant) -> Dict[str, Any]:
+        copy = f"{variant.primary_text} {variant.description}"
+        text = f"{variant.cta} {copy}".lower()
+        return {
+            "headline_chars": len(variant.headline),
+            "has_cta": any(phrase in text for phrase in CTA_PHRASES),
+            "reading_ease": round(reading_ease(copy), 1),
+        }
+
+    def score(self, checks: Dict[str, Any]) -> float:
+        # Headlines lose credit linearly past the limit, reaching zero at twice its length
+        overflow = max(0, checks["headline_chars"] - self.max_headline_chars)
+        headline = max(0.0, 1.0 - overflow / self.max_headline_chars)
+        readability = min(1.0, max(0.0, (checks["reading_ease"] - self.min_reading_ease + 30) / 30))
+        return float(self.weights @ np.array([headline, float(checks["has_cta"]), readability], dtype=np.float32))
+
+    def rank(self, variants: List[AdVariant], top_k: int) -> List[Dict[str, Any]]:
+        """Return up to top_k distinct variants, best first, with their score and checks"""
+        if not variants:
+            return []
+
+        checks = [self.checks(variant) for variant in variants]
+        scores = np.array([self.score(item) for item in checks], dtype=np.float32)
+
+        embeddings = self.embedder.embed([f"{variant.headline}\n{variant.primary_text}" for variant in variants])
+        similarity = embeddings @ embeddings.T
+
+        kept: List[int] = []
+        for index in np.argsort(-scores, kind="stable"):
+            if kept and similarity[index, kept].max() >= self.similarity_threshold:
+                continue
+            kept.append(int(index))
+            if len(kept) == top_k:
+                break
+
+        return [
+            dict(variants[index].model_dump(), score=round(float(scores[index]), 3), checks=checks[index])
+            for index in kept
+        ]
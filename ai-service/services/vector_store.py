@@ -0,0 +1,414 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, NamedTuple, Optional, Tuple, Iterable
+
+import numpy as np
+
+
+class IndexSnapshot(NamedTuple):
+    """Consistent view of an index for the duration of one search.
+
+    `embeddings` and `alive` cover the same rows. `documents` may already
+    hold rows appended after the snapshot was taken; those are ignored.
+    """
+    embeddings: np.ndarray
+    documents: List[Dict[str, Any]]
+    alive: np.ndarray
+
+
+def _top_k(scores: np.ndarray, documents: List[Dict[str, Any]], k: int, min_score: float) -> List[List[Tuple[Dict[str, Any], float]]]:
+    """Select the k best (document, score) pairs for each row of a score matrix"""
+    size = scores.shape[1]
+    if size == 0:
+        return [[] for _ in range(len(scores))]
+
+    k = min(k, size)
+    if k < size:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(size), (len(scores), 1))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    results = []
+    for indices, row_scores in zip(top, top_scores):
+        results.append([
+            (documents[i], float(score))
+            for i, score in zip(indices, row_scores)
+            if score >= min_score
+        ])
+    return results
+
+
+class VectorIndex:
+    """In-memory dense vector index with batched cosine top-k search.
+
+    Embeddings are stored as rows of a single float32 matrix that grows
+    geometrically, so appends are amortized O(1) and a query is one
+    matrix-vector product followed by a partial sort. Deleted rows are
+    masked out rather than removed.
+
+    Writers only touch rows past the published size or copy the alive mask
+    before changing it, then publish a new snapshot in one assignment, so
+    searches running in other threads always see a consistent index.
+    """
+
+    def __init__(self, dimension: int, initial_capacity: int = 64):
+        self.dimension = dimension
+        self._matrix = np.zeros((initial_capacity, dimension), dtype=np.float32)
+        self._alive = np.zeros(initial_capacity, dtype=bool)
+        self._size = 0
+        self.documents: List[Dict[str, Any]] = []
+        self._publish()
+
+    def __len__(self) -> int:
+        return int(self._snapshot.alive.sum())
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._snapshot.embeddings
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Boolean mask over `documents` of rows that have not been deleted"""
+        return self._snapshot.alive
+
+    def snapshot(self) -> IndexSnapshot:
+        return self._snapshot
+
+    def _publish(self) -> None:
+        self._snapshot = IndexSnapshot(self._matrix[:self._size], self.documents, self._alive[:self._size])
+
+    def add(self, documents: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """Append documents together with their (normalized) embeddings"""
+        embeddings = _check_embeddings(embeddings, documents, self.dimension)
+
+        required = self._size + len(documents)
+        if required > self._matrix.shape[0]:
+            capacity = max(required, self._matrix.shape[0] * 2)
+            grown = np.zeros((capacity, self.dimension), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+            self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+
+        self._matrix[self._size:required] = embeddings
+        self._alive[self._size:required] = True
+        self.documents.extend(documents)
+        self._size = required
+        self._publish()
+
+    def delete(self, doc_ids: Iterable[str]) -> int:
+        """Mask out every chunk belonging to the given document ids"""
+        doc_ids = set(doc_ids)
+        alive = self._alive.copy()
+        deleted = 0
+        for row in range(self._size):
+            if alive[row] and self.documents[row].get("doc_id") in doc_ids:
+                alive[row] = False
+                deleted += 1
+        if deleted:
+            self._alive = alive
+            self._publish()
+        return deleted
+
+    def search(
+        self, query: np.ndarray, k: int = 3, min_score: float = 0.0, snapshot: Optional[IndexSnapshot] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Return the top-k documents for a single query vector"""
+        return self.search_batch(np.asarray(query, dtype=np.float32)[None, :], k, min_score, snapshot)[0]
+
+    def search_batch(
+        self, queries: np.ndarray, k: int = 3, min_score: float = 0.0, snapshot: Optional[IndexSnapshot] = None
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Return the top-k documents for each row of a query matrix"""
+        embeddings, documents, alive = snapshot or self.snapshot()
+        scores = np.asarray(queries, dtype=np.float32) @ embeddings.T
+        scores[:, ~alive] = -np.inf
+        return _top_k(scores, documents, k, min_score)
+
+
+class PersistentVectorIndex:
+    """On-disk vector index shared between processes through mmap.
+
+    Layout of the index directory:
+
+    - ``embeddings.f32``: raw float32 rows, appended in place
+    - ``documents.jsonl``: one metadata line per embedding row
+    - ``tombstones.jsonl``: deleted document ids and the row count at deletion
+    - ``manifest.json``: dimension, committed row count and compaction generation
+
+    Writers append and then atomically replace the manifest under a file
+    lock, so readers never observe a partially written row. Readers map the
+    embeddings read-only, which lets every uvicorn worker share the same
+    page-cache pages, and pick up new rows when the manifest changes.
+    Deleted rows stay on disk until ``compact`` rewrites the files.
+    Within a process, each refresh builds a new snapshot and publishes it
+    in one assignment, so threads searching meanwhile keep a consistent view.
+
+    `seed()`, when given, returns the (documents, embeddings) a new index
+    starts with. It runs under the file lock before the first manifest is
+    written, so exactly one process seeds, and an index whose documents
+    were deleted later is never reseeded.
+    """
+
+    MANIFEST = "manifest.json"
+    EMBEDDINGS = "embeddings.f32"
+    DOCUMENTS = "documents.jsonl"
+    TOMBSTONES = "tombstones.jsonl"
+    LOCK = ".lock"
+
+    def __init__(
+        self,
+        path: str,
+        dimension: int,
+        seed: Optional[Callable[[], Tuple[List[Dict[str, Any]], np.ndarray]]] = None,
+    ):
+        self.path = path
+        self.dimension = dimension
+        os.makedirs(path, exist_ok=True)
+
+        self._manifest_version = None
+        self._generation = 0
+        self._documents_offset = 0
+        self._documents: List[Dict[str, Any]] = []
+        self._snapshot = IndexSnapshot(np.zeros((0, dimension), dtype=np.float32), self._documents, np.zeros(0, dtype=bool))
+        self._refresh_lock = threading.Lock()
+
+        with self._lock():
+            if not os.path.exists(self._file(self.MANIFEST)):
+                count = 0
+                if seed is not None:
+                    documents, embeddings = seed()
+                    count = self._append(0, documents, _check_embeddings(embeddings, documents, dimension))
+                self._write_manifest(count)
+        self.refresh()
+
+    def __len__(self) -> int:
+        self.refresh()
+        return int(self._snapshot.alive.sum())
+
+    @property
+    def documents(self) -> List[Dict[str, Any]]:
+        return self._snapshot.documents
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Boolean mask over `documents` of rows that have not been deleted"""
+        return self._snapshot.alive
+
+    def snapshot(self) -> IndexSnapshot:
+        # Never wait for another thread's refresh; its result is picked up by the next search
+        self.refresh(wait=False)
+        return self._snapshot
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _lock(self):
+        with open(self._file(self.LOCK), "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        with open(self._file(self.MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest["dimension"] != self.dimension:
+            raise ValueError(
+                f"Index at {self.path} has dimension {manifest['dimension']}, "
+                f"but the embedding backend produces {self.dimension}"
+            )
+        return manifest
+
+    def _write_manifest(self, count: int, generation: int = 0) -> None:
+        tmp_path = self._file(self.MANIFEST + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"dimension": self.dimension, "count": count, "generation": generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file(self.MANIFEST))
+
+    def _read_tombstones(self) -> Dict[str, int]:
+        """Map each deleted doc id to the number of rows that existed when it was deleted"""
+        tombstones: Dict[str, int] = {}
+        if os.path.exists(self._file(self.TOMBSTONES)):
+            with open(self._file(self.TOMBSTONES)) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        tombstones[entry["doc_id"]] = max(tombstones.get(entry["doc_id"], 0), entry["before"])
+        return tombstones
+
+    def _manifest_stat(self) -> Tuple[int, int]:
+        stat = os.stat(self._file(self.MANIFEST))
+        return stat.st_ino, stat.st_mtime_ns
+
+    def refresh(self, wait: bool = True) -> None:
+        """Re-map the index if another process committed changes.
+
+        With `wait=False` the call returns at once when another thread is
+        already refreshing, leaving the current snapshot in place.
+        """
+        if self._manifest_stat() == self._manifest_version:
+            return
+        if not self._refresh_lock.acquire(blocking=wait):
+            return
+        try:
+            version = self._manifest_stat()
+            if version != self._manifest_version:
+                self._reload(version)
+        finally:
+            self._refresh_lock.release()
+
+    def _reload(self, version: Tuple[int, int]) -> None:
+        manifest = self._read_manifest()
+        count, generation = manifest["count"], manifest.get("generation", 0)
+
+        documents = self._documents
+        if generation != self._generation or count < len(documents):
+            # The files were rewritten by compact(), so start over on a new list
+            documents = []
+            self._documents_offset = 0
+            self._generation = generation
+
+        if count > len(documents):
+            # Only parse the metadata lines appended since the last refresh
+            with open(self._file(self.DOCUMENTS), "rb") as f:
+                f.seek(self._documents_offset)
+                for _ in range(count - len(documents)):
+                    line = f.readline()
+                    documents.append(json.loads(line))
+                self._documents_offset = f.tell()
+
+        if count:
+            embeddings = np.memmap(
+                self._file(self.EMBEDDINGS), dtype=np.float32, mode="r", shape=(count, self.dimension)
+            )
+        else:
+            embeddings = np.zeros((0, self.dimension), dtype=np.float32)
+
+        # A tombstone only hides rows written before it, so a document can be re-ingested
+        tombstones = self._read_tombstones()
+        alive = np.array(
+            [row >= tombstones.get(doc.get("doc_id"), 0) for row, doc in enumerate(documents)],
+            dtype=bool
+        )
+        self._documents = documents
+        self._snapshot = IndexSnapshot(embeddings, documents, alive)
+        self._manifest_version = version
+
+    def add(self, documents: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """Append documents and embeddings and commit them for all readers"""
+        embeddings = _check_embeddings(embeddings, documents, self.dimension)
+        if not documents:
+            return
+
+        with self._lock():
+            manifest = self._read_manifest()
+            count = self._append(manifest["count"], documents, embeddings)
+            self._write_manifest(count, manifest.get("generation", 0))
+        self.refresh()
+
+    def _append(self, count: int, documents: List[Dict[str, Any]], embeddings: np.ndarray) -> int:
+        """Write rows after the first `count` committed ones, returning the new row count. Needs the file lock."""
+        # Drop anything left behind by a writer that crashed before committing
+        self._truncate(count)
+
+        with open(self._file(self.EMBEDDINGS), "ab") as f:
+            f.write(np.ascontiguousarray(embeddings).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._file(self.DOCUMENTS), "a") as f:
+            for doc in documents:
+                f.write(json.dumps(doc) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return count + len(documents)
+
+    def _truncate(self, count: int) -> None:
+        embeddings_path = self._file(self.EMBEDDINGS)
+        if os.path.exists(embeddings_path):
+            os.truncate(embeddings_path, count * self.dimension * 4)
+
+        documents_path = self._file(self.DOCUMENTS)
+        if os.path.exists(documents_path):
+            with open(documents_path, "rb+") as f:
+                for _ in range(count):
+                    f.readline()
+                f.truncate(f.tell())
+
+    def delete(self, doc_ids: Iterable[str]) -> int:
+        """Tombstone every chunk belonging to the given document ids"""
+        self.refresh()
+        _, documents, alive = self._snapshot
+        doc_ids = set(doc_ids)
+        deleted = sum(1 for is_alive, doc in zip(alive, documents) if is_alive and doc.get("doc_id") in doc_ids)
+        if not deleted:
+            return 0
+
+        with self._lock():
+            manifest = self._read_manifest()
+            with open(self._file(self.TOMBSTONES), "a") as f:
+                for doc_id in doc_ids:
+                    f.write(json.dumps({"doc_id": doc_id, "before": manifest["count"]}) + "\n")
+            self._write_manifest(manifest["count"], manifest.get("generation", 0))
+        self.refresh()
+        return deleted
+
+    def compact(self) -> None:
+        """Rewrite the index without deleted rows"""
+        with self._lock():
+            self._manifest_version = None
+            self.refresh()
+            current = self._snapshot
+            keep = np.flatnonzero(current.alive)
+            embeddings = np.array(current.embeddings[keep], dtype=np.float32)
+            documents = [current.documents[i] for i in keep]
+
+            for name, payload in (
+                (self.EMBEDDINGS, embeddings.tobytes()),
+                (self.DOCUMENTS, "".join(json.dumps(doc) + "\n" for doc in documents).encode("utf-8")),
+            ):
+                tmp_path = self._file(name + ".tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self._file(name))
+
+            if os.path.exists(self._file(self.TOMBSTONES)):
+                os.remove(self._file(self.TOMBSTONES))
+            self._write_manifest(len(documents), self._generation + 1)
+        self.refresh()
+
+    def search(
+        self, query: np.ndarray, k: int = 3, min_score: float = 0.0, snapshot: Optional[IndexSnapshot] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Return the top-k documents for a single query vector"""
+        return self.search_batch(np.asarray(query, dtype=np.float32)[None, :], k, min_score, snapshot)[0]
+
+    def search_batch(
+        self, queries: np.ndarray, k: int = 3, min_score: float = 0.0, snapshot: Optional[IndexSnapshot] = None
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Return the top-k documents for each row of a query matrix"""
+        embeddings, documents, alive = snapshot or self.snapshot()
+        scores = np.asarray(queries, dtype=np.float32) @ embeddings.T
+        scores[:, ~alive] = -np.inf
+        return _top_k(scores, documents, k, min_score)
+
+
+def _check_embeddings(embeddings: np.ndarray, documents: List[Dict[str, Any]], dimension: int) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2 or embeddings.shape[1] != dimension:
+        raise ValueError(f"Expected embeddings of shape (n, {dimension}), got {embeddings.shape}")
+    if len(documents) != embeddings.shape[0]:
+        raise ValueError("Number of documents and embeddings must match")
+    return embeddings
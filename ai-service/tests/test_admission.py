@@ -0,0 +1,123 @@
+"""AdaptiveLimiter admission, queueing, shedding and limit adaptation.
+
+Run from ai-service/ with: python -m unittest discover tests
+"""
+import asyncio
+import unittest
+
+from services.admission import AdaptiveLimiter, Overloaded
+
+
+class AdaptiveLimiterTest(unittest.IsolatedAsyncioTestCase):
+    def limiter(self, **kwargs):
+        options = {"initial_limit": 1, "min_limit": 1, "max_queue": 1, "queue_timeout": 1.0}
+        options.update(kwargs)
+        return AdaptiveLimiter(**options)
+
+    async def queued(self, limiter, route="/generate", priority=0):
+        """Start an acquire that has to wait and let it reach the queue"""
+        task = asyncio.create_task(limiter.acquire(route, priority))
+        await asyncio.sleep(0)
+        self.assertFalse(task.done())
+        return task
+
+    async def test_requests_within_the_limit_are_admitted_at_once(self):
+        limiter = self.limiter(initial_limit=2)
+        await limiter.acquire("/generate")
+        await limiter.acquire("/chat")
+
+        self.assertEqual(limiter.in_flight, 2)
+        self.assertEqual(limiter.stats()["queued"], 0)
+
+    async def test_a_queued_request_is_admitted_when_a_slot_frees_up(self):
+        limiter = self.limiter()
+        await limiter.acquire("/generate")
+        waiter = await self.queued(limiter)
+
+        limiter.release("/generate", 0.1, failed=False)
+        await asyncio.wait_for(waiter, timeout=1)
+        self.assertEqual(limiter.in_flight, 1)
+        self.assertEqual(limiter.stats()["queued"], 0)
+
+    async def test_a_request_is_shed_when_its_queue_wait_times_out(self):
+        limiter = self.limiter(queue_timeout=0.01)
+        await limiter.acquire("/generate")
+
+        with self.assertRaises(Overloaded) as shed:
+            await limiter.acquire("/generate")
+        self.assertEqual(shed.exception.reason, "queue_timeout")
+        self.assertEqual(limiter.stats()["queued"], 0)
+
+    async def test_a_full_queue_sheds_requests_of_equal_priority(self):
+        limiter = self.limiter()
+        await limiter.acquire("/generate")
+        waiter = await self.queued(limiter, priority=1)
+
+        with self.assertRaises(Overloaded) as shed:
+            await limiter.acquire("/generate", priority=1)
+        self.assertEqual(shed.exception.reason, "queue_full")
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(limiter.in_flight, 1)
+
+    async def test_a_higher_priority_request_displaces_a_queued_one(self):
+        limiter = self.limiter()
+        await limiter.acquire("/generate")
+        low = await self.queued(limiter, priority=1)
+        high = await self.queued(limiter, route="/rag/query", priority=0)
+
+        with self.assertRaises(Overloaded) as shed:
+            await low
+        self.assertEqual(shed.exception.reason, "displaced")
+
+        limiter.release("/generate", 0.1, failed=False)
+        await asyncio.wait_for(high, timeout=1)
+
+    async def test_displacing_a_waiter_that_already_gave_up(self):
+        limiter = self.limiter()
+        await limiter.acquire("/generate")
+        low = await self.queued(limiter, priority=1)
+        # A timed-out wait cancels the waiter's future before the waiter leaves the queue
+        limiter._waiters[-1][2].cancel()
+
+        high = await self.queued(limiter, route="/rag/query", priority=0)
+        limiter.release("/generate", 0.1, failed=False)
+        await asyncio.wait_for(high, timeout=1)
+        with self.assertRaises((Overloaded, asyncio.CancelledError)):
+            await low
+
+    async def test_failures_shrink_the_limit_at_most_once_per_round(self):
+        limiter = self.limiter(initial_limit=4)
+        for _ in range(3):
+            await limiter.acquire("/generate")
+            limiter.release("/generate", 0.1, failed=True)
+        self.assertEqual(limiter.limit, 4)
+
+        await limiter.acquire("/generate")
+        limiter.release("/generate", 0.1, failed=True)
+        self.assertAlmostEqual(limiter.limit, 3.6)
+
+        await limiter.acquire("/generate")
+        limiter.release("/generate", 0.1, failed=True)
+        self.assertAlmostEqual(limiter.limit, 3.6)
+
+    async def test_the_limit_never_drops_below_the_minimum(self):
+        limiter = self.limiter(initial_limit=4, min_limit=3)
+        for _ in range(40):
+            await limiter.acquire("/generate")
+            limiter.release("/generate", 0.1, failed=True)
+
+        self.assertEqual(limiter.limit, 3)
+
+    async def test_successes_grow_the_limit(self):
+        limiter = self.limiter(initial_limit=4)
+        for _ in range(4):
+            await limiter.acquire("/generate")
+            limiter.release("/generate", 0.1, failed=False)
+
+        self.assertGreater(limiter.limit, 4.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
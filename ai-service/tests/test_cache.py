@@ -0,0 +1,136 @@
+"""ResponseCache semantic lookups and stream caching.
+
+Run from ai-service/ with: python -m unittest discover tests
+"""
+import unittest
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessageChunk
+
+from services.cache import MemoryCacheBackend, ResponseCache
+from services.embeddings import HashingEmbeddingBackend
+from services.prompts import get_prompt_registry
+
+CONTEXT = (
+    "Performance Metrics: Focus on cost per lead (CPL), click-through rate (CTR), conversion rate, "
+    "and return on ad spend (ROAS). Track these metrics daily and optimize accordingly."
+)
+
+
+class EchoModel:
+    """Answers with the call number, so a cached answer is easy to tell apart from a fresh one"""
+    model_name = "test-model"
+    temperature = 0.0
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        return AIMessage(content=f"answer {self.calls}")
+
+
+class ScriptedStreamModel:
+    """Streams the given completions in order, one per call"""
+    model_name = "test-model"
+    temperature = 0.0
+
+    def __init__(self, *completions):
+        self.completions = list(completions)
+        self.calls = 0
+
+    async def astream(self, messages, **kwargs):
+        completion = self.completions[self.calls]
+        self.calls += 1
+        for word in completion.split(" ") if completion else []:
+            yield AIMessageChunk(content=word + " ")
+
+
+class SemanticCacheTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = ResponseCache(
+            MemoryCacheBackend(100),
+            semantic_namespaces=["rag"],
+            semantic_threshold=0.9,
+            embedder=HashingEmbeddingBackend(),
+        )
+        self.llm = EchoModel()
+        self.prompts = get_prompt_registry()
+
+    async def ask(self, question, context=CONTEXT, semantic=True):
+        messages = [
+            SystemMessage(content=self.prompts.render("rag_system")),
+            HumanMessage(content=self.prompts.render("rag_request", context=context, question=question)),
+        ]
+        response = await self.cache.ainvoke(
+            self.llm, messages, namespace="rag", semantic_text=question if semantic else None
+        )
+        return response.content
+
+    async def test_different_questions_with_the_same_context_do_not_share_an_answer(self):
+        first = await self.ask("How often should I check ROAS?")
+        second = await self.ask("How do I measure CPL?")
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.llm.calls, 2)
+
+    async def test_a_reworded_question_with_the_same_context_is_a_semantic_hit(self):
+        first = await self.ask("How often should I check ROAS?")
+        second = await self.ask("how often should i check roas")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.cache.counters["rag"]["semantic_hits"], 1)
+
+    async def test_the_same_question_with_other_context_is_a_miss(self):
+        await self.ask("How often should I check ROAS?")
+        await self.ask("how often should i check roas", context="Budget Optimization: Start with small budgets.")
+
+        self.assertEqual(self.llm.calls, 2)
+
+    async def test_calls_without_semantic_text_only_match_exactly(self):
+        await self.ask("How often should I check ROAS?", semantic=False)
+        await self.ask("how often should i check roas", semantic=False)
+
+        self.assertEqual(self.llm.calls, 2)
+
+
+class StreamCacheTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = ResponseCache(MemoryCacheBackend(100))
+        self.messages = [HumanMessage(content="Write a headline for running shoes")]
+
+    async def stream(self, llm, **kwargs):
+        return "".join([chunk async for chunk in self.cache.astream(llm, self.messages, namespace="generate", **kwargs)])
+
+    async def test_a_completed_stream_is_replayed_from_the_cache(self):
+        llm = ScriptedStreamModel("Run faster today", "unused")
+
+        self.assertEqual(await self.stream(llm), await self.stream(llm))
+        self.assertEqual(llm.calls, 1)
+
+    async def test_an_empty_stream_is_not_cached(self):
+        llm = ScriptedStreamModel("", "Run faster today")
+
+        self.assertEqual(await self.stream(llm), "")
+        self.assertEqual((await self.stream(llm)).strip(), "Run faster today")
+
+    async def test_output_rejected_by_validate_is_not_cached(self):
+        llm = ScriptedStreamModel("{not json", '{"headline": "Run faster"}')
+        valid = lambda text: text.strip().startswith("{") and text.strip().endswith("}")
+
+        await self.stream(llm, validate=valid)
+        await self.stream(llm, validate=valid)
+        self.assertEqual(llm.calls, 2)
+
+    async def test_a_stream_abandoned_by_the_caller_is_not_cached(self):
+        llm = ScriptedStreamModel("Run faster today", "Run faster today")
+
+        stream = self.cache.astream(llm, self.messages, namespace="generate")
+        await anext(stream)
+        await stream.aclose()
+        await self.stream(llm)
+        self.assertEqual(llm.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
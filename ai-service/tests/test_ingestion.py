@@ -0,0 +1,58 @@
+"""Chunking and re-ingestion through IngestionPipeline.
+
+Run from ai-service/ with: python -m unittest discover tests
+"""
+import unittest
+
+from services.embeddings import HashingEmbeddingBackend
+from services.ingestion import IngestionPipeline, chunk_text
+from services.vector_store import VectorIndex
+
+
+class FailingEmbeddingBackend(HashingEmbeddingBackend):
+    def embed(self, texts):
+        raise TimeoutError("embedding request timed out")
+
+
+class IngestionPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.embedder = HashingEmbeddingBackend(dimension=64)
+        self.index = VectorIndex(self.embedder.dimension)
+        self.pipeline = IngestionPipeline(self.embedder, self.index, max_words=8, overlap=2)
+
+    def contents(self):
+        return [doc["content"] for doc, alive in zip(self.index.documents, self.index.alive) if alive]
+
+    def test_chunks_overlap_and_respect_the_word_limit(self):
+        chunks = chunk_text("One two three four five. Six seven eight nine ten. Eleven twelve.", max_words=6, overlap=2)
+
+        self.assertTrue(all(len(chunk.split()) <= 6 for chunk in chunks))
+        self.assertEqual(chunks[1].split()[:2], chunks[0].split()[-2:])
+
+    def test_reingesting_a_document_replaces_its_chunks(self):
+        self.pipeline.ingest([{"id": "guide", "content": "Old budget advice.", "source": "Guide"}])
+        result = self.pipeline.ingest([{"id": "guide", "content": "New budget advice.", "source": "Guide"}])
+
+        self.assertEqual(result, {"doc_ids": ["guide"], "chunks": 1})
+        self.assertEqual(self.contents(), ["New budget advice."])
+
+    def test_failed_embedding_keeps_the_previous_version(self):
+        self.pipeline.ingest([{"id": "guide", "content": "Old budget advice.", "source": "Guide"}])
+        self.pipeline.embedder = FailingEmbeddingBackend(dimension=64)
+
+        with self.assertRaises(TimeoutError):
+            self.pipeline.ingest([{"id": "guide", "content": "New budget advice.", "source": "Guide"}])
+        self.assertEqual(self.contents(), ["Old budget advice."])
+
+    def test_delete_removes_every_chunk_of_a_document(self):
+        self.pipeline.ingest([
+            {"id": "long", "content": "Test creatives weekly. Scale the winners. Pause the losers early.", "source": "A"},
+            {"id": "short", "content": "Track CPL daily.", "source": "B"},
+        ])
+
+        self.assertGreater(self.pipeline.delete(["long"]), 1)
+        self.assertEqual(self.contents(), ["Track CPL daily."])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""RulesEngine screening of single campaigns and batches.
+
+Run from ai-service/ with: python -m unittest discover tests
+"""
+import math
+import unittest
+
+import numpy as np
+
+from services.rules_engine import RulesEngine
+
+
+def same(a, b):
+    """Equality that treats NaN and infinities the way the metrics dict carries them"""
+    if isinstance(a, float) and isinstance(b, float):
+        return (math.isnan(a) and math.isnan(b)) or a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(same(a[key], b[key]) for key in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def campaigns(count, seed=0):
+    rng = np.random.default_rng(seed)
+    items = []
+    for i in range(count):
+        impressions = int(rng.choice([0, 400, 1500, 20_000, 250_000]))
+        clicks = int(impressions * rng.uniform(0, 0.03))
+        leads = int(clicks * rng.choice([0, 0.01, 0.05, 0.2]))
+        campaign = {
+            "name": f"Campaign {i}",
+            "budget": float(rng.choice([0, 20, 50, 500])),
+            "budgetType": str(rng.choice(["DAILY", "LIFETIME"])),
+            "targetCpl": rng.choice([None, 0, 15, 40]),
+        }
+        performance = {
+            "impressions": impressions,
+            "clicks": clicks,
+            "leads": leads,
+            "spend": round(float(rng.uniform(0, 3000)), 2),
+            "cpm": float(rng.uniform(2, 30)),
+            "cpl": float(rng.choice([0, 25])),
+            "days": int(rng.choice([0, 1, 7, 30])),
+        }
+        items.append((campaign, performance))
+    return items
+
+
+class RulesEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = RulesEngine()
+
+    def test_a_single_campaign_screens_like_a_batch_of_one(self):
+        for campaign, performance in campaigns(300):
+            with self.subTest(campaign=campaign, performance=performance):
+                single = self.engine.screen([(campaign, performance)])
+                self.assertTrue(same(single, self.engine._screen_frame([(campaign, performance)])))
+
+    def test_a_single_campaign_tolerates_missing_and_malformed_fields(self):
+        items = [
+            ({}, {}),
+            (None, None),
+            ({"budget": "50", "targetCpl": "abc"}, {"impressions": "20000", "clicks": "n/a", "spend": None}),
+            ({"budget": 10, "budgetType": "LIFETIME"}, {"impressions": 5000, "spend": 30, "leads": 0}),
+        ]
+        for item in items:
+            with self.subTest(item=item):
+                self.assertTrue(same(self.engine.screen([item]), self.engine._screen_frame([item])))
+
+    def test_an_expensive_campaign_gets_a_high_priority_budget_cut(self):
+        result = self.engine.screen([(
+            {"name": "Spring sale", "budget": 100, "targetCpl": 20},
+            {"impressions": 30_000, "clicks": 600, "leads": 10, "spend": 700, "days": 7},
+        )])[0]
+
+        self.assertEqual(result["metrics"]["cpl"], 70.0)
+        self.assertEqual(result["suggestions"][0]["priority"], "HIGH")
+        self.assertFalse(result["ambiguous"])
+
+
+if __name__ == "__main__":
+    unittest.main()
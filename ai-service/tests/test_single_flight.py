@@ -0,0 +1,91 @@
+"""Cancellation semantics of SingleFlight.
+
+Run from ai-service/ with: python -m unittest discover tests
+"""
+import asyncio
+import unittest
+
+from services.single_flight import SingleFlight
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.flights = SingleFlight()
+        self.started = 0
+        self.release = asyncio.Event()
+
+    async def call(self, result="done"):
+        self.started += 1
+        await self.release.wait()
+        return result
+
+    async def test_concurrent_callers_share_one_call(self):
+        callers = [asyncio.create_task(self.flights.do("key", self.call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        self.release.set()
+
+        self.assertEqual(await asyncio.gather(*callers), ["done"] * 3)
+        self.assertEqual(self.started, 1)
+        self.assertEqual(self.flights.stats()["in_flight"], 0)
+
+    async def test_errors_reach_every_waiter(self):
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError("upstream failed")
+
+        callers = [asyncio.create_task(self.flights.do("key", fail)) for _ in range(2)]
+        results = await asyncio.gather(*callers, return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_cancelled_waiter_leaves_the_call_running_for_others(self):
+        first = asyncio.create_task(self.flights.do("key", self.call))
+        second = asyncio.create_task(self.flights.do("key", self.call))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.sleep(0)
+        self.release.set()
+
+        self.assertEqual(await second, "done")
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+        self.assertEqual(self.started, 1)
+
+    async def test_last_waiter_cancelling_cancels_the_call(self):
+        upstream_cancelled = asyncio.Event()
+
+        async def call():
+            try:
+                await self.release.wait()
+            except asyncio.CancelledError:
+                upstream_cancelled.set()
+                raise
+
+        caller = asyncio.create_task(self.flights.do("key", call))
+        await asyncio.sleep(0)
+        caller.cancel()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await caller
+        await asyncio.wait_for(upstream_cancelled.wait(), timeout=1)
+
+    async def test_caller_arriving_while_call_is_cancelled_starts_a_new_call(self):
+        first = asyncio.create_task(self.flights.do("key", self.call))
+        await asyncio.sleep(0)
+        first.cancel()
+        # One loop step: the first caller cancels the shared task, which has not finished cancelling yet
+        await asyncio.sleep(0)
+
+        second = asyncio.create_task(self.flights.do("key", lambda: self.call("fresh")))
+        await asyncio.sleep(0)
+        self.release.set()
+
+        self.assertEqual(await second, "fresh")
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+        self.assertEqual(self.started, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
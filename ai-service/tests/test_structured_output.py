@@ -0,0 +1,145 @@
+"""JSON extraction from completions and the suggestion re-ask loop.
+
+Run from ai-service/ with: python -m unittest discover tests
+"""
+import json
+import os
+import unittest
+
+from langchain.schema import AIMessage, HumanMessage
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from services.cache import MemoryCacheBackend, ResponseCache
+from services.optimization_service import OptimizationService, OptimizationSuggestion
+from services.structured_output import extract_json, parse_items
+
+SUGGESTION = {
+    "type": "BUDGET_OPTIMIZATION",
+    "title": "Reduce budget",
+    "description": "CPL is well above target.",
+    "action": {"type": "decrease_budget", "amount": 10},
+    "priority": "HIGH",
+    "expected_impact": 15,
+}
+
+
+class ExtractJsonTest(unittest.TestCase):
+    def test_a_fenced_value(self):
+        text = 'Here you go:\n```json\n{"suggestions": []}\n```\nLet me know if you need more.'
+        self.assertEqual(extract_json(text), {"suggestions": []})
+
+    def test_prose_before_the_value_is_skipped(self):
+        self.assertEqual(extract_json('Sure! The {best} options are: [1, 2, 3]'), [1, 2, 3])
+
+    def test_trailing_garbage_after_the_value_is_ignored(self):
+        self.assertEqual(extract_json('{"a": 1} and {"b": 2}, hope this helps}'), {"a": 1})
+
+    def test_trailing_commas_are_tolerated(self):
+        self.assertEqual(extract_json('{"a": [1, 2,],}'), {"a": [1, 2]})
+
+    def test_text_without_json_raises(self):
+        with self.assertRaises(ValueError):
+            extract_json("I cannot help with that.")
+
+
+class ParseItemsTest(unittest.TestCase):
+    def test_items_under_the_key_a_bare_array_and_a_single_object(self):
+        for text in (
+            json.dumps({"suggestions": [SUGGESTION]}),
+            json.dumps([SUGGESTION]),
+            json.dumps(SUGGESTION),
+        ):
+            with self.subTest(text=text):
+                items, errors = parse_items(text, OptimizationSuggestion, key="suggestions")
+                self.assertEqual([item.title for item in items], ["Reduce budget"])
+                self.assertEqual(errors, [])
+
+    def test_malformed_items_are_dropped_and_reported(self):
+        malformed = [
+            {**SUGGESTION, "priority": "URGENT"},
+            {key: value for key, value in SUGGESTION.items() if key != "title"},
+            "not an object",
+        ]
+        text = json.dumps({"suggestions": [*malformed, {**SUGGESTION, "priority": "high", "expected_impact": "20%"}]})
+
+        items, errors = parse_items(text, OptimizationSuggestion, key="suggestions")
+
+        self.assertEqual(len(items), 1)
+        self.assertEqual((items[0].priority.value, items[0].expected_impact), ("HIGH", 20))
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(errors[0].startswith("item 0:"))
+
+    def test_a_value_that_is_not_a_list_raises(self):
+        with self.assertRaises(ValueError):
+            parse_items('{"suggestions": "none"}', OptimizationSuggestion, key="suggestions")
+
+
+class ScriptedModel:
+    """Replies with the given completions in order and records the messages of each call"""
+    model_name = "test-model"
+    temperature = 0.3
+
+    def __init__(self, *completions):
+        self.completions = list(completions)
+        self.calls = []
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls.append(messages)
+        return AIMessage(content=self.completions[len(self.calls) - 1])
+
+
+class RequestSuggestionsTest(unittest.IsolatedAsyncioTestCase):
+    def service(self, *completions):
+        service = OptimizationService()
+        service.llm = ScriptedModel(*completions)
+        service.cache = ResponseCache(MemoryCacheBackend(100))
+        service.max_reasks = 1
+        return service
+
+    async def request(self, service):
+        return await service._request_suggestions([HumanMessage(content="Suggest optimizations for campaign 1")])
+
+    async def test_a_valid_reply_is_used_without_a_reask(self):
+        service = self.service(json.dumps({"suggestions": [SUGGESTION]}))
+
+        suggestions = await self.request(service)
+        self.assertEqual(suggestions[0]["title"], "Reduce budget")
+        self.assertEqual(len(service.llm.calls), 1)
+
+    async def test_partly_valid_replies_are_not_reasked(self):
+        service = self.service(json.dumps({"suggestions": [SUGGESTION, {"title": "broken"}]}))
+
+        self.assertEqual(len(await self.request(service)), 1)
+        self.assertEqual(len(service.llm.calls), 1)
+
+    async def test_an_unparseable_reply_is_reasked_once_with_the_error(self):
+        service = self.service("Sorry, here are my thoughts: cut the budget.", json.dumps([SUGGESTION]))
+
+        suggestions = await self.request(service)
+        self.assertEqual(suggestions[0]["priority"], "HIGH")
+        self.assertEqual(len(service.llm.calls), 2)
+        reask = service.llm.calls[1]
+        self.assertEqual(reask[-2].content, "Sorry, here are my thoughts: cut the budget.")
+        self.assertIn("no JSON object or array found", reask[-1].content)
+
+    async def test_gives_up_after_the_reask(self):
+        service = self.service('{"suggestions": []}', '{"suggestions": [{"title": "broken"}]}', "unused")
+
+        with self.assertRaises(ValueError):
+            await self.request(service)
+        self.assertEqual(len(service.llm.calls), 2)
+
+    async def test_an_invalid_reply_is_not_cached(self):
+        first = self.service("not json", json.dumps([SUGGESTION]))
+        await self.request(first)
+        second = self.service(json.dumps([SUGGESTION]))
+        second.cache = first.cache
+
+        # Had "not json" been cached, this would replay it and re-ask instead of calling the model
+        self.assertEqual((await self.request(second))[0]["title"], "Reduce budget")
+        self.assertEqual(len(second.llm.calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+"""Vector index behavior, including searches that race with ingestion.
+
+Run from ai-service/ with: python -m unittest discover tests
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from services.lexical_index import BM25Index
+from services.vector_store import PersistentVectorIndex, VectorIndex
+
+DIMENSION = 8
+
+
+def rows(count, start=0, doc_id=None):
+    """`count` chunks with random unit embeddings, one document each unless doc_id is given"""
+    rng = np.random.default_rng(start)
+    embeddings = rng.normal(size=(count, DIMENSION)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    documents = [
+        {"doc_id": doc_id or f"doc-{start + i}", "chunk": i, "content": f"budget tips {start + i}", "source": "test"}
+        for i in range(count)
+    ]
+    return documents, embeddings
+
+
+def ids(matches):
+    return [doc["doc_id"] for doc, _ in matches]
+
+
+class VectorIndexTest(unittest.TestCase):
+    def test_search_ranks_by_cosine_and_skips_deleted_rows(self):
+        index = VectorIndex(DIMENSION, initial_capacity=2)
+        documents, embeddings = rows(5)
+        index.add(documents, embeddings)
+
+        self.assertEqual(ids(index.search(embeddings[3], k=1)), ["doc-3"])
+        self.assertEqual(index.delete(["doc-3"]), 1)
+        self.assertNotIn("doc-3", ids(index.search(embeddings[3], k=5, min_score=-1.0)))
+        self.assertEqual(len(index), 4)
+
+    def test_rejects_embeddings_of_the_wrong_shape(self):
+        index = VectorIndex(DIMENSION)
+        documents, _ = rows(2)
+        with self.assertRaises(ValueError):
+            index.add(documents, np.zeros((2, DIMENSION + 1), dtype=np.float32))
+
+
+class PersistentVectorIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_add_delete_compact_round_trip(self):
+        index = PersistentVectorIndex(self.path, DIMENSION)
+        documents, embeddings = rows(5)
+        index.add(documents, embeddings)
+        index.delete(["doc-1", "doc-3"])
+
+        self.assertEqual(len(index), 3)
+        self.assertNotIn("doc-1", ids(index.search(embeddings[1], k=5, min_score=-1.0)))
+
+        index.compact()
+        reopened = PersistentVectorIndex(self.path, DIMENSION)
+        self.assertEqual([doc["doc_id"] for doc in reopened.documents], ["doc-0", "doc-2", "doc-4"])
+        self.assertTrue(reopened.alive.all())
+        self.assertEqual(ids(reopened.search(embeddings[4], k=1)), ["doc-4"])
+        self.assertFalse(os.path.exists(os.path.join(self.path, PersistentVectorIndex.TOMBSTONES)))
+
+    def test_a_deleted_document_can_be_ingested_again(self):
+        index = PersistentVectorIndex(self.path, DIMENSION)
+        index.add(*rows(1, doc_id="guide"))
+        index.delete(["guide"])
+        index.add(*rows(1, start=7, doc_id="guide"))
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual(ids(index.search(rows(1, start=7)[1][0], k=1)), ["guide"])
+
+    def test_other_instances_pick_up_committed_rows(self):
+        writer = PersistentVectorIndex(self.path, DIMENSION)
+        reader = PersistentVectorIndex(self.path, DIMENSION)
+        writer.add(*rows(3))
+        writer.delete(["doc-0"])
+
+        self.assertEqual(len(reader), 2)
+        writer.compact()
+        self.assertEqual(len(reader), 2)
+        self.assertEqual(len(reader.documents), 2)
+
+    def test_reopening_after_a_truncated_append(self):
+        index = PersistentVectorIndex(self.path, DIMENSION)
+        index.add(*rows(3))
+        # A writer that crashed mid-append leaves uncommitted bytes behind the manifest's row count
+        with open(os.path.join(self.path, PersistentVectorIndex.EMBEDDINGS), "ab") as f:
+            f.write(b"\x00" * (DIMENSION * 4 + 5))
+        with open(os.path.join(self.path, PersistentVectorIndex.DOCUMENTS), "a") as f:
+            f.write('{"doc_id": "torn", "con')
+
+        reopened = PersistentVectorIndex(self.path, DIMENSION)
+        self.assertEqual(len(reopened), 3)
+
+        documents, embeddings = rows(2, start=3)
+        reopened.add(documents, embeddings)
+        self.assertEqual([doc["doc_id"] for doc in reopened.documents], [f"doc-{i}" for i in range(5)])
+        self.assertEqual(ids(reopened.search(embeddings[1], k=1)), ["doc-4"])
+        self.assertEqual(
+            os.path.getsize(os.path.join(self.path, PersistentVectorIndex.EMBEDDINGS)), 5 * DIMENSION * 4
+        )
+
+    def test_rejects_an_index_of_another_dimension(self):
+        PersistentVectorIndex(self.path, DIMENSION)
+        with self.assertRaises(ValueError):
+            PersistentVectorIndex(self.path, DIMENSION * 2)
+
+    def test_a_new_index_is_seeded_once(self):
+        seeds = []
+
+        def seed():
+            seeds.append(1)
+            return rows(2)
+
+        index = PersistentVectorIndex(self.path, DIMENSION, seed=seed)
+        self.assertEqual(len(index), 2)
+        index.delete(["doc-0", "doc-1"])
+
+        reopened = PersistentVectorIndex(self.path, DIMENSION, seed=seed)
+        self.assertEqual(len(reopened), 0)
+        self.assertEqual(len(seeds), 1)
+
+
+class ConcurrentReadTest(unittest.TestCase):
+    """Searches from one thread while another thread ingests, as /rag/query does during /rag/documents"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def hammer(self, index, batches=150):
+        done = threading.Event()
+        errors = []
+
+        def write():
+            try:
+                for batch in range(batches):
+                    index.add(*rows(3, start=batch * 3))
+                    if batch % 5 == 0:
+                        index.delete([f"doc-{batch * 3}"])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                done.set()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        lexical = BM25Index()
+        query = rows(1, start=10_000)[1][0]
+        searches = 0
+        try:
+            while not done.is_set() or searches == 0:
+                # The same steps as RAGService._find_relevant_documents
+                snapshot = index.snapshot()
+                dense = index.search(query, k=5, min_score=-1.0, snapshot=snapshot)
+                lexical.sync(snapshot.documents, len(snapshot.alive))
+                for row, _ in lexical.search("budget tips", k=5, alive=snapshot.alive):
+                    self.assertLess(row, len(snapshot.alive))
+                self.assertLessEqual(len(dense), 5)
+                searches += 1
+        finally:
+            writer.join()
+        self.assertEqual(errors, [])
+        self.assertGreater(searches, 0)
+
+    def test_in_memory_index(self):
+        self.hammer(VectorIndex(DIMENSION, initial_capacity=4))
+
+    def test_persistent_index(self):
+        self.hammer(PersistentVectorIndex(self.path, DIMENSION), batches=60)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,4 @@
-import { Controller, Post, Body, UseGuards } from '@nestjs/common';
+import { Controller, Post, Body, UseGuards, Request } from '@nestjs/common';
 import { ApiTags, ApiOperation, ApiResponse, ApiBearerAuth } from '@nestjs/swagger';
 
 import { AiService } from './ai.service';
@@ -35,7 +35,9 @@ export class AiController {
   @Post('chat')
   @ApiOperation({ summary: 'Chat completion' })
   @ApiResponse({ status: 200, description: 'Chat completed successfully' })
-  async chatCompletion(@Body() body: { messages: any[] }) {
-    return this.aiService.chatCompletion(body.messages);
+  async chatCompletion(@Request() req, @Body() body: { messages: any[]; conversationId?: string }) {
+    // Scope the id to the user so clients cannot read into each other's conversation summaries
+    const conversationId = body.conversationId ? `${req.user.id}:${body.conversationId}` : undefined;
+    return this.aiService.chatCompletion(body.messages, conversationId);
   }
 }
@@ -48,10 +48,11 @@ export class AiService {
     }
   }
 
-  async chatCompletion(messages: any[]) {
+  async chatCompletion(messages: any[], conversationId?: string) {
     try {
       const response = await axios.post(`${this.aiServiceUrl}/chat`, {
         messages,
+        conversation_id: conversationId,
       });
       return response.data;
     } catch (error) {
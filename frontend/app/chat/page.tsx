@@ -105,6 +105,8 @@ export default function ChatPage() {
       timestamp: new Date().toISOString(),
     },
   ]);
+  // Lets the AI service keep a rolling summary of this conversation's older turns
+  const [conversationId] = useState(() => crypto.randomUUID());
   const [inputValue, setInputValue] = useState("");
   const [suggestions, setSuggestions] = useState<Suggestion[]>([]);
   const messagesEndRef = useRef<HTMLDivElement>(null);
@@ -137,6 +139,7 @@ export default function ChatPage() {
       const result = await chatCompletion({
         message: content.trim(),
         history: messages.map((m) => ({ role: m.role, content: m.content })),
+        conversationId,
       }).unwrap();
 
       const assistantMessage: ChatMessage = {
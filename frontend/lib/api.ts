@@ -119,7 +119,7 @@ export const api = createApi({
         body: data,
       }),
     }),
-    chatCompletion: builder.mutation<any, { message: string; history?: any[] }>(
+    chatCompletion: builder.mutation<any, { message: string; history?: any[]; conversationId?: string }>(
       {
         query: (data) => ({
           url: "/ai/chat",